@@ -1,27 +1,91 @@
-from flask import Flask, render_template, request, jsonify, session
-from sender import send_whatsapp_messages_with_log, send_telegram_messages_with_log, close_driver
+from flask import Flask, render_template, request, jsonify, session, send_file, Response, stream_with_context
+from tasks import Task, TaskExecutor, QueueFullError, dispatch_task, task_queue
+from scheduler import scheduler
+from driver_pool import driver_pool, discover_profiles
+from sendlog import export_xlsx, records_path_for
+from taskstore import TaskStore, COUNTED_FIELDS, FINISHED_STATES, PAYLOAD_FIELDS, UNFINISHED_STATES
+from recipients import RecipientList
+from suppression import SuppressionIndex, REASONS
+from invalid_cache import invalid_cache
+from message_template import CompiledTemplate, TemplateError, read_recipient_table
+from media import save_upload
+from telegram_engine import TelegramConfig, parse_tokens
+import clock
+from eta import project_queue
+from metrics import TASK_LOCK_HOLD_SECONDS, TASK_LOCK_WAIT_SECONDS, render as render_metrics
 import uuid
 import os
+import subprocess
+import sys
 import threading
 import time
-from datetime import datetime
 from queue import Queue, Empty
 import json
+from datetime import datetime
+from collections import Counter
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'nexoramsg-secret-key-2026')
 
+# Seconds a finished task stays in memory before it is only kept in the store
+TASK_RETENTION = float(os.getenv('NEXORA_TASK_RETENTION', '3600'))
+
 # Task Queue Management
 class TaskManager:
-    def __init__(self):
+    """
+    Live task state for the API and the senders. Recipients are kept as a
+    compact RecipientList, and finished tasks are evicted to the store
+    `retention` seconds after they end (get_task still finds them there),
+    so memory tracks the recent tasks rather than every task ever run.
+    totals() is kept up to date on every change instead of being recounted.
+    """
+
+    def __init__(self, store=None, flush_interval=1.0, retention=TASK_RETENTION):
         self.tasks = {}
         self.task_queue = Queue()
         self.current_task = None
         self.lock = threading.Lock()
+        
+        # Change tracking for push updates: every effective change bumps the
+        # task's version and stamps the changed fields with it
+        self.changed = threading.Condition(self.lock)
+        self._versions = {}
+        self._field_versions = {}
+        
+        # Write-behind persistence: updates mark tasks dirty, a background
+        # thread flushes them in one transaction per interval
+        self.store = store
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self._dirty = set()
+        self._payload_dirty = set()
+        self._finished = {}         # task id -> monotonic time it finished, oldest first
+        self._dead_letters = {}     # task id -> dead letters not in the store yet (all of them without one)
+        self._flush_lock = threading.Lock()
+        self._flush_now = threading.Event()
+        self._totals = {'tasks': Counter(), **{name: 0 for name in COUNTED_FIELDS}}
+        if self.store:
+            stored = self.store.totals()
+            self._totals['tasks'].update(stored['tasks'])
+            for name in COUNTED_FIELDS:
+                self._totals[name] = stored[name]
+            # Finished tasks older than the retention stay archived
+            for task in self.store.load_recent(clock.time() - self.retention):
+                self._track(task)
+            threading.Thread(target=self._flush_loop, name="TaskStoreFlush", daemon=True).start()
+    
+    def _track(self, task):
+        """Hold a stored task in memory (lock held, or during __init__)"""
+        self.tasks[task['id']] = task
+        self._versions[task['id']] = 1
+        self._field_versions[task['id']] = {key: 1 for key in task}
+        if task.get('status') in FINISHED_STATES:
+            self._finished[task['id']] = clock.monotonic()
     
     def create_task(self, platform, recipients, message):
         """Create a new sending task"""
         task_id = str(uuid.uuid4())
+        recipients = RecipientList(recipients)
         task = {
             'id': task_id,
             'platform': platform,
@@ -30,6 +94,7 @@ class TaskManager:
             'message': message,
             'status': 'queued',
             'current_index': 0,
+            'next_index': 0,
             'sent': 0,
             'failed': 0,
             'invalid': 0,
@@ -39,60 +104,307 @@ class TaskManager:
             'current_delay': 0,
             'log_file': None,
             'error': None,
-            'progress_percent': 0
+            'progress_percent': 0,
+            'throughput': 0
         }
         with self.lock:
             self.tasks[task_id] = task
+            self._dirty.add(task_id)
+            self._payload_dirty.add(task_id)
+            self._versions[task_id] = 1
+            self._field_versions[task_id] = {key: 1 for key in task}
+            self._totals['tasks']['queued'] += 1
+            self.changed.notify_all()
+        self._flush_now.set()
         return task_id
     
     def get_task(self, task_id):
-        """Get task details"""
+        """Get task details (from the store once it has been evicted)"""
         with self.lock:
-            return self.tasks.get(task_id, {})
+            task = self.tasks.get(task_id)
+        if task is None and self.store:
+            task = self.store.load(task_id)
+        return task or {}
     
     def update_task(self, task_id, **kwargs):
         """Update task status"""
+        self._apply(task_id, kwargs)
+    
+    def set_status(self, task_id, status, **fields):
+        """
+        update_task(status=...) unless the task has already finished (a
+        finished status is never overwritten). Returns True if applied.
+        """
+        return self._apply(task_id, dict(fields, status=status), keep_finished=True)
+    
+    def _apply(self, task_id, kwargs, keep_finished=False):
+        """Apply an update; False if the task is unknown or keep_finished refused it"""
+        requested = time.perf_counter()
+        with self.lock:
+            acquired = time.perf_counter()
+            TASK_LOCK_WAIT_SECONDS.observe(acquired - requested)
+            try:
+                task = self.tasks.get(task_id)
+                if task is None:
+                    # Evicted: bring it back for another retention period
+                    task = self.store.load(task_id) if self.store else None
+                    if task is None:
+                        return False
+                    self._track(task)
+                if keep_finished and task.get('status') in FINISHED_STATES:
+                    return False
+                if 'recipients' in kwargs:
+                    kwargs['recipients'] = RecipientList(kwargs['recipients'])
+                changed = [key for key, value in kwargs.items() if task.get(key, object()) != value]
+                if not changed:
+                    return True
+                self._count(task, kwargs, changed)
+                task.update(kwargs)
+                self._dirty.add(task_id)
+                if any(key in PAYLOAD_FIELDS for key in changed):
+                    self._payload_dirty.add(task_id)
+                version = self._versions.get(task_id, 0) + 1
+                self._versions[task_id] = version
+                field_versions = self._field_versions.setdefault(task_id, {})
+                for key in changed:
+                    field_versions[key] = version
+                self.changed.notify_all()
+            finally:
+                TASK_LOCK_HOLD_SECONDS.observe(time.perf_counter() - acquired)
+        # Lifecycle changes are written straight away, progress is batched
+        if 'status' in kwargs:
+            self._flush_now.set()
+        return True
+    
+    def _count(self, task, kwargs, changed):
+        """Apply a change to the running totals and the finished-task clock (lock held)"""
+        for key in changed:
+            if key == 'status':
+                self._totals['tasks'][task.get('status')] -= 1
+                self._totals['tasks'][kwargs['status']] += 1
+                if kwargs['status'] in FINISHED_STATES:
+                    self._finished[task['id']] = clock.monotonic()
+                else:
+                    self._finished.pop(task['id'], None)
+            elif key in COUNTED_FIELDS:
+                self._totals[key] += (kwargs[key] or 0) - (task.get(key) or 0)
+    
+    def add_dead_letter(self, task_id, entry):
+        """Append a recipient that failed for good; written with the next flush"""
         with self.lock:
-            if task_id in self.tasks:
-                self.tasks[task_id].update(kwargs)
+            self._dead_letters.setdefault(task_id, []).append(entry)
     
-    def get_all_tasks(self):
-        """Get all tasks"""
+    def get_dead_letters(self, task_id):
+        """A task's dead letters, oldest first"""
+        with self._flush_lock:
+            with self.lock:
+                pending = list(self._dead_letters.get(task_id, ()))
+            stored = self.store.load_dead_letters(task_id) if self.store else []
+        # Tasks from before the dead_letters table kept them in the task itself
+        legacy = self.get_task(task_id).get('dead_letters') or []
+        return legacy + stored + pending
+    
+    def get_all_tasks(self, fields=None):
+        """Tasks held in memory (unfinished and recently finished), limited to `fields` if given"""
+        with self.lock:
+            if fields is None:
+                return dict(self.tasks)
+            return {task_id: {key: task[key] for key in fields if key in task}
+                    for task_id, task in self.tasks.items()}
+    
+    def totals(self):
+        """Tasks per status and messages sent / failed / invalid, over every task ever stored"""
+        with self.lock:
+            return dict(self._totals, tasks={status: count for status, count in self._totals['tasks'].items() if count})
+    
+    def get_changes(self, task_id, since=0, timeout=0):
+        """
+        Fields changed after version `since`, waiting up to `timeout` seconds
+        for a change. Returns (version, {field: value}), or None if the task
+        is unknown or nothing changed in time. A `since` newer than the
+        current version (e.g. after a restart) returns the full task.
+        """
+        deadline = clock.monotonic() + timeout
+        with self.changed:
+            while True:
+                task = self.tasks.get(task_id)
+                if task is None:
+                    break
+                version = self._versions.get(task_id, 0)
+                if since > version or task_id not in self._field_versions:
+                    return version, dict(task)
+                if version > since:
+                    fields = self._field_versions[task_id]
+                    return version, {key: task.get(key) for key, v in fields.items() if v > since}
+                remaining = deadline - clock.monotonic()
+                if remaining <= 0:
+                    return None
+                clock.wait_condition(self.changed, remaining)
+        # Evicted tasks are finished and never change again; like after a
+        # restart they are at version 1
+        task = self.store.load(task_id) if self.store else None
+        if task is None:
+            return None
+        if since != 1:
+            return 1, task
+        clock.sleep(max(deadline - clock.monotonic(), 0))
+        return None
+    
+    def unfinished_tasks(self):
+        """Tasks that were queued or running (e.g. before a restart)"""
         with self.lock:
-            return dict(self.tasks)
+            return [dict(t) for t in self.tasks.values() if t.get('status') in UNFINISHED_STATES]
+    
+    def flush(self):
+        """Persist all dirty tasks in one batch"""
+        if not self.store:
+            return
+        with self._flush_lock:
+            with self.lock:
+                batch = [dict(self.tasks[tid]) for tid in self._dirty if tid in self.tasks]
+                payloads = [self.tasks[tid] for tid in self._payload_dirty if tid in self.tasks]
+                payload_ids = set(self._payload_dirty)
+                dead_letters = self._dead_letters
+                self._dirty.clear()
+                self._payload_dirty.clear()
+                self._dead_letters = {}
+            try:
+                self.store.save_many(batch, payloads,
+                                     [(tid, entry) for tid, entries in dead_letters.items() for entry in entries])
+            except Exception as e:
+                print(f"⚠️ Task store flush failed: {e}")
+                with self.lock:
+                    self._dirty.update(t['id'] for t in batch)
+                    self._payload_dirty.update(payload_ids)
+                    for tid, entries in dead_letters.items():
+                        self._dead_letters[tid] = entries + self._dead_letters.get(tid, [])
+    
+    def evict(self):
+        """Drop finished tasks older than the retention from memory (they are in the store)"""
+        cutoff = clock.monotonic() - self.retention
+        with self.lock:
+            while self._finished:
+                task_id, finished_at = next(iter(self._finished.items()))
+                if (finished_at > cutoff or task_id in self._dirty or task_id in self._payload_dirty
+                        or task_id in self._dead_letters):
+                    break
+                del self._finished[task_id]
+                self.tasks.pop(task_id, None)
+                self._versions.pop(task_id, None)
+                self._field_versions.pop(task_id, None)
+    
+    def _flush_loop(self):
+        while True:
+            self._flush_now.wait(self.flush_interval)
+            self._flush_now.clear()
+            self.flush()
+            self.evict()
 
 # Initialize task manager
-task_manager = TaskManager()
+task_manager = TaskManager(store=TaskStore())
+
+# Cross-campaign "do not message" index (contacted / opted out / blocked)
+suppression_index = SuppressionIndex()
 
 # Telegram API token
 TELEGRAM_API_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
 
+# Capacity planning dry runs (see dryrun.py)
+DRY_RUN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dryrun.py')
+DRY_RUN_TIMEOUT = int(os.getenv('NEXORA_DRY_RUN_TIMEOUT', '300'))
+DRY_RUN_MAX_RECIPIENTS = int(os.getenv('NEXORA_DRY_RUN_MAX_RECIPIENTS', '100000'))
+DRY_RUN_MAX_ACCOUNTS = int(os.getenv('NEXORA_DRY_RUN_MAX_ACCOUNTS', '50'))
+
 def clean_number(num):
     return ''.join(filter(str.isdigit, num))
 
-def send_with_progress(task_id, platform, recipients, message, log_path):
-    """Send messages and update progress"""
-    task_manager.update_task(task_id, status='running', start_time=datetime.now().isoformat())
+def send_with_progress(task, **sender_kwargs):
+    """
+    Run one queued task on a worker thread and mirror its lifecycle into the
+    TaskManager. sender_kwargs go to the sender (default: the configured
+    Telegram token).
+    """
+    status = 'paused' if task.pause_event.is_set() else 'running'
+    if task.resumed or task.start_index:
+        task_manager.set_status(task.id, status)
+    else:
+        task_manager.set_status(task.id, status, start_time=clock.now().isoformat())
     
     try:
-        if platform == 'whatsapp':
-            send_whatsapp_messages_with_log(
-                recipients, message, log_path, append=False, 
-                task_manager=task_manager, task_id=task_id
-            )
-        elif platform == 'telegram':
-            send_telegram_messages_with_log(
-                recipients, message, log_path, append=False,
-                api_token=TELEGRAM_API_TOKEN,
-                task_manager=task_manager, task_id=task_id
-            )
+        if task.platform == 'telegram':
+            sender_kwargs.setdefault('api_token', TELEGRAM_API_TOKEN)
+        dispatch_task(task, task_manager=task_manager, **sender_kwargs)
         
-        task_manager.update_task(task_id, status='completed', end_time=datetime.now().isoformat())
+        status = 'stopped' if task.stop_event.is_set() else 'completed'
+        task_manager.update_task(task.id, status=status, end_time=clock.now().isoformat())
     except Exception as e:
-        task_manager.update_task(task_id, status='failed', error=str(e), end_time=datetime.now().isoformat())
-        print(f"❌ Task {task_id} failed: {e}")
+        task_manager.update_task(task.id, status='failed', error=str(e), end_time=clock.now().isoformat())
+        print(f"❌ Task {task.id} failed: {e}")
     finally:
-        close_driver()
+        # Everyone this campaign reached is skipped by later campaigns
+        try:
+            suppression_index.ingest_log(task.log_file, task.platform)
+        except Exception as e:
+            print(f"⚠️ Could not update suppression index for task {task.id}: {e}")
+        # The browsers stay warm for the next campaign (see driver_pool.start_service)
+
+# Fixed-size worker pool: the single execution path for every campaign
+task_executor = TaskExecutor(task_queue, handler=send_with_progress)
+
+def submit_task(task_id, block=False, paused=False, resumed=False, executor=None):
+    """
+    Queue a stored task on the worker pool (raises QueueFullError when saturated).
+    A paused task starts paused once a worker picks it up; a resumed one
+    keeps its log and results so far.
+    """
+    executor = executor or task_executor
+    executor.start_workers()
+    info = task_manager.get_task(task_id)
+    log_file = info.get('log_file') or f"{info['platform']}_log_{task_id[:6]}.xlsx"
+    task = Task(
+        id=task_id,
+        platform=info['platform'],
+        recipients=info['recipients'],
+        message=info['message'],
+        log_file=os.path.join('static', 'logs', log_file),
+        start_index=info.get('next_index', 0),
+        columns=info.get('columns') or [],
+        rows=info.get('rows'),
+        attachment=info.get('attachment'),
+        resumed=resumed,
+    )
+    if paused:
+        task.pause_event.set()
+    executor.queue.add_task(task, block=block)
+    return task
+
+def _rows_for(kept, recipients, rows):
+    """Template rows of the recipients that survived filtering (first occurrence wins)"""
+    first = {}
+    for recipient, row in zip(recipients, rows):
+        first.setdefault(recipient, row)
+    return [first[recipient] for recipient in kept]
+
+def launch_task(platform, recipients, message, **fields):
+    """Create a task with its log file and queue it. Raises QueueFullError (task marked rejected)."""
+    task_id = task_manager.create_task(platform, recipients, message)
+    os.makedirs('static/logs', exist_ok=True)
+    task_manager.update_task(task_id, log_file=f'{platform}_log_{task_id[:6]}.xlsx', **fields)
+    try:
+        submit_task(task_id)
+    except QueueFullError:
+        task_manager.update_task(task_id, status='rejected', error='Task queue is full')
+        raise
+    return task_id
+
+def resume_unfinished_tasks():
+    """Re-queue campaigns interrupted by a restart at the recipient where they stopped"""
+    for task in task_manager.unfinished_tasks():
+        start_index = task.get('next_index', 0)
+        print(f"🔁 Resuming task {task['id'][:8]} at recipient {start_index + 1}/{task['total_recipients']}")
+        task_manager.update_task(task['id'], status='queued', resume_count=task.get('resume_count', 0) + 1)
+        # Wait for room rather than rejecting work that was already accepted
+        submit_task(task['id'], block=True, paused=task['status'] == 'paused', resumed=True)
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -104,75 +416,412 @@ def index():
 
         platform = request.form.get('platform', 'whatsapp')
         recipients_raw = request.form.get('recipients', '')
+        recipients_file = request.files.get('recipients_file')
         message = request.form.get('message', '')
 
-        if not recipients_raw.strip() or not message.strip():
+        if (not recipients_raw.strip() and not (recipients_file and recipients_file.filename)) or not message.strip():
             return render_template('index.html', uploaded=False, error="❌ Please enter recipients and message.", telegram_token=bool(TELEGRAM_API_TOKEN))
 
-        # Clean recipients
-        if platform == 'whatsapp':
-            recipients = [clean_number(num.strip()) for num in recipients_raw.split('\n') if num.strip()]
+        # A recipient file brings one row of template variables per recipient
+        columns, rows = [], None
+        if recipients_file and recipients_file.filename:
+            try:
+                columns, recipients, rows = read_recipient_table(recipients_file.filename, recipients_file.stream)
+                # Parse the template once up front so a bad placeholder is reported now
+                CompiledTemplate(message, columns)
+            except (TemplateError, ValueError) as e:
+                return render_template('index.html', uploaded=False, error=f"❌ {e}", telegram_token=bool(TELEGRAM_API_TOKEN))
         else:
             recipients = [r.strip() for r in recipients_raw.split('\n') if r.strip()]
 
+        # Optional attachment, stored once under its content hash
+        attachment = None
+        attachment_file = request.files.get('attachment')
+        if attachment_file and attachment_file.filename:
+            attachment = save_upload(attachment_file.stream, os.path.basename(attachment_file.filename)).to_dict()
+
+        # Clean recipients
+        if platform == 'whatsapp':
+            recipients = [clean_number(num) for num in recipients]
+
         if not recipients:
             return render_template('index.html', uploaded=False, error="❌ No valid recipients found.", telegram_token=bool(TELEGRAM_API_TOKEN))
 
-        # Create task
-        task_id = task_manager.create_task(platform, recipients, message)
-        log_filename = f'{platform}_log_{task_id[:6]}.xlsx'
-        log_path = os.path.join('static', 'logs', log_filename)
-        os.makedirs('static/logs', exist_ok=True)
-        
-        task_manager.update_task(task_id, log_file=log_filename)
-        
-        # Start sending in background
-        thread = threading.Thread(target=send_with_progress, args=(task_id, platform, recipients, message, log_path))
-        thread.daemon = True
-        thread.start()
+        # Dedupe and drop suppressed recipients before the task exists
+        received = len(recipients)
+        skip_contacted = request.form.get('include_contacted') != 'on'
+        kept, dropped = suppression_index.filter(platform, recipients, skip_contacted=skip_contacted)
+        if rows is not None:
+            rows = _rows_for(kept, recipients, rows)
+        recipients = kept
+        if dropped:
+            print(f"🚫 Dropped {received - len(recipients)}/{received} recipients: {dropped}")
+
+        if not recipients:
+            summary = ', '.join(f"{count} {reason.replace('_', ' ')}" for reason, count in dropped.items())
+            return render_template('index.html', uploaded=False, error=f"❌ All recipients were filtered out ({summary}).", telegram_token=bool(TELEGRAM_API_TOKEN))
+
+        # Create task and hand it over to the bounded worker pool (admission control when full)
+        try:
+            task_id = launch_task(platform, recipients, message, received_recipients=received, dropped=dropped,
+                                  columns=columns, rows=rows, attachment=attachment)
+        except QueueFullError:
+            return render_template('index.html', uploaded=False, error="❌ Too many campaigns queued, please try again later.", telegram_token=bool(TELEGRAM_API_TOKEN)), 503
         
         return render_template('dashboard.html', task_id=task_id, telegram_token=bool(TELEGRAM_API_TOKEN))
 
     return render_template('index.html', uploaded=False, telegram_token=bool(TELEGRAM_API_TOKEN))
 
+# Task fields exposed by the API (internal name -> public name)
+PUBLIC_TASK_FIELDS = {
+    'id': 'id',
+    'platform': 'platform',
+    'status': 'status',
+    'total_recipients': 'total',
+    'received_recipients': 'received',
+    'dropped': 'dropped',
+    'current_index': 'current',
+    'sent': 'sent',
+    'failed': 'failed',
+    'invalid': 'invalid',
+    'progress_percent': 'progress',
+    'current_recipient': 'current_recipient',
+    'current_delay': 'current_delay',
+    'throughput': 'throughput',
+    'throttled': 'throttled',
+    'media_uploads': 'media_uploads',
+    'media_bytes_uploaded': 'media_bytes_uploaded',
+    'retries': 'retries',
+    'retrying': 'retrying',
+    'recovered': 'recovered',
+    'dead_letter_count': 'dead_letter_count',
+    'resubmitted_as': 'resubmitted_as',
+    'next_send_at': 'next_send_at',
+    'elapsed': 'elapsed',
+    'estimated_remaining': 'estimated_remaining',
+    'eta': 'eta',
+    'eta_low': 'eta_low',
+    'eta_high': 'eta_high',
+    'starts_in': 'starts_in',
+    'sessions': 'sessions',
+    'last_confirm_ms': 'last_confirm_ms',
+    'avg_confirm_ms': 'avg_confirm_ms',
+    'last_open_ms': 'last_open_ms',
+    'avg_open_ms': 'avg_open_ms',
+    'rss_mb': 'rss_mb',
+    'peak_rss_mb': 'peak_rss_mb',
+    'rss_history': 'rss_history',
+    'browser_recycles': 'browser_recycles',
+    'driver_restarts': 'driver_restarts',
+    'driver_downtime_s': 'driver_downtime_s',
+    'log_file': 'log_file',
+    'error': 'error',
+    'start_time': 'start_time',
+    'end_time': 'end_time',
+}
+
+TERMINAL_STATES = FINISHED_STATES
+
+# Left out of the /api/tasks listing (still in /api/task/<id>)
+LISTING_EXCLUDED = ('rss_history',)
+
+def public_task(fields):
+    """Map internal task fields to their API names, dropping internal-only ones"""
+    return {PUBLIC_TASK_FIELDS[key]: value for key, value in fields.items() if key in PUBLIC_TASK_FIELDS}
+
+def queue_estimates():
+    """ETA fields ({task_id: fields}) of the queued tasks, behind the running ones"""
+    running = [dict(task_manager.get_task(task_id) or {}, id=task_id, platform=task.platform)
+               for task_id, task in list(task_queue.active_tasks.items())]
+    queued = []
+    for task in task_queue.pending():
+        if task.platform == 'telegram':
+            accounts = [token.split(':', 1)[0] for token in parse_tokens(TELEGRAM_API_TOKEN)]
+            lanes = TelegramConfig().concurrency
+        else:
+            accounts = driver_pool.profiles or discover_profiles()
+            lanes = 1
+        queued.append({'id': task.id, 'platform': task.platform, 'accounts': accounts, 'lanes': lanes,
+                       'remaining': len(task.recipients) - task.start_index})
+    return project_queue(running, queued, task_queue.max_workers)
+
 @app.route('/api/task/<task_id>', methods=['GET'])
 def get_task_status(task_id):
     """Get real-time task status"""
-    task = task_manager.get_task(task_id)
-    if not task:
+    change = task_manager.get_changes(task_id, since=0)
+    if not change:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    version, task = change
+    if task.get('status') == 'queued':
+        task = dict(task, **queue_estimates().get(task_id, {}))
+    payload = {public: task.get(key) for key, public in PUBLIC_TASK_FIELDS.items()}
+    payload['version'] = version
+    return jsonify(payload)
+
+@app.route('/api/task/<task_id>/changes', methods=['GET'])
+def get_task_changes(task_id):
+    """Long-poll: fields changed since ?since=<version>, waiting up to ?timeout seconds"""
+    since = request.args.get('since', 0, type=int)
+    timeout = min(request.args.get('timeout', 25, type=float), 60)
+    if not task_manager.get_task(task_id):
         return jsonify({'error': 'Task not found'}), 404
     
-    return jsonify({
-        'id': task.get('id'),
-        'platform': task.get('platform'),
-        'status': task.get('status'),
-        'total': task.get('total_recipients'),
-        'current': task.get('current_index'),
-        'sent': task.get('sent'),
-        'failed': task.get('failed'),
-        'invalid': task.get('invalid'),
-        'progress': task.get('progress_percent'),
-        'current_recipient': task.get('current_recipient'),
-        'current_delay': task.get('current_delay'),
-        'log_file': task.get('log_file'),
-        'error': task.get('error'),
-        'start_time': task.get('start_time'),
-        'end_time': task.get('end_time')
-    })
+    change = task_manager.get_changes(task_id, since=since, timeout=timeout)
+    if not change:
+        return jsonify({'version': since, 'changes': {}})
+    version, fields = change
+    return jsonify({'version': version, 'changes': public_task(fields)})
+
+@app.route('/api/task/<task_id>/stream', methods=['GET'])
+def stream_task(task_id):
+    """Server-Sent Events: push only the fields that changed, tagged with the task version"""
+    if not task_manager.get_task(task_id):
+        return jsonify({'error': 'Task not found'}), 404
+    
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('since') or 0
+    try:
+        since = int(last_id)
+    except ValueError:
+        since = 0
+    
+    def events():
+        version = since
+        while True:
+            change = task_manager.get_changes(task_id, since=version, timeout=15)
+            if change is None:
+                yield ": keepalive\n\n"
+                continue
+            version, fields = change
+            delta = public_task(fields)
+            if delta:
+                yield f"id: {version}\ndata: {json.dumps(delta)}\n\n"
+            if task_manager.get_task(task_id).get('status') in TERMINAL_STATES:
+                return
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/tasks', methods=['GET'])
 def get_all_tasks():
-    """Get all tasks"""
-    tasks = task_manager.get_all_tasks()
-    return jsonify(tasks)
+    """
+    Unfinished and recently finished tasks (older ones by id from
+    /api/task/<id>), without recipients or other per-recipient data
+    """
+    fields = [key for key, public in PUBLIC_TASK_FIELDS.items() if public not in LISTING_EXCLUDED]
+    tasks = task_manager.get_all_tasks(fields)
+    return jsonify({task_id: public_task(task) for task_id, task in tasks.items()})
+
+CONTROL_ACTIONS = ('pause', 'resume', 'stop')
+
+def apply_control(task_id, action, queue=None):
+    """Pause, resume or stop a task on its queue and record the new status. Returns whether it applied."""
+    queue = queue or task_queue
+    # Under the queue lock a worker cannot finish the task between the
+    # action and the status written here
+    with queue.lock:
+        applied = getattr(queue, f'{action}_task')(task_id)
+        if action == 'pause':
+            applied = applied and task_manager.set_status(task_id, 'paused')
+        elif action == 'resume':
+            applied = applied and task_manager.set_status(task_id, 'running')
+        elif applied and task_id not in queue.active_tasks:
+            # Taken out of the queue: no worker will ever report it
+            task_manager.set_status(task_id, 'stopped', end_time=clock.now().isoformat())
+    return bool(applied)
+
+@app.route('/api/task/<task_id>/<action>', methods=['POST'])
+def control_task(task_id, action):
+    """Pause or resume a running task, or stop a queued, running or paused one"""
+    if action not in CONTROL_ACTIONS:
+        return jsonify({'error': f'Unknown action: {action}'}), 400
+    info = task_manager.get_task(task_id)
+    if not info:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    applied = apply_control(task_id, action)
+    if not applied:
+        status = task_manager.get_task(task_id).get('status')
+        return jsonify({'error': f"Cannot {action} a task that is {status}"}), 409
+    return jsonify({'ok': True})
+
+@app.route('/api/task/<task_id>/dead_letters', methods=['GET'])
+def get_dead_letters(task_id):
+    """Recipients of a task that failed for good (permanent error or out of retries)"""
+    task = task_manager.get_task(task_id)
+    if not task:
+        return jsonify({'error': 'Task not found'}), 404
+    return jsonify({'dead_letters': task_manager.get_dead_letters(task_id)})
+
+@app.route('/api/task/<task_id>/dead_letters/resubmit', methods=['POST'])
+def resubmit_dead_letters(task_id):
+    """Start a new task for every dead-lettered recipient of a task"""
+    task = task_manager.get_task(task_id)
+    if not task:
+        return jsonify({'error': 'Task not found'}), 404
+    if task.get('status') not in TERMINAL_STATES:
+        return jsonify({'error': 'Task is still running'}), 409
+    
+    dead_letters = task_manager.get_dead_letters(task_id)
+    recipients = [entry['recipient'] for entry in dead_letters]
+    rows = task.get('rows')
+    if rows is not None:
+        rows = [rows[entry['index']] for entry in dead_letters]
+    # Opt-outs or blocks may have arrived since the first run
+    kept, dropped = suppression_index.filter(task['platform'], recipients, skip_contacted=False)
+    if rows is not None:
+        rows = _rows_for(kept, recipients, rows)
+    if not kept:
+        return jsonify({'error': 'No dead letters to resubmit', 'dropped': dropped}), 400
+    recipients = kept
+    
+    try:
+        new_id = launch_task(task['platform'], recipients, task['message'],
+                             received_recipients=len(recipients), dropped=dropped, resubmitted_from=task_id,
+                             columns=task.get('columns') or [], rows=rows, attachment=task.get('attachment'))
+    except QueueFullError:
+        return jsonify({'error': 'Task queue is full'}), 503
+    task_manager.update_task(task_id, resubmitted_as=new_id)
+    return jsonify({'task_id': new_id, 'recipients': len(recipients), 'dropped': dropped})
+
+@app.route('/api/queue', methods=['GET'])
+def get_queue_stats():
+    """Worker pool and queue statistics, the projected ETA of every queued task and all-time totals"""
+    totals = task_manager.totals()
+    return jsonify(dict(task_queue.get_stats(), estimates=queue_estimates(), totals=totals,
+                        total_messages=sum(totals[name] for name in COUNTED_FIELDS)))
+
+@app.route('/api/scheduler', methods=['GET'])
+def get_scheduler_slots():
+    """Upcoming send slots granted by the shared scheduler"""
+    platform = request.args.get('platform')
+    account = request.args.get('account')
+    return jsonify({'upcoming': scheduler.upcoming(platform, account)})
+
+def _bounded_int(value, name, limit):
+    """(value, None) for a missing value or a whole number in 1..limit, else (None, error)"""
+    if value is None:
+        return None, None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None, f'{name} must be a whole number'
+    try:
+        number = int(value)
+    except ValueError:
+        return None, f'{name} must be a whole number'
+    if not 1 <= number <= limit:
+        return None, f'{name} must be between 1 and {limit}'
+    return number, None
+
+@app.route('/api/dry_run', methods=['POST'])
+def dry_run():
+    """
+    Project a campaign's timeline in simulated time (see dryrun.py):
+    {platform, recipients: [...] or count, profiles, bots, start}
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    platform = data.get('platform', 'whatsapp')
+    recipients = data.get('recipients') or []
+    if platform not in ('whatsapp', 'telegram'):
+        return jsonify({'error': f'Unknown platform: {platform}'}), 400
+    if not isinstance(recipients, list):
+        return jsonify({'error': 'recipients must be a list'}), 400
+    if len(recipients) > DRY_RUN_MAX_RECIPIENTS:
+        return jsonify({'error': f'At most {DRY_RUN_MAX_RECIPIENTS} recipients per dry run'}), 400
+    count, error = _bounded_int(data.get('count'), 'count', DRY_RUN_MAX_RECIPIENTS)
+    if error:
+        return jsonify({'error': error}), 400
+    bots, error = _bounded_int(data.get('bots'), 'bots', DRY_RUN_MAX_ACCOUNTS)
+    if error:
+        return jsonify({'error': error}), 400
+    if not recipients and not count:
+        return jsonify({'error': 'Give recipients or count'}), 400
+    profiles = data.get('profiles') or driver_pool.profiles or []
+    if isinstance(profiles, str):
+        profiles = profiles.split(',')
+    if not isinstance(profiles, list) or not all(isinstance(p, str) and p.strip() for p in profiles):
+        return jsonify({'error': 'profiles must be a list of profile names'}), 400
+    if len(profiles) > DRY_RUN_MAX_ACCOUNTS:
+        return jsonify({'error': f'At most {DRY_RUN_MAX_ACCOUNTS} profiles per dry run'}), 400
+    start = data.get('start')
+    if start:
+        try:
+            datetime.strptime(start, "%Y-%m-%d %H:%M")
+        except (TypeError, ValueError):
+            return jsonify({'error': 'start must look like "YYYY-MM-DD HH:MM"'}), 400
+
+    # A separate process: the simulated clock and fake browsers never touch this one
+    command = [sys.executable, DRY_RUN_SCRIPT, '--json', '--platform', platform]
+    command += ['--count', str(count)] if count else ['-']
+    if profiles:
+        command += ['--profiles', ','.join(p.strip() for p in profiles)]
+    if bots:
+        command += ['--bots', str(bots)]
+    if start:
+        command += ['--start', start]
+    try:
+        completed = subprocess.run(command, input='\n'.join(map(str, recipients)), capture_output=True,
+                                   text=True, timeout=DRY_RUN_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return jsonify({'error': f'Dry run took longer than {DRY_RUN_TIMEOUT} s'}), 504
+    if completed.returncode != 0:
+        return jsonify({'error': (completed.stderr.strip().splitlines() or ['Dry run failed'])[-1]}), 500
+    return jsonify(json.loads(completed.stdout))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Send stage timings and counters in the Prometheus text format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/sessions', methods=['GET'])
+def get_sessions():
+    """WhatsApp profile sessions in the driver pool"""
+    return jsonify({'sessions': driver_pool.status(), 'invalid_numbers': invalid_cache.stats()})
+
+@app.route('/api/suppression', methods=['GET'])
+def get_suppression_stats():
+    """Number of suppressed recipients per reason"""
+    return jsonify(suppression_index.stats())
+
+@app.route('/api/suppression', methods=['POST', 'DELETE'])
+def update_suppression():
+    """Add (POST) or lift (DELETE) suppressions: {platform, reason, recipients: [...]}"""
+    data = request.get_json(silent=True) or {}
+    platform = data.get('platform', 'whatsapp')
+    reason = data.get('reason', 'opt_out')
+    recipients = data.get('recipients') or []
+    if reason not in REASONS:
+        return jsonify({'error': f'Unknown reason: {reason}', 'reasons': list(REASONS)}), 400
+    if not isinstance(recipients, list):
+        return jsonify({'error': 'recipients must be a list'}), 400
+    
+    if request.method == 'POST':
+        changed = suppression_index.add(platform, recipients, reason=reason)
+    else:
+        changed = suppression_index.remove(platform, recipients, reason=reason)
+    return jsonify({'changed': changed, 'stats': suppression_index.stats()})
 
 @app.route('/download/<filename>', methods=['GET'])
 def download_file(filename):
-    """Download log file"""
-    return app.send_file(
-        os.path.join('static', 'logs', filename),
-        as_attachment=True
-    )
+    """Download log file (the Excel log is exported on demand from the record file)"""
+    filename = os.path.basename(filename)
+    xlsx_path = os.path.join('static', 'logs', filename)
+    records_path = records_path_for(xlsx_path)
+    if not os.path.exists(records_path):
+        return jsonify({'error': 'Log not found'}), 404
+
+    if not os.path.exists(xlsx_path) or os.path.getmtime(xlsx_path) < os.path.getmtime(records_path):
+        platform = 'telegram' if filename.startswith('telegram') else 'whatsapp'
+        export_xlsx(records_path, xlsx_path, platform=platform)
+
+    return send_file(os.path.abspath(xlsx_path), as_attachment=True)
 
 if __name__ == '__main__':
+    task_executor.start_workers()
+    driver_pool.start_service()
+    threading.Thread(target=resume_unfinished_tasks, name="ResumeTasks", daemon=True).start()
     app.run(host='0.0.0.0', port=5000, debug=False)
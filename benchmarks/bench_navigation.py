@@ -0,0 +1,96 @@
+"""
+Navigation Benchmark for NexoraMsg
+Compares per-recipient chat open time and browser peak RSS for the 'url'
+(full WhatsApp Web reload) and 'inapp' (open chat inside the running app)
+navigation modes.
+
+Only opens chats with the message prefilled; nothing is sent.
+
+Each mode runs in a fresh browser on its own share of the numbers, and the
+mode that goes first alternates between rounds, so neither mode profits
+from chats, caches or memory the other one left behind.
+
+Usage:
+    python benchmarks/bench_navigation.py numbers.txt [--profile default] [--rounds 2]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from urllib.parse import quote
+
+from driver_pool import browser_rss_mb, launch_driver
+from sender import open_chat
+from wa_dom import clear_input, wait_for_chat
+
+MODES = ('url', 'inapp')
+
+
+def run_mode(driver, numbers, mode, message):
+    """Open every chat in one mode; returns (timings, fallbacks, peak_rss_mb)"""
+    encoded = quote(message)
+    timings, fallbacks = [], 0
+    peak_rss = browser_rss_mb(driver) or 0.0
+
+    for number in numbers:
+        started = time.perf_counter()
+        used = open_chat(driver, number, encoded, mode=mode)
+        outcome = wait_for_chat(driver, 40)
+        if not outcome.ready:
+            print(f"⚠️ {number}: {outcome.status}")
+        timings.append(time.perf_counter() - started)
+        if used != mode:
+            fallbacks += 1
+        peak_rss = max(peak_rss, browser_rss_mb(driver) or 0.0)
+        # Leave the chat clean for the next recipient
+        clear_input(driver)
+
+    return timings, fallbacks, peak_rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('numbers_file', help='File with one phone number per line')
+    parser.add_argument('--profile', default='default', help='user_data profile to use (must be logged in)')
+    parser.add_argument('--rounds', type=int, default=2,
+                        help='Rounds, each running both modes (the first mode alternates)')
+    parser.add_argument('--message', default='benchmark draft - not sent')
+    args = parser.parse_args()
+
+    with open(args.numbers_file) as f:
+        numbers = [''.join(filter(str.isdigit, line)) for line in f if line.strip()]
+    # One disjoint share of the numbers per (round, mode)
+    runs = max(1, args.rounds) * len(MODES)
+    if len(numbers) < runs:
+        parser.error(f"need at least {runs} numbers for {args.rounds} rounds")
+    shares = [numbers[i::runs] for i in range(runs)]
+
+    results = {mode: ([], 0, 0.0) for mode in MODES}
+    for round_index in range(max(1, args.rounds)):
+        order = MODES if round_index % 2 == 0 else MODES[::-1]
+        for mode in order:
+            share = shares[round_index * len(MODES) + MODES.index(mode)]
+            driver = launch_driver(args.profile)
+            try:
+                timings, fallbacks, peak_rss = run_mode(driver, share, mode, args.message)
+            finally:
+                driver.quit()
+            all_timings, all_fallbacks, all_peak = results[mode]
+            results[mode] = (all_timings + timings, all_fallbacks + fallbacks, max(all_peak, peak_rss))
+
+    print(f"{'mode':<8}{'n':>6}{'mean s':>10}{'p50 s':>10}{'p95 s':>10}{'peak RSS MB':>14}{'fallbacks':>11}")
+    for mode in MODES:
+        timings, fallbacks, peak_rss = results[mode]
+        ordered = sorted(timings)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(f"{mode:<8}{len(timings):>6}{statistics.mean(timings):>10.2f}"
+              f"{statistics.median(timings):>10.2f}{p95:>10.2f}{peak_rss:>14.1f}{fallbacks:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Sender Benchmark for NexoraMsg
+Python-side cost of whole campaigns through send_whatsapp_messages_with_log
+and send_telegram_messages_with_log, run against a fake WebDriver and a
+stub Bot API with every delay zeroed. Reports per-message overhead,
+throughput and memory per campaign size, and compares them with a stored
+baseline (exit status 1 on a regression). With --check, a case that has
+no baseline recorded under the same settings fails as well, so a missing
+baseline.json cannot pass as "no regression".
+
+Each case runs in a fresh process (clean memory high-water mark, scratch
+database and working directory), --repeat times keeping the fastest run;
+the stub Bot API runs in this process so its cost is not counted.
+
+Usage:
+    python benchmarks/bench_senders.py [--sizes 1000,10000,100000] [--platforms whatsapp,telegram]
+                                       [--latency 0] [--failure-rate 0] [--invalid-rate 0]
+                                       [--repeat 3] [--save-baseline | --check] [--tolerance 0.25]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+MESSAGE = "Hello! 🎉 Your order ships today. Reply STOP to opt out."
+
+# Compared with the baseline: lower is better for both
+COMPARED = ('us_per_msg', 'peak_rss_mb')
+
+
+def _rss_mb() -> float:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_case(platform: str, size: int, args) -> dict:
+    """One campaign in this (child) process; delays zeroed, transports faked"""
+    import app
+    import driver_pool
+    import retry
+    from fakes import FakeBrowserConfig, FakeWebDriver
+    from scheduler import scheduler
+    from sender import send_telegram_messages_with_log, send_whatsapp_messages_with_log
+    from telegram_engine import TelegramConfig
+
+    scheduler.set_policy('whatsapp:account', None)
+    for policy in retry.RETRY_POLICIES.values():
+        policy.base_delay = 0.0
+
+    task_manager = app.TaskManager()
+    log_path = os.path.join('static', 'logs', f'{platform}_bench.xlsx')
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    if platform == 'whatsapp':
+        recipients = [str(919000000000 + i) for i in range(size)]
+    else:
+        recipients = [str(100000000 + i) for i in range(size)]
+    task_id = task_manager.create_task(platform, recipients, MESSAGE)
+
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    if platform == 'whatsapp':
+        driver_pool.driver_pool.launcher = FakeWebDriver.launcher(FakeBrowserConfig(
+            get_latency=args.latency, script_latency=args.latency, find_latency=args.latency,
+            invalid_rate=args.invalid_rate, failure_rate=args.failure_rate,
+        ))
+        send_whatsapp_messages_with_log(recipients, MESSAGE, log_path, task_manager=task_manager,
+                                        task_id=task_id, profiles=['bench'])
+    else:
+        config = TelegramConfig(api_url=args.stub_url, global_rate=0, per_chat_rate=0,
+                                concurrency=args.concurrency)
+        send_telegram_messages_with_log(recipients, MESSAGE, log_path, api_token='1:bench',
+                                        task_manager=task_manager, task_id=task_id, config=config)
+    elapsed = time.perf_counter() - started
+
+    task = task_manager.get_task(task_id)
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        'platform': platform,
+        'size': size,
+        'seconds': round(elapsed, 3),
+        'us_per_msg': round(elapsed / size * 1e6, 1),
+        'throughput': round(size / elapsed, 1),
+        'peak_rss_mb': round(peak_rss_mb, 1),
+        'rss_growth_mb': round(peak_rss_mb - rss_before, 1),
+        'sent': task.get('sent', 0),
+        'failed': task.get('failed', 0),
+        'invalid': task.get('invalid', 0),
+    }
+
+
+def spawn_case(platform: str, size: int, args, stub_url: str) -> dict:
+    """Run one case in a child process with a scratch database and working directory"""
+    with tempfile.TemporaryDirectory(prefix='nexora-bench-') as scratch:
+        output = os.path.join(scratch, 'result.json')
+        env = dict(os.environ, NEXORA_DB=os.path.join(scratch, 'bench.db'))
+        command = [
+            sys.executable, os.path.abspath(__file__), '--case', f'{platform}:{size}', '--output', output,
+            '--latency', str(args.latency), '--failure-rate', str(args.failure_rate),
+            '--invalid-rate', str(args.invalid_rate), '--concurrency', str(args.concurrency),
+            '--stub-url', stub_url,
+        ]
+        completed = subprocess.run(command, cwd=scratch, env=env, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{platform}:{size} failed:\n{completed.stderr}")
+        with open(output) as f:
+            return json.load(f)
+
+
+def settings(args) -> dict:
+    """Parameters a baseline is only comparable under"""
+    return {'latency': args.latency, 'failure_rate': args.failure_rate,
+            'invalid_rate': args.invalid_rate, 'concurrency': args.concurrency}
+
+
+def compare(results, baseline, args):
+    """Print the results next to the baseline; returns (regressions, cases without a baseline)"""
+    regressions, missing = [], []
+    print(f"{'case':<18}{'µs/msg':>10}{'msg/s':>12}{'peak MB':>10}{'growth MB':>11}{'vs baseline':>24}")
+    for result in results:
+        key = f"{result['platform']}:{result['size']}"
+        previous = baseline.get('results', {}).get(key) if baseline.get('settings') == settings(args) else None
+        notes = []
+        if not previous:
+            missing.append(key)
+        for metric in COMPARED:
+            if previous and previous.get(metric):
+                change = result[metric] / previous[metric] - 1
+                notes.append(f"{metric.split('_')[0]} {change:+.0%}")
+                if change > args.tolerance:
+                    regressions.append(f"{key} {metric}: {previous[metric]} -> {result[metric]} ({change:+.0%})")
+        print(f"{key:<18}{result['us_per_msg']:>10.1f}{result['throughput']:>12.1f}"
+              f"{result['peak_rss_mb']:>10.1f}{result['rss_growth_mb']:>11.1f}{', '.join(notes) or '-':>24}")
+    return regressions, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Campaign sizes, comma separated (up to 1000000)')
+    parser.add_argument('--platforms', default='whatsapp,telegram')
+    parser.add_argument('--latency', type=float, default=0.0, help='Fake WebDriver round-trip latency (s)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of failing round trips')
+    parser.add_argument('--invalid-rate', type=float, default=0.0, help='Share of invalid WhatsApp numbers')
+    parser.add_argument('--concurrency', type=int, default=8, help='Telegram workers per bot')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case (the fastest is kept)')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    gate = parser.add_mutually_exclusive_group()
+    gate.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    gate.add_argument('--check', action='store_true',
+                      help='Regression gate: also fail when a case has no comparable baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown before failing')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    parser.add_argument('--stub-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        platform, size = args.case.split(':')
+        with open(args.output, 'w') as f:
+            json.dump(run_case(platform, int(size), args), f)
+        return
+
+    from fakes import StubTelegramServer
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    platforms = [p.strip() for p in args.platforms.split(',') if p.strip()]
+    results = []
+    with StubTelegramServer() as stub:
+        for platform in platforms:
+            for size in sizes:
+                runs = [spawn_case(platform, size, args, stub.url) for _ in range(max(1, args.repeat))]
+                results.append(min(runs, key=lambda run: run['us_per_msg']))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions, missing = compare(results, baseline, args)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'settings': settings(args),
+                       'results': {f"{r['platform']}:{r['size']}": r for r in results}}, f, indent=2)
+        print(f"💾 Baseline saved to {args.baseline}")
+        return
+    if regressions:
+        print("❌ Regressions beyond {:.0%}:".format(args.tolerance))
+        for regression in regressions:
+            print(f"   {regression}")
+    if missing:
+        where = args.baseline if baseline else f"{args.baseline} (missing)"
+        print(f"{'❌' if args.check else 'ℹ️'} No baseline with these settings in {where} for: {', '.join(missing)}")
+        print("   Record one on this machine with --save-baseline")
+    if regressions or (missing and args.check):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
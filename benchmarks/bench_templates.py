@@ -0,0 +1,49 @@
+"""
+Template Benchmark for NexoraMsg
+Time to render and URL-encode personalised messages with a compiled
+template, compared with formatting and quote()-ing each message whole.
+
+Usage:
+    python benchmarks/bench_templates.py [--count 100000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_template import CompiledTemplate
+
+TEMPLATE = ("Hello {name}! 🎉 Your order #{order} ships to {city} today. "
+            "Reply STOP to opt out. Questions? Visit https://example.com/help")
+COLUMNS = ['phone', 'name', 'order', 'city']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=100000, help='Number of personalised messages')
+    args = parser.parse_args()
+
+    rows = [[f"91{9000000000 + i}", f"Name{i % 997}", str(100000 + i), f"City{i % 53}"]
+            for i in range(args.count)]
+
+    started = time.perf_counter()
+    template = CompiledTemplate(TEMPLATE, COLUMNS)
+    compiled = [template.render_url(row) for row in rows]
+    compiled_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    naive = [quote(TEMPLATE.format(name=row[1], order=row[2], city=row[3])) for row in rows]
+    naive_s = time.perf_counter() - started
+
+    assert compiled == naive
+    print(f"{'method':<12}{'total s':>10}{'µs/msg':>10}")
+    print(f"{'compiled':<12}{compiled_s:>10.3f}{compiled_s / args.count * 1e6:>10.2f}")
+    print(f"{'naive':<12}{naive_s:>10.3f}{naive_s / args.count * 1e6:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
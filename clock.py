@@ -0,0 +1,245 @@
+"""
+Clock for NexoraMsg
+The one source of time and sleeping for the senders, scheduler and task
+bookkeeping. Swapping in a SimulatedClock runs whole campaigns in virtual time.
+
+Call through the module (clock.monotonic(), clock.sleep(...)) so a clock set
+with set_clock() is picked up everywhere.
+"""
+
+import heapq
+import itertools
+import threading
+import time as _time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Optional
+
+
+class SystemClock:
+    """Real time"""
+
+    def time(self) -> float:
+        return _time.time()
+
+    def monotonic(self) -> float:
+        return _time.monotonic()
+
+    def sleep(self, seconds: float, passive: bool = False):
+        if seconds > 0:
+            _time.sleep(seconds)
+
+    def wait(self, event: threading.Event, timeout: Optional[float] = None) -> bool:
+        """event.wait(timeout)"""
+        return event.wait(timeout)
+
+    def wait_condition(self, condition: threading.Condition, timeout: Optional[float] = None) -> bool:
+        """condition.wait(timeout), with the condition's lock held"""
+        return condition.wait(timeout)
+
+    def participant(self):
+        return nullcontext()
+
+    def enlisted(self, target):
+        return target
+
+    def participating(self, target):
+        return target
+
+
+class SimulatedClock:
+    """
+    Discrete-event virtual time. Time stands still while any participant
+    thread is working and jumps straight to the earliest wake-up once all of
+    them are asleep on the clock, so a campaign paced over days runs in as
+    long as its Python work takes.
+
+    Threads that do work in virtual time (sender loops, send jobs) run inside
+    participant(). Other threads may sleep on the clock too; they just wake
+    when virtual time reaches them. A participant must not block on anything
+    that only another sleeping participant could release.
+    """
+
+    def __init__(self, start: Optional[float] = None, settle: float = 0.0):
+        """
+        start: wall clock timestamp the simulation begins at (default now).
+        settle: real seconds the clock stays quiet before each jump, giving
+        threads outside participant() (e.g. a feeder handing work to a pool)
+        time to act on what the last wake-up changed.
+        """
+        self._epoch = _time.time() if start is None else start
+        self._settle = settle
+        self._now = 0.0
+        self._cond = threading.Condition()
+        self._wakeups = []          # heap of (wake, seq, participant, passive)
+        self._driving = 0           # wake-ups that are not passive
+        self._seq = itertools.count()
+        self._active = 0            # participants not asleep
+        self._generation = 0        # bumped on every change a jump must wait for
+        self._local = threading.local()
+        threading.Thread(target=self._run, name="SimulatedClock", daemon=True).start()
+
+    def time(self) -> float:
+        return self._epoch + self._now
+
+    def monotonic(self) -> float:
+        return self._now
+
+    @contextmanager
+    def participant(self, _enlisted: bool = False):
+        """Run the block as a participant: virtual time waits for its work"""
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        if not depth and not _enlisted:
+            with self._cond:
+                self._active += 1
+                self._generation += 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if not depth:
+                with self._cond:
+                    self._active -= 1
+                    self._generation += 1
+                    self._cond.notify_all()
+
+    def enlisted(self, target):
+        """
+        Wrap a thread target so it runs as a participant, counted from now
+        rather than from when the thread gets scheduled, so time cannot jump
+        past its start. Only for targets that start right away: a pool job
+        queued behind sleeping participants would hold time still forever
+        (use participating() and a settle for those).
+        """
+        with self._cond:
+            self._active += 1
+            self._generation += 1
+
+        def run(*args, **kwargs):
+            with self.participant(_enlisted=True):
+                return target(*args, **kwargs)
+        return run
+
+    def participating(self, target):
+        """Wrap a target so it runs as a participant from when it starts"""
+        def run(*args, **kwargs):
+            with self.participant():
+                return target(*args, **kwargs)
+        return run
+
+    def _run(self):
+        """Ticker: once every participant is asleep, jump to the next wake-up"""
+        with self._cond:
+            while True:
+                if self._active or not self._driving:
+                    self._cond.wait()
+                    continue
+                if self._settle:
+                    generation = self._generation
+                    self._cond.wait(self._settle)
+                    if self._active or generation != self._generation or not self._driving:
+                        continue
+                self._generation += 1
+                self._now = max(self._now, self._wakeups[0][0])
+                while self._wakeups and self._wakeups[0][0] <= self._now:
+                    _, _, participant, passive = heapq.heappop(self._wakeups)
+                    if not passive:
+                        self._driving -= 1
+                    if participant:
+                        # Counted as working again before it gets to run, so the
+                        # ticker cannot jump past this wake-up in the meantime
+                        self._active += 1
+                self._cond.notify_all()
+
+    def sleep(self, seconds: float, passive: bool = False):
+        """
+        Sleep in virtual time. A passive wake-up never moves time on by
+        itself: it is only reached while something else is waiting on the
+        clock too (e.g. a scheduled pause must not fire before the campaign
+        it pauses has started).
+        """
+        if seconds <= 0:
+            return
+        participant = getattr(self._local, 'depth', 0) > 0
+        with self._cond:
+            wake = self._now + seconds
+            heapq.heappush(self._wakeups, (wake, next(self._seq), participant, passive))
+            if not passive:
+                self._driving += 1
+            self._generation += 1
+            if participant:
+                self._active -= 1
+            self._cond.notify_all()
+            while self._now < wake:
+                self._cond.wait()
+
+    def wait(self, event: threading.Event, timeout: Optional[float] = None) -> bool:
+        """Sleep out the timeout in virtual time; an event set meanwhile is seen on waking"""
+        while not event.is_set():
+            if timeout is not None:
+                self.sleep(timeout)
+                break
+            self.sleep(1.0)
+        return event.is_set()
+
+    def wait_condition(self, condition: threading.Condition, timeout: Optional[float] = None) -> bool:
+        condition.release()
+        try:
+            self.sleep(timeout if timeout is not None else 1.0)
+        finally:
+            condition.acquire()
+        return True
+
+
+_clock = SystemClock()
+
+
+def set_clock(new_clock) -> None:
+    """Replace the process-wide clock (e.g. with a SimulatedClock for a dry run)"""
+    global _clock
+    _clock = new_clock
+
+
+def get_clock():
+    return _clock
+
+
+def time() -> float:
+    return _clock.time()
+
+
+def monotonic() -> float:
+    return _clock.monotonic()
+
+
+def sleep(seconds: float, passive: bool = False):
+    _clock.sleep(seconds, passive)
+
+
+def wait(event: threading.Event, timeout: Optional[float] = None) -> bool:
+    return _clock.wait(event, timeout)
+
+
+def wait_condition(condition: threading.Condition, timeout: Optional[float] = None) -> bool:
+    return _clock.wait_condition(condition, timeout)
+
+
+def participant():
+    """Context manager: the block's work holds simulated time still"""
+    return _clock.participant()
+
+
+def enlisted(target):
+    """target, run as a participant and counted as one already (for threads about to start)"""
+    return _clock.enlisted(target)
+
+
+def participating(target):
+    """target, run as a participant once it starts (for pool jobs)"""
+    return _clock.participating(target)
+
+
+def now() -> datetime:
+    """Current local datetime on the clock"""
+    return datetime.fromtimestamp(_clock.time())
@@ -0,0 +1,554 @@
+"""
+WhatsApp Driver Pool for NexoraMsg
+Manages one logged-in Chrome session per named profile under user_data/
+"""
+
+import atexit
+import os
+import signal
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import qrcode
+from selenium import webdriver
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+import clock
+
+USER_DATA_ROOT = os.path.join(os.getcwd(), 'user_data')
+PROFILE_SUFFIX = '_profile'
+WHATSAPP_URL = 'https://web.whatsapp.com'
+
+# Lean mode: block resources the sender never looks at and keep Chromium's
+# caches small, for long campaigns on 2-4 GB boards
+LEAN_MODE = os.getenv('WHATSAPP_LEAN_MODE', '0').lower() in ('1', 'true', 'yes')
+
+# Downloads only: media and avatars are fetched from */v/* on the WhatsApp CDN,
+# while attachment uploads go to */mms/* and stay allowed
+BLOCKED_URLS = [
+    '*.whatsapp.net/v/*',       # profile pictures, images, stickers, voice notes
+    '*.woff', '*.woff2', '*.ttf',
+] + [p.strip() for p in os.getenv('WHATSAPP_BLOCKED_URLS', '').split(',') if p.strip()]
+
+LEAN_ARGUMENTS = [
+    '--disk-cache-size=33554432',           # 32 MB
+    '--media-cache-size=1048576',
+    '--aggressive-cache-discard',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--renderer-process-limit=2',
+    '--js-flags=--max-old-space-size=512',
+]
+
+# Page loads that take longer than this raise instead of hanging the sender
+PAGE_LOAD_TIMEOUT = float(os.getenv('WHATSAPP_PAGE_LOAD_TIMEOUT', '90'))
+
+# Crashed/hung browsers are relaunched at most this many times per session per campaign
+MAX_RESTARTS = int(os.getenv('WHATSAPP_MAX_RESTARTS', '3'))
+
+# Errors that mean the browser session itself is gone, not just one chat
+DEAD_SESSION_EXCEPTIONS = (InvalidSessionIdException, NoSuchWindowException)
+
+# Warm browser service: browsers stay logged in between campaigns, are
+# health-checked in the background and closed after this long unused (0 = never)
+IDLE_TIMEOUT = float(os.getenv('WHATSAPP_IDLE_TIMEOUT_MINUTES', '30')) * 60
+HEALTH_CHECK_INTERVAL = float(os.getenv('WHATSAPP_HEALTH_CHECK_SECONDS', '60'))
+WARM_START = os.getenv('WHATSAPP_WARM_START', '1').lower() in ('1', 'true', 'yes')
+
+# The WhatsApp tab is recycled once the browser's RSS passes this (0 = never)
+RSS_LIMIT_MB = float(os.getenv('WHATSAPP_RSS_LIMIT_MB', '900' if LEAN_MODE else '0'))
+RSS_CHECK_INTERVAL = float(os.getenv('WHATSAPP_RSS_CHECK_SECONDS', '60'))
+
+
+def generate_qr_code(data="https://web.whatsapp.com"):
+    """Generate QR code image and save it"""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    qr_path = os.path.join(os.getcwd(), 'static', 'qr_code.png')
+    os.makedirs('static', exist_ok=True)
+    img.save(qr_path)
+    return qr_path
+
+
+def profile_dir(profile: str) -> str:
+    """Chrome user data directory for a profile name"""
+    return os.path.join(USER_DATA_ROOT, f"{profile}{PROFILE_SUFFIX}")
+
+
+def discover_profiles() -> List[str]:
+    """
+    Profiles to run: WHATSAPP_PROFILES (comma separated) if set,
+    otherwise every user_data/<name>_profile directory, otherwise 'default'.
+    """
+    configured = os.getenv('WHATSAPP_PROFILES', '')
+    if configured.strip():
+        return [p.strip() for p in configured.split(',') if p.strip()]
+    found = []
+    if os.path.isdir(USER_DATA_ROOT):
+        for entry in sorted(os.listdir(USER_DATA_ROOT)):
+            if entry.endswith(PROFILE_SUFFIX) and os.path.isdir(os.path.join(USER_DATA_ROOT, entry)):
+                found.append(entry[:-len(PROFILE_SUFFIX)])
+    return found or ['default']
+
+
+def launch_driver(profile: str = 'default'):
+    """Start Chromium on the profile's user data dir and wait for WhatsApp Web login"""
+    user_data_dir = profile_dir(profile)
+    os.makedirs(user_data_dir, exist_ok=True)
+
+    options = webdriver.ChromeOptions()
+
+    # Try to find Chromium on Raspberry Pi or Desktop
+    chromium_paths = [
+        '/usr/bin/chromium-browser',  # Raspberry Pi standard location
+        '/usr/bin/chromium',          # Alternative location
+        '/snap/bin/chromium',         # Snap installation
+        '/usr/bin/google-chrome',     # Google Chrome
+        '/Applications/Chromium.app/Contents/MacOS/Chromium'  # macOS
+    ]
+
+    chromium_found = False
+    for path in chromium_paths:
+        if os.path.exists(path):
+            options.binary_location = path
+            chromium_found = True
+            print(f"✅ Found Chromium at: {path}")
+            break
+
+    if not chromium_found:
+        print("⚠️  Chromium not found in standard paths, using system default...")
+
+    options.add_argument(f'--user-data-dir={user_data_dir}')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+
+    # Raspberry Pi optimizations
+    options.add_argument('--disable-gpu')  # Disable GPU rendering (Pi issue fix)
+    options.add_argument('--disable-extensions')
+    options.add_argument('--disable-plugins')
+    options.add_argument('--disable-software-rasterizer')
+    options.add_argument('--disable-3d-apis')
+    options.add_argument('--disable-client-side-phishing-detection')
+    if LEAN_MODE:
+        for argument in LEAN_ARGUMENTS:
+            options.add_argument(argument)
+
+    try:
+        # Try with specific chromedriver
+        chromedriver_paths = [
+            '/usr/bin/chromedriver',
+            '/snap/bin/chromium.chromedriver',
+            '/usr/lib/chromium-browser/chromedriver'
+        ]
+
+        service = None
+        for path in chromedriver_paths:
+            if os.path.exists(path):
+                service = Service(path)
+                print(f"✅ Found chromedriver at: {path}")
+                break
+
+        if service:
+            driver = webdriver.Chrome(service=service, options=options)
+        else:
+            # Fallback to automatic chromedriver
+            driver = webdriver.Chrome(options=options)
+    except Exception as e:
+        print(f"⚠️  Chromedriver init error: {e}, trying fallback...")
+        driver = webdriver.Chrome(options=options)
+
+    # Generate and display QR code before showing WhatsApp Web
+    qr_path = generate_qr_code()
+    print(f"📱 QR Code generated at: {qr_path}")
+    print(f"🔐 Please scan the QR code from your phone to login to WhatsApp Web (profile: {profile})")
+
+    apply_lean_mode(driver)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+
+    # Load WhatsApp Web and wait for user login
+    driver.get(WHATSAPP_URL)
+    WebDriverWait(driver, 300).until(
+        EC.presence_of_element_located((By.ID, "side"))
+    )
+    print(f"✅ WhatsApp Web loaded successfully! (profile: {profile})")
+
+    # Headroom for event-driven waits done with execute_async_script
+    driver.set_script_timeout(60)
+    return driver
+
+
+def apply_lean_mode(driver):
+    """Block non-essential downloads in the current tab (a no-op unless LEAN_MODE)"""
+    if not LEAN_MODE:
+        return
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URLS})
+    except Exception as e:
+        print(f"⚠️ Could not enable resource blocking: {e}")
+
+
+def recycle_page(driver, timeout: float = 60) -> bool:
+    """
+    Replace the WhatsApp tab with a fresh one so its renderer process (and
+    everything it has leaked) is thrown away. The login lives in the profile
+    directory, so the new tab comes back logged in. The blank tab is opened
+    before the old one is closed: closing the last window ends the session.
+    Returns False if WhatsApp Web did not come back logged in.
+    """
+    old_handle = driver.current_window_handle
+    driver.switch_to.new_window('tab')
+    new_handle = driver.current_window_handle
+    driver.switch_to.window(old_handle)
+    driver.close()
+    driver.switch_to.window(new_handle)
+    apply_lean_mode(driver)
+    driver.get(WHATSAPP_URL)
+    try:
+        WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.ID, "side")))
+        return True
+    except Exception:
+        return False
+
+
+def _process_table() -> Dict[int, Tuple[int, int]]:
+    """pid -> (ppid, start time in clock ticks since boot) of every process, read from /proc"""
+    table = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # Fields after the parenthesised command name: ppid is the 2nd, starttime the 20th
+                fields = f.read().rsplit(')', 1)[1].split()
+            table[int(entry)] = (int(fields[1]), int(fields[19]))
+        except (OSError, IndexError, ValueError):
+            continue
+    return table
+
+
+def _process_tree(root_pid: int, table: Optional[Dict[int, Tuple[int, int]]] = None) -> List[int]:
+    """root_pid plus all of its descendants"""
+    children = {}
+    for pid, (ppid, _) in (_process_table() if table is None else table).items():
+        children.setdefault(ppid, []).append(pid)
+    tree, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+def _stale_browser_pids(root_pid: int, before: Dict[int, int]) -> List[int]:
+    """
+    Processes of the browser tree recorded in `before` ({pid: start time})
+    that are still running after quit(). A pid only counts if its start time
+    is unchanged (not reused by a new process) and, while chromedriver is
+    still running, it is still one of its descendants.
+    """
+    table = _process_table()
+    alive = {pid for pid, start in before.items() if pid in table and table[pid][1] == start}
+    if root_pid in table and before.get(root_pid, table[root_pid][1]) == table[root_pid][1]:
+        alive &= set(_process_tree(root_pid, table))
+    return sorted(alive)
+
+
+def browser_rss_mb(driver) -> Optional[float]:
+    """Resident memory of chromedriver and every browser process under it (Linux only)"""
+    try:
+        root_pid = driver.service.process.pid
+    except AttributeError:
+        return None
+    if not os.path.isdir('/proc'):
+        return None
+    total_kb = 0
+    for pid in _process_tree(root_pid):
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return round(total_kb / 1024, 1)
+
+
+def browser_memory_mb(driver) -> Optional[float]:
+    """Browser RSS from /proc, or the page's JS heap via CDP where /proc is unavailable"""
+    rss = browser_rss_mb(driver)
+    if rss is not None:
+        return rss
+    try:
+        driver.execute_cdp_cmd('Performance.enable', {})
+        metrics = driver.execute_cdp_cmd('Performance.getMetrics', {})['metrics']
+    except Exception:
+        return None
+    heap = next((m['value'] for m in metrics if m['name'] == 'JSHeapTotalSize'), None)
+    return round(heap / 1048576, 1) if heap is not None else None
+
+
+@dataclass
+class WhatsAppSession:
+    """One named profile and its browser"""
+    name: str
+    driver: object = None
+    healthy: bool = False
+    error: Optional[str] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    send_lock: threading.Lock = field(default_factory=threading.Lock)   # one send at a time per browser
+    rss_mb: Optional[float] = None
+    recycles: int = 0
+    restarts: int = 0
+    downtime: float = 0.0           # seconds spent relaunching crashed browsers
+    users: int = 0                  # campaigns currently holding the session
+    last_used: float = field(default_factory=lambda: clock.monotonic())
+    _checked_at: float = 0.0
+
+    def is_alive(self) -> bool:
+        """Liveness probe: the WebDriver session answers and the page runs a script (not hung)"""
+        if self.driver is None:
+            return False
+        try:
+            self.driver.current_url
+            self.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def is_lost(self, error: BaseException) -> bool:
+        """True if error came from a crashed, closed or hung browser rather than from one chat"""
+        return isinstance(error, DEAD_SESSION_EXCEPTIONS) or not self.is_alive()
+
+    def check_memory(self, limit_mb: float = RSS_LIMIT_MB, interval: float = RSS_CHECK_INTERVAL):
+        """
+        Sample the browser's memory at most once per interval and recycle the
+        WhatsApp tab if it is above limit_mb. Call with send_lock held.
+        Returns (rss_mb, recycled), or None when no sample was due.
+        """
+        now = clock.monotonic()
+        if self.driver is None or now - self._checked_at < interval:
+            return None
+        self._checked_at = now
+        self.rss_mb = browser_memory_mb(self.driver)
+        if self.rss_mb is None or not limit_mb or self.rss_mb < limit_mb:
+            return self.rss_mb, False
+        print(f"♻️ [{self.name}] Browser at {self.rss_mb:.0f} MB (limit {limit_mb:.0f} MB), recycling WhatsApp tab")
+        self.recycles += 1
+        try:
+            if not recycle_page(self.driver):
+                self.healthy = False
+                self.error = "WhatsApp Web did not come back after recycling the tab"
+        except Exception as e:
+            self.healthy = False
+            self.error = f"Tab recycle failed: {e}"
+        self.rss_mb = browser_memory_mb(self.driver)
+        return self.rss_mb, True
+
+
+class DriverPool:
+    """
+    Lazily starts and tracks one WhatsApp session per profile.
+    launcher(profile) returns a logged-in driver (launch_driver unless a
+    fake one is plugged in, e.g. for benchmarks).
+    """
+
+    def __init__(self, profiles: Optional[List[str]] = None, launcher=None):
+        self.profiles = profiles
+        self.launcher = launcher or launch_driver
+        self.sessions: Dict[str, WhatsAppSession] = {}
+        self.lock = threading.Lock()
+
+    def _session(self, name: str) -> WhatsAppSession:
+        with self.lock:
+            session = self.sessions.get(name)
+            if session is None:
+                session = self.sessions[name] = WhatsAppSession(name=name)
+            return session
+
+    def get(self, name: str = 'default') -> WhatsAppSession:
+        """Return the named session, launching its browser if needed"""
+        session = self._session(name)
+        with session.lock:
+            if session.driver is None or not session.is_alive():
+                if session.driver is not None:
+                    self._quit(session)
+                try:
+                    session.driver = self.launcher(name)
+                    session.healthy = True
+                    session.error = None
+                except Exception as e:
+                    session.healthy = False
+                    session.error = str(e)
+                    raise
+        return session
+
+    def restart(self, session: WhatsAppSession, dead_driver=None) -> bool:
+        """
+        Relaunch a crashed or hung browser on the same profile directory, so
+        it comes back logged in without a QR scan. Does nothing if another
+        thread has already replaced dead_driver. Returns True if the session
+        is usable again.
+        """
+        started = clock.monotonic()
+        with session.lock:
+            if dead_driver is not None and session.driver is not dead_driver and session.is_alive():
+                return True
+            print(f"🔄 [{session.name}] Browser session lost, restarting on the same profile...")
+            if session.driver is not None:
+                self._quit(session)
+            try:
+                session.driver = self.launcher(session.name)
+            except Exception as e:
+                session.healthy = False
+                session.error = f"Restart failed: {e}"
+                print(f"❌ [{session.name}] Could not restart browser: {e}")
+                return False
+            session.healthy = True
+            session.error = None
+            session.restarts += 1
+            session.downtime += clock.monotonic() - started
+            session._checked_at = 0.0
+        print(f"✅ [{session.name}] Browser restarted in {clock.monotonic() - started:.1f}s")
+        return True
+
+    def healthy_sessions(self, names: Optional[List[str]] = None) -> List[WhatsAppSession]:
+        """Start (if needed) and return every session that is logged in and responding"""
+        healthy = []
+        for name in names or self.profiles or discover_profiles():
+            try:
+                healthy.append(self.get(name))
+            except Exception as e:
+                print(f"⚠️ WhatsApp session '{name}' unavailable: {e}")
+        return healthy
+
+    def acquire(self, names: Optional[List[str]] = None) -> List[WhatsAppSession]:
+        """
+        healthy_sessions() for a campaign: the sessions are marked in use so
+        the idle reaper leaves them alone until release()
+        """
+        names = names or self.profiles or discover_profiles()
+        with self.lock:
+            for name in names:
+                self.sessions.setdefault(name, WhatsAppSession(name=name)).users += 1
+        healthy = self.healthy_sessions(names)
+        self.release([self.sessions[name] for name in names if self.sessions[name] not in healthy])
+        return healthy
+
+    def release(self, sessions: List[WhatsAppSession]):
+        """A campaign is done with its sessions; their browsers stay warm for the next one"""
+        now = clock.monotonic()
+        with self.lock:
+            for session in sessions:
+                session.users = max(session.users - 1, 0)
+                session.last_used = now
+
+    def start_service(self, warm: bool = WARM_START, idle_timeout: float = IDLE_TIMEOUT,
+                      interval: float = HEALTH_CHECK_INTERVAL):
+        """
+        Run the browsers as a long-lived service: optionally start every
+        profile that has logged in before, then health-check idle sessions
+        in the background (restart dead ones, close unused ones).
+        """
+        atexit.register(self.close)
+
+        def run():
+            if warm:
+                profiles = [name for name in (self.profiles or discover_profiles())
+                            if os.path.isdir(profile_dir(name))]
+                if profiles:
+                    print(f"🔥 Warming up WhatsApp sessions: {', '.join(profiles)}")
+                    self.release(self.acquire(profiles))
+            while True:
+                clock.sleep(interval)
+                try:
+                    self._health_check(idle_timeout)
+                except Exception as e:
+                    print(f"⚠️ Browser health check failed: {e}")
+
+        threading.Thread(target=run, name="BrowserService", daemon=True).start()
+
+    def _health_check(self, idle_timeout: float):
+        """One pass over the idle sessions; busy ones are watched by their campaigns"""
+        now = clock.monotonic()
+        with self.lock:
+            idle = [s for s in self.sessions.values() if s.driver is not None and not s.users]
+        for session in idle:
+            # Skip a session another thread is using right now
+            if not session.send_lock.acquire(blocking=False):
+                continue
+            try:
+                if session.users:
+                    continue
+                if idle_timeout and now - session.last_used > idle_timeout:
+                    print(f"💤 [{session.name}] Idle for {idle_timeout / 60:.0f} min, closing browser")
+                    with session.lock:
+                        if session.driver is not None and not session.users:
+                            self._quit(session)
+                elif not session.is_alive():
+                    self.restart(session, session.driver)
+                else:
+                    session.check_memory()
+            finally:
+                session.send_lock.release()
+
+    def _quit(self, session: WhatsAppSession):
+        root_pid, before = None, {}
+        try:
+            if os.path.isdir('/proc'):
+                root_pid = session.driver.service.process.pid
+                table = _process_table()
+                before = {pid: table[pid][1] for pid in _process_tree(root_pid, table) if pid in table}
+        except (AttributeError, OSError):
+            pass
+        try:
+            session.driver.quit()
+        except Exception:
+            pass
+        # A hung Chromium can outlive quit() and keep the profile locked
+        if before:
+            for pid in _stale_browser_pids(root_pid, before):
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+        session.driver = None
+        session.healthy = False
+
+    def close(self, name: Optional[str] = None):
+        """Quit one session's browser, or all of them"""
+        with self.lock:
+            targets = [self.sessions[name]] if name in self.sessions else (
+                list(self.sessions.values()) if name is None else []
+            )
+        for session in targets:
+            with session.lock:
+                if session.driver is not None:
+                    self._quit(session)
+
+    def status(self) -> List[dict]:
+        now = clock.monotonic()
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return [
+            {'name': s.name, 'running': s.driver is not None, 'healthy': s.healthy, 'error': s.error,
+             'rss_mb': s.rss_mb, 'recycles': s.recycles,
+             'restarts': s.restarts, 'downtime': round(s.downtime, 1),
+             'in_use': s.users, 'idle_s': 0 if s.users else round(now - s.last_used)}
+            for s in sessions
+        ]
+
+
+# Global pool shared by the senders
+driver_pool = DriverPool()
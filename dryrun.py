@@ -0,0 +1,264 @@
+"""
+Dry Run for NexoraMsg
+Runs a whole campaign in simulated time against fake transports and projects
+its timeline: finish time and sends per hour per account.
+
+The campaign is queued and run by a task worker, and goes through the real
+senders, scheduler pacing, retries and the pause/resume control path; only
+the clock (clock.SimulatedClock) and the transports
+(fakes.py) are fake, so a campaign paced over days plays out in seconds.
+Run it as its own process: it works on a scratch database and working
+directory, so real accounts, caches and the app's scheduler are untouched.
+
+Usage:
+    python dryrun.py recipients.txt [--platform whatsapp] [--profiles a,b] [--bots 1]
+                     [--start "2026-10-19 09:00"] [--page-latency 3] [--script-latency 0.3]
+                     [--invalid-rate 0] [--failure-rate 0] [--pause-at H --pause-for H]
+                     [--hourly] [--json]
+    python dryrun.py --count 5000 --profiles a,b
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+MESSAGE = "Dry run"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def read_recipients(path: str) -> list:
+    """One recipient per line ('-' reads stdin)"""
+    f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        return [line.strip() for line in f if line.strip()]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def simulate(platform: str, recipients: list, message: str = MESSAGE, profiles=None, bots: int = 1,
+             start: float = None, page_latency: float = 3.0, script_latency: float = 0.3,
+             invalid_rate: float = 0.0, failure_rate: float = 0.0,
+             pause_at: float = None, pause_for: float = 0.0, seed: int = 0) -> dict:
+    """
+    Run one campaign in simulated time and return its projected timeline.
+    The campaign is queued and run by a TaskExecutor worker like a real one,
+    and a pause goes through the app's control path.
+    Call in a fresh process whose NEXORA_DB and working directory are scratch.
+    """
+    import random
+
+    import app
+    import clock
+    import driver_pool
+    from fakes import FakeBrowserConfig, FakeWebDriver, StubTelegramServer
+    from tasks import TaskExecutor, TaskQueue
+    from telegram_engine import TelegramConfig, bot_account, bot_index, parse_tokens
+
+    random.seed(seed)
+    # Telegram workers are handed their chats by a feeder thread outside the
+    # simulation; a short settle lets each hand-off land before time jumps
+    simulated = clock.SimulatedClock(start=start, settle=0.0002 if platform == 'telegram' else 0.0)
+    clock.set_clock(simulated)
+    os.makedirs(os.path.join('static', 'logs'), exist_ok=True)
+    queue = TaskQueue(max_workers=1)
+
+    def control(task_id):
+        # Passive sleeps: the pause is reached in step with the campaign, never before it starts
+        clock.sleep(pause_at, passive=True)
+        app.apply_control(task_id, 'pause', queue)
+        clock.sleep(pause_for, passive=True)
+        app.apply_control(task_id, 'resume', queue)
+
+    finished = threading.Event()
+    finished_at = []
+
+    def run(task, **sender_kwargs):
+        try:
+            app.send_with_progress(task, **sender_kwargs)
+        finally:
+            finished_at.append(simulated.time())
+            finished.set()
+
+    def campaign(**sender_kwargs):
+        executor = TaskExecutor(queue, handler=lambda task: run(task, **sender_kwargs))
+        task = app.submit_task(task_id, executor=executor)
+        if pause_at is not None:
+            threading.Thread(target=clock.enlisted(control), args=(task_id,), name="DryRunControl",
+                             daemon=True).start()
+        finished.wait()
+        executor.shutdown()
+        return task
+
+    task_id = app.task_manager.create_task(platform, recipients, message)
+    started_at = simulated.time()
+    wall_started = time.perf_counter()
+    if platform == 'whatsapp':
+        profiles = profiles or ['default']
+        driver_pool.driver_pool.launcher = FakeWebDriver.launcher(FakeBrowserConfig(
+            get_latency=page_latency, script_latency=script_latency,
+            invalid_rate=invalid_rate, failure_rate=failure_rate, seed=seed,
+        ))
+        task = campaign(profiles=profiles)
+        account_of = None
+    else:
+        tokens = ','.join(f"{i + 1}:dryrun" for i in range(max(1, bots)))
+        with StubTelegramServer() as stub:
+            task = campaign(api_token=tokens, config=TelegramConfig(api_url=stub.url))
+        accounts = [bot_account(token, i) for i, token in enumerate(parse_tokens(tokens))]
+        account_of = lambda chat_id: accounts[bot_index(chat_id, len(accounts))]
+    wall_seconds = time.perf_counter() - wall_started
+
+    from sendlog import read_records
+    return timeline(platform, read_records(task.log_file), started_at, finished_at[0], account_of,
+                    task=app.task_manager.get_task(task_id), wall_seconds=wall_seconds)
+
+
+def timeline(platform, records, started_at: float, finished_at: float, account_of=None,
+             task=None, wall_seconds: float = 0.0) -> dict:
+    """Per-account and per-hour totals from a campaign's send log records"""
+    hourly = defaultdict(Counter)            # hour offset -> account -> sends
+    accounts = defaultdict(lambda: {'sent': 0, 'failed': 0, 'invalid': 0, 'last_send': None})
+    for record in records:
+        account = record.get('session') or (account_of(record['recipient']) if account_of else 'default')
+        status = record.get('status', '')
+        stats = accounts[account]
+        if status.startswith('Sent'):
+            stats['sent'] += 1
+            sent_at = datetime.strptime(record['timestamp'], TIMESTAMP_FORMAT).timestamp()
+            hourly[max(0, int((sent_at - started_at) // 3600))][account] += 1
+            stats['last_send'] = max(stats['last_send'] or sent_at, sent_at)
+        elif status.startswith('Invalid'):
+            stats['invalid'] += 1
+        else:
+            stats['failed'] += 1
+
+    duration = finished_at - started_at
+    hours = int(duration // 3600) + 1
+    per_account = {}
+    for account, stats in sorted(accounts.items()):
+        counts = [hourly[hour][account] for hour in range(hours)]
+        span_hours = (stats['last_send'] - started_at) / 3600 if stats['last_send'] else 0.0
+        per_account[account] = {
+            'sent': stats['sent'],
+            'failed': stats['failed'],
+            'invalid': stats['invalid'],
+            'last_send': _iso(stats['last_send']) if stats['last_send'] else None,
+            'avg_per_hour': round(stats['sent'] / max(span_hours, 1.0), 1),
+            'peak_per_hour': max(counts, default=0),
+        }
+    return {
+        'platform': platform,
+        'recipients': (task or {}).get('total_recipients', sum(
+            s['sent'] + s['failed'] + s['invalid'] for s in accounts.values())),
+        'sent': sum(s['sent'] for s in accounts.values()),
+        'failed': sum(s['failed'] for s in accounts.values()),
+        'invalid': sum(s['invalid'] for s in accounts.values()),
+        'start': _iso(started_at),
+        'finish': _iso(finished_at),
+        'duration_s': round(duration, 1),
+        'accounts': per_account,
+        'hourly': [
+            {'hour': _iso(started_at + hour * 3600), 'sends': dict(sorted(hourly[hour].items()))}
+            for hour in range(hours)
+        ],
+        'wall_seconds': round(wall_seconds, 2),
+    }
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds')
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    if days:
+        return f"{days} d {hours} h {minutes} m"
+    return f"{hours} h {minutes} m" if hours else f"{minutes} m {seconds} s"
+
+
+def report(result: dict, hourly: bool = False):
+    """Human-readable projection"""
+    platform = 'WhatsApp' if result['platform'] == 'whatsapp' else 'Telegram'
+    print(f"🧪 Dry run: {result['recipients']} {platform} recipients on {len(result['accounts'])} "
+          f"account(s), simulated in {result['wall_seconds']:.1f} s")
+    print(f"   Start:   {result['start'].replace('T', ' ')}")
+    print(f"   Finish:  {result['finish'].replace('T', ' ')}  ({format_duration(result['duration_s'])})")
+    print(f"   Sent {result['sent']} · invalid {result['invalid']} · failed {result['failed']}")
+    print(f"   {'Account':<16}{'sent':>8}{'avg/h':>9}{'peak/h':>9}   last send")
+    for account, stats in result['accounts'].items():
+        last = (stats['last_send'] or '-').replace('T', ' ')
+        print(f"   {account:<16}{stats['sent']:>8}{stats['avg_per_hour']:>9.1f}{stats['peak_per_hour']:>9}   {last}")
+    if hourly:
+        for row in result['hourly']:
+            sends = ', '.join(f"{account} {count}" for account, count in row['sends'].items()) or '-'
+            print(f"   {row['hour'].replace('T', ' ')}  {sends}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recipients', nargs='?', help="File with one recipient per line ('-' for stdin)")
+    parser.add_argument('--count', type=int, help='Simulate this many generated recipients instead')
+    parser.add_argument('--platform', choices=('whatsapp', 'telegram'), default='whatsapp')
+    parser.add_argument('--message', default=MESSAGE)
+    parser.add_argument('--profiles', default='default', help='WhatsApp accounts (profiles), comma separated')
+    parser.add_argument('--bots', type=int, default=1, help='Number of Telegram bots')
+    parser.add_argument('--start', help='Simulated start, "YYYY-MM-DD HH:MM" (default now)')
+    parser.add_argument('--page-latency', type=float, default=3.0, help='Simulated WhatsApp page load (s)')
+    parser.add_argument('--script-latency', type=float, default=0.3, help='Simulated browser round trip (s)')
+    parser.add_argument('--invalid-rate', type=float, default=0.0, help='Share of numbers not on WhatsApp')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of failing browser round trips')
+    parser.add_argument('--pause-at', type=float, help='Pause the campaign this many hours in')
+    parser.add_argument('--pause-for', type=float, default=0.0, help='Hours the pause lasts')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hourly', action='store_true', help='Also print sends per hour')
+    parser.add_argument('--json', action='store_true', help='Print the timeline as JSON')
+    args = parser.parse_args()
+
+    if args.count:
+        base = 919000000000 if args.platform == 'whatsapp' else 100000000
+        recipients = [str(base + i) for i in range(args.count)]
+    elif args.recipients:
+        recipients = read_recipients(args.recipients)
+    else:
+        parser.error('give a recipients file or --count')
+    start = datetime.strptime(args.start, "%Y-%m-%d %H:%M").timestamp() if args.start else None
+
+    with tempfile.TemporaryDirectory(prefix='nexora-dryrun-') as scratch:
+        # Before any project import: the stores open their database on import
+        os.environ['NEXORA_DB'] = os.path.join(scratch, 'dryrun.db')
+        sys.path.insert(0, ROOT)
+        os.chdir(scratch)
+        # The senders narrate every message; keep the terminal for the report
+        real_stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            result = simulate(
+                args.platform, recipients, args.message,
+                profiles=[p.strip() for p in args.profiles.split(',') if p.strip()], bots=args.bots,
+                start=start, page_latency=args.page_latency, script_latency=args.script_latency,
+                invalid_rate=args.invalid_rate, failure_rate=args.failure_rate,
+                pause_at=args.pause_at * 3600 if args.pause_at is not None else None,
+                pause_for=args.pause_for * 3600, seed=args.seed,
+            )
+        finally:
+            sys.stdout.close()
+            sys.stdout = real_stdout
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        report(result, hourly=args.hourly)
+
+
+if __name__ == '__main__':
+    main()
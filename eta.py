@@ -0,0 +1,215 @@
+"""
+ETA Estimator for NexoraMsg
+Online finish-time estimates with confidence intervals for the running and
+queued campaigns, from observed service times and the scheduler's pacing
+"""
+
+import heapq
+import math
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import clock
+from scheduler import BucketPolicy, scheduler
+
+# Weight of the newest service time sample in the moving average
+EWMA_ALPHA = float(os.getenv('NEXORA_ETA_ALPHA', '0.1'))
+
+# Two-sided 90% interval under a normal approximation
+Z_90 = 1.645
+
+# Seconds one message keeps an account busy before any has been observed
+PRIOR_SERVICE_TIME = {'whatsapp': 8.0, 'telegram': 0.3}
+
+
+class Ewma:
+    """Exponentially weighted mean and variance, updated in O(1) per sample"""
+    __slots__ = ('alpha', 'mean', 'var', 'count')
+
+    def __init__(self, alpha: float = EWMA_ALPHA):
+        self.alpha = alpha
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def update(self, value: float):
+        if not self.count:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            increment = self.alpha * diff
+            self.mean += increment
+            self.var = (1 - self.alpha) * (self.var + diff * increment)
+        self.count += 1
+
+
+class ServiceTimes:
+    """
+    Per-account service time (the work of one send, pacing excluded),
+    shared by every campaign so a new or queued one starts from what the
+    previous campaigns on the same account showed
+    """
+
+    def __init__(self, alpha: float = EWMA_ALPHA):
+        self.alpha = alpha
+        self._stats: Dict[Tuple[str, str], Ewma] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, platform: str, account: str, seconds: float):
+        with self._lock:
+            stats = self._stats.get((platform, account))
+            if stats is None:
+                stats = self._stats[(platform, account)] = Ewma(self.alpha)
+            stats.update(max(seconds, 0.0))
+
+    def moments(self, platform: str, account: str) -> Tuple[float, float]:
+        """(mean, variance) in seconds, falling back to the platform prior"""
+        with self._lock:
+            stats = self._stats.get((platform, account))
+            if stats is not None and stats.count:
+                return stats.mean, stats.var
+        return PRIOR_SERVICE_TIME.get(platform, 1.0), 0.0
+
+
+service_times = ServiceTimes()
+
+
+def cycle_moments(service_mean: float, service_var: float, policy: Optional[BucketPolicy],
+                  lanes: int = 1) -> Tuple[float, float]:
+    """
+    Mean and variance of the time an account spends per message. The next
+    slot is reserved once a send returns, so a cycle is the longer of the
+    service time (shared by `lanes` concurrent senders) and the pacing
+    delay, uniform on [1/rate + jitter low, 1/rate + jitter high]. The
+    service time is taken at its mean inside the max.
+    """
+    s = service_mean / max(lanes, 1)
+    v = service_var / max(lanes, 1) ** 2
+    if policy is None:
+        return s, v
+    base = 1.0 / policy.rate if policy.rate > 0 else 0.0
+    lo, hi = base + policy.jitter[0], base + max(policy.jitter[1], policy.jitter[0])
+    if hi <= lo:
+        return (s, v) if s > lo else (lo, 0.0)
+    if s <= lo:
+        return (lo + hi) / 2, (hi - lo) ** 2 / 12
+    if s >= hi:
+        return s, v
+    # Part of the delay range is shorter than the send itself
+    width = hi - lo
+    below = (s - lo) / width
+    mean = below * s + (hi ** 2 - s ** 2) / (2 * width)
+    second = below * s ** 2 + (hi ** 3 - s ** 3) / (3 * width)
+    return mean, max(second - mean ** 2, 0.0) + v * below
+
+
+def estimate(platform: str, accounts: Iterable[str], cycles: float, lanes: int = 1,
+             from_now: bool = True) -> Tuple[float, float]:
+    """
+    (mean, variance) seconds to work through `cycles` paced sends spread
+    evenly over accounts; the slowest account decides. from_now adds the
+    wait for each account's next free slot.
+    """
+    accounts = list(accounts) or ['default']
+    per_account = cycles / len(accounts)
+    policy = scheduler.get_policy(f"{platform}:account")
+    mean, var = 0.0, 0.0
+    for account in accounts:
+        cycle_mean, cycle_var = cycle_moments(*service_times.moments(platform, account), policy, lanes)
+        account_mean = per_account * cycle_mean
+        if from_now:
+            account_mean += scheduler.next_free(platform, account)
+        if account_mean >= mean:
+            mean, var = account_mean, per_account * cycle_var
+    return mean, var
+
+
+def interval(mean: float, var: float) -> Tuple[float, float]:
+    """90% interval around mean"""
+    spread = Z_90 * math.sqrt(var)
+    return max(mean - spread, 0.0), mean + spread
+
+
+def eta_fields(mean: float, var: float, now: Optional[float] = None) -> dict:
+    """Task fields for an estimate: seconds remaining and wall clock ETA with its 90% interval"""
+    now = clock.time() if now is None else now
+    low, high = interval(mean, var)
+    return {
+        'estimated_remaining': int(round(mean)),
+        'eta': round(now + mean),
+        'eta_low': round(now + low),
+        'eta_high': round(now + high),
+    }
+
+
+class CampaignEstimator:
+    """
+    ETA of one running campaign. Each result costs O(accounts): the service
+    time goes into the shared moving average and the paced-sends-per-
+    recipient ratio (retries add sends, cached invalid numbers skip pacing)
+    is kept as two counters, so no history is rescanned.
+    """
+
+    def __init__(self, platform: str, total: int, accounts: Optional[List[str]] = None, lanes: int = 1):
+        self.platform = platform
+        self.total = total
+        self.accounts = list(accounts or ['default'])
+        self.lanes = max(lanes, 1)
+        self.finished = 0
+        self.cycles = 0
+
+    def observe(self, account: Optional[str], outcome: str, service_time: Optional[float] = None):
+        """One recipient finished; service_time is None when it was never paced (e.g. cached invalid)"""
+        self.finished += 1
+        if service_time is not None:
+            self.cycles += 1
+            service_times.observe(self.platform, account or self.accounts[0], service_time)
+        elif outcome == 'failed':
+            self.cycles += 1
+
+    def retried(self):
+        """A paced attempt that will be made again"""
+        self.cycles += 1
+
+    def fields(self, done: int) -> dict:
+        # Laplace prior: one paced send per recipient until results say otherwise
+        per_recipient = (self.cycles + 1) / (self.finished + 1)
+        mean, var = estimate(self.platform, self.accounts, max(self.total - done, 0) * per_recipient, self.lanes)
+        return eta_fields(mean, var)
+
+
+def project_queue(running: List[dict], queued: List[dict], workers: int,
+                  now: Optional[float] = None) -> Dict[str, dict]:
+    """
+    ETA fields for every queued task, in dequeue order. A task starts when
+    a worker frees up and, since campaigns on one platform share its
+    accounts, not before the campaigns ahead of it on that platform finish.
+
+    running: [{'id', 'platform', 'eta', 'eta_high'}] (task fields)
+    queued:  [{'id', 'platform', 'remaining', 'accounts', 'lanes'}]
+    """
+    now = clock.time() if now is None else now
+    # (seconds from now, variance) a worker / a platform's accounts are free again
+    workers_free = []
+    platform_free: Dict[str, Tuple[float, float]] = {}
+    for task in running:
+        mean = max(float(task.get('eta') or now) - now, 0.0)
+        sigma = max(float(task.get('eta_high') or 0) - float(task.get('eta') or 0), 0.0) / Z_90
+        heapq.heappush(workers_free, (mean, sigma ** 2))
+        if mean >= platform_free.get(task['platform'], (0.0, 0.0))[0]:
+            platform_free[task['platform']] = (mean, sigma ** 2)
+    while len(workers_free) < max(workers, 1):
+        heapq.heappush(workers_free, (0.0, 0.0))
+
+    projected = {}
+    for task in queued:
+        worker_start = heapq.heappop(workers_free)
+        start = max(worker_start, platform_free.get(task['platform'], (0.0, 0.0)))
+        duration, duration_var = estimate(task['platform'], task.get('accounts') or ['default'],
+                                          task['remaining'], task.get('lanes', 1), from_now=False)
+        finish = (start[0] + duration, start[1] + duration_var)
+        heapq.heappush(workers_free, finish)
+        platform_free[task['platform']] = finish
+        projected[task['id']] = dict(eta_fields(*finish, now=now), starts_in=int(round(start[0])))
+    return projected
@@ -0,0 +1,329 @@
+"""
+Fake Transports for NexoraMsg
+A scriptable stand-in for a logged-in WhatsApp Web WebDriver and a local stub
+of the Telegram Bot API, for benchmarks and dry runs without real accounts
+"""
+
+import json
+import random
+import socket
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from selenium.common.exceptions import WebDriverException
+
+import clock
+import wa_dom
+from wa_dom import INVALID_NUMBER_TEXT, SELECTORS
+
+
+def _hit(rate: float, key: str) -> bool:
+    """Deterministic per-key coin flip, so a number is invalid on every run"""
+    return rate > 0 and zlib.crc32(key.encode()) % 10000 < rate * 10000
+
+
+@dataclass
+class FakeBrowserConfig:
+    """Latencies (seconds) and failure rates of a simulated WhatsApp Web session"""
+    get_latency: float = 0.0            # driver.get (page load)
+    find_latency: float = 0.0           # find_element / find_elements
+    script_latency: float = 0.0         # execute_script / execute_async_script round trip
+    invalid_rate: float = 0.0           # share of numbers that are not on WhatsApp
+    failure_rate: float = 0.0           # share of round trips raising WebDriverException
+    unconfirmed_rate: float = 0.0       # share of sends whose tick never shows up
+    seed: int = 0
+
+
+class FakeElement:
+    def __init__(self, driver: 'FakeWebDriver'):
+        self._driver = driver
+        self.text = ''
+
+    def click(self):
+        self._driver._send()
+
+    def is_displayed(self) -> bool:
+        return True
+
+    def get_attribute(self, name):
+        return None
+
+    def clear(self):
+        self._driver.input_text = ''
+
+    def send_keys(self, *keys):
+        pass
+
+
+class _SwitchTo:
+    def __init__(self, driver: 'FakeWebDriver'):
+        self._driver = driver
+
+    def new_window(self, kind='tab'):
+        self._driver._handles += 1
+        handle = f"fake-{self._driver._handles}"
+        self._driver.window_handles.append(handle)
+        self._driver.current_window_handle = handle
+
+    def window(self, handle):
+        self._driver.current_window_handle = handle
+
+
+class FakeWebDriver:
+    """
+    Answers the scripts in wa_dom the way a logged-in WhatsApp Web would,
+    with configurable latency and injected failures. Keeps counters only,
+    so campaigns of millions of recipients stay cheap.
+    """
+
+    def __init__(self, config: Optional[FakeBrowserConfig] = None, profile: str = 'default'):
+        self.config = config or FakeBrowserConfig()
+        self.profile = profile
+        self.service = None                 # no browser process: RSS sampling is skipped
+        self.current_url = 'https://web.whatsapp.com/'
+        self.window_handles = ['fake-0']
+        self.current_window_handle = 'fake-0'
+        self.switch_to = _SwitchTo(self)
+        self.calls = Counter()
+        self.sent = 0
+        self.number = None
+        self.invalid = False
+        self.logged_out = False             # set to show the QR login screen
+        self.input_text = ''
+        self.outgoing = 0
+        self._handles = 0
+        self._rng = random.Random(f"{self.config.seed}:{profile}")
+        self._scripts = {
+            wa_dom.PROBE_JS: self._probe,
+            wa_dom.CHAT_RACE_JS: self._chat_race,
+            wa_dom.CONFIRM_JS: self._confirm,
+            wa_dom.OPEN_CHAT_JS: self._open_in_app,
+            wa_dom.STAGE_JS: lambda *args: True,
+            wa_dom.ATTACH_JS: self._attach,
+            wa_dom.CLICK_JS: self._click,
+            wa_dom.CLEAR_INPUT_JS: self._clear,
+        }
+
+    @classmethod
+    def launcher(cls, config: Optional[FakeBrowserConfig] = None):
+        """A DriverPool launcher that hands out fake drivers"""
+        return lambda profile='default': cls(config, profile)
+
+    def _round_trip(self, name: str, latency: float):
+        self.calls[name] += 1
+        if latency > 0:
+            clock.sleep(latency)
+        if self.config.failure_rate > 0 and self._rng.random() < self.config.failure_rate:
+            raise WebDriverException(f"Injected failure in {name}")
+
+    def _open(self, url: str):
+        self.current_url = url
+        query = parse_qs(urlparse(url).query)
+        self.number = (query.get('phone') or [''])[0]
+        self.invalid = _hit(self.config.invalid_rate, self.number)
+        self.input_text = '' if self.invalid else (query.get('text') or [''])[0]
+        self.outgoing = 0
+
+    def _send(self):
+        if self.number and not self.invalid:
+            self.outgoing += 1
+            self.sent += 1
+            self.input_text = ''
+
+    # --- WebDriver API ---
+
+    def get(self, url: str):
+        self._round_trip('get', self.config.get_latency)
+        self._open(url)
+
+    def find_element(self, by=None, value=None):
+        self._round_trip('find_element', self.config.find_latency)
+        return FakeElement(self)
+
+    def find_elements(self, by=None, value=None):
+        self._round_trip('find_elements', self.config.find_latency)
+        return [FakeElement(self)]
+
+    def execute_script(self, script: str, *args):
+        self._round_trip('execute_script', self.config.script_latency)
+        handler = self._scripts.get(script)
+        return handler(*args) if handler else 1
+
+    def execute_async_script(self, script: str, *args):
+        self._round_trip('execute_async_script', self.config.script_latency)
+        handler = self._scripts.get(script)
+        return handler(*args) if handler else None
+
+    def execute_cdp_cmd(self, cmd: str, params: dict):
+        self.calls['execute_cdp_cmd'] += 1
+        return {'metrics': []} if cmd == 'Performance.getMetrics' else {}
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def close(self):
+        if self.current_window_handle in self.window_handles:
+            self.window_handles.remove(self.current_window_handle)
+
+    def quit(self):
+        self.window_handles = []
+
+    # --- wa_dom scripts ---
+
+    def _state(self) -> dict:
+        chat_open = self.number is not None and not self.invalid and not self.logged_out
+        matched = {'side': SELECTORS['side'][0]}
+        if chat_open:
+            for role in ('input', 'send', 'chat', 'outgoing'):
+                matched[role] = SELECTORS[role][0]
+        if self.invalid:
+            matched['dialog'] = SELECTORS['dialog'][0]
+        return {
+            'matched': matched,
+            'send_visible': chat_open and bool(self.input_text),
+            'input_found': chat_open,
+            'input_text': self.input_text,
+            'chat_loaded': chat_open,
+            'logged_in': not self.logged_out,
+            'logged_out': self.logged_out,
+            'offline': False,
+            'dialog_text': INVALID_NUMBER_TEXT if self.invalid else '',
+            'outgoing_count': self.outgoing,
+            'invalid_number': self.invalid,
+        }
+
+    def _probe(self, *args):
+        return self._state()
+
+    def _chat_race(self, *args):
+        state = self._state()
+        status = 'logged_out' if self.logged_out else 'invalid' if self.invalid else 'ready'
+        return {'status': status, 'elapsed_ms': self.config.get_latency * 1000, 'state': state}
+
+    def _confirm(self, selector, baseline, icons, timeout_ms):
+        if self.outgoing <= baseline or self._rng.random() < self.config.unconfirmed_rate:
+            return {'status': None, 'elapsed_ms': timeout_ms}
+        return {'status': 'msg-check', 'elapsed_ms': self.config.script_latency * 1000}
+
+    def _open_in_app(self, url, timeout_ms):
+        self._open(url)
+        return True
+
+    def _attach(self, sha256, input_selector, candidates, timeout_ms):
+        return {'status': 'ready', 'elapsed_ms': self.config.script_latency * 1000,
+                'selector': SELECTORS['media_send'][0]}
+
+    def _click(self, selector):
+        if selector in SELECTORS['send'] or selector in SELECTORS['media_send']:
+            self._send()
+        return True
+
+    def _clear(self, selector):
+        self.input_text = ''
+        return True
+
+
+@dataclass
+class StubTelegramConfig:
+    """Behaviour of the stub Bot API"""
+    latency: float = 0.0                # seconds per request
+    failure_rate: float = 0.0           # share of requests answered with HTTP 500
+    throttle_rate: float = 0.0          # share of requests answered with HTTP 429
+    retry_after: int = 1
+    seed: int = 0
+
+
+class StubTelegramServer:
+    """
+    Local Bot API stand-in on 127.0.0.1 (sendMessage, sendPhoto,
+    sendDocument). Use as a context manager; point TelegramConfig.api_url
+    at .url.
+    """
+
+    def __init__(self, config: Optional[StubTelegramConfig] = None, port: int = 0):
+        self.config = config or StubTelegramConfig()
+        self.requests = Counter()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out as separate writes: don't let Nagle hold the body back
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                status, body = stub._respond(self.path, self.headers.get('Content-Type') or '')
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _respond(self, path: str, content_type: str):
+        method = path.rsplit('/', 1)[-1]
+        upload = content_type.startswith('multipart/')
+        with self._lock:
+            self.requests[method] += 1
+            if upload:
+                self.requests['uploads'] += 1
+            roll = self._rng.random()
+        # Real time even under a simulated clock: the sender is blocked in the HTTP call
+        if self.config.latency > 0:
+            time.sleep(self.config.latency)
+        if roll < self.config.throttle_rate:
+            return 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                         'parameters': {'retry_after': self.config.retry_after}}
+        if roll < self.config.throttle_rate + self.config.failure_rate:
+            return 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+        result = {'message_id': 1}
+        if upload:
+            file_id = f"stub-{method}-{self.requests['uploads']}"
+            result['photo' if method == 'sendPhoto' else 'document'] = (
+                [{'file_id': file_id}] if method == 'sendPhoto' else {'file_id': file_id}
+            )
+        return 200, {'ok': True, 'result': result}
+
+    def start(self) -> 'StubTelegramServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name="StubTelegram", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
@@ -0,0 +1,91 @@
+"""
+Invalid Number Cache for NexoraMsg
+Remembers WhatsApp numbers that turned out not to be on WhatsApp, so later
+campaigns skip them without opening the chat
+"""
+
+import os
+import threading
+from typing import Dict, Optional
+
+import clock
+from suppression import recipient_key
+from taskstore import DEFAULT_DB_PATH, connect
+
+DAY = 86400.0
+
+# How long an invalid verdict is trusted before the number is tried again.
+# Every repeated verdict doubles it, up to the maximum.
+INVALID_TTL = float(os.getenv('WHATSAPP_INVALID_TTL_DAYS', '7')) * DAY
+INVALID_MAX_TTL = float(os.getenv('WHATSAPP_INVALID_MAX_TTL_DAYS', '90')) * DAY
+
+
+class InvalidNumberCache:
+    """
+    Negative cache keyed by the recipient hash. Entries expire (numbers do
+    get registered later); an expired number is re-checked on its next send
+    and, if still invalid, cached again for twice as long.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, ttl: float = INVALID_TTL, max_ttl: float = INVALID_MAX_TTL):
+        self.ttl = ttl
+        self.max_ttl = max_ttl
+        self._conn = connect(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS invalid_numbers (
+                key INTEGER PRIMARY KEY,
+                hits INTEGER NOT NULL,
+                checked_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        self._lock = threading.Lock()
+        # Recently expired rows are kept for their hit count, long-expired ones dropped
+        self._conn.execute("DELETE FROM invalid_numbers WHERE expires_at < ?", (clock.time() - self.max_ttl,))
+        # key -> (hits, expires_at)
+        self._entries: Dict[int, tuple] = {
+            key: (hits, expires_at)
+            for key, hits, expires_at in self._conn.execute("SELECT key, hits, expires_at FROM invalid_numbers")
+        }
+
+    def is_invalid(self, number, now: Optional[float] = None) -> bool:
+        """True if the number is known invalid and its verdict has not expired"""
+        entry = self._entries.get(recipient_key('whatsapp', number))
+        return entry is not None and entry[1] > (now or clock.time())
+
+    def mark_invalid(self, number, now: Optional[float] = None) -> float:
+        """Record an invalid verdict. Returns how long (seconds) it will be trusted."""
+        now = now or clock.time()
+        key = recipient_key('whatsapp', number)
+        with self._lock:
+            hits = self._entries.get(key, (0, 0.0))[0] + 1
+            ttl = min(self.ttl * 2 ** (hits - 1), self.max_ttl)
+            self._entries[key] = (hits, now + ttl)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO invalid_numbers (key, hits, checked_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, hits, now, now + ttl)
+            )
+        return ttl
+
+    def mark_valid(self, number):
+        """Forget a number that has just been messaged successfully"""
+        key = recipient_key('whatsapp', number)
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._conn.execute("DELETE FROM invalid_numbers WHERE key = ?", (key,))
+
+    def stats(self) -> dict:
+        now = clock.time()
+        with self._lock:
+            active = sum(1 for _, expires_at in self._entries.values() if expires_at > now)
+            return {'invalid': active, 'expired': len(self._entries) - active}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Shared by every WhatsApp session
+invalid_cache = InvalidNumberCache()
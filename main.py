@@ -4,6 +4,7 @@ from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 from sender import send_whatsapp_messages_with_log
+from sendlog import export_xlsx
 import uuid
 import os
 import threading
@@ -100,6 +101,9 @@ class WhatsAppUI(BoxLayout):
                 self.status_label.text = f"✅ Sent {idx + 1} / {len(self.numbers)}"
                 time.sleep(1)
 
+            # Build the Excel log from the streamed records
+            export_xlsx(self.log_path, self.log_path)
+
             if not self._stop_flag:
                 self.status_label.text = f"✅ All messages sent!\nLog saved: {self.log_filename}"
         except Exception as e:
@@ -0,0 +1,138 @@
+"""
+Media Attachments for NexoraMsg
+Content-addressed attachment files and the Telegram file_id cache that lets
+every recipient after the first reuse one upload
+"""
+
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Tuple
+
+from taskstore import DEFAULT_DB_PATH, connect
+
+UPLOAD_DIR = os.path.join('static', 'uploads')
+
+# Sent as a Telegram photo (compressed inline image); anything else is a document
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+@dataclass
+class MediaFile:
+    """An attachment on disk, identified by the SHA-256 of its content"""
+    path: str
+    name: str
+    sha256: str
+    size: int
+    mime: str
+
+    @property
+    def kind(self) -> str:
+        """Telegram method flavour: 'photo' or 'document'"""
+        return 'photo' if os.path.splitext(self.name)[1].lower() in PHOTO_EXTENSIONS else 'document'
+
+    @classmethod
+    def from_path(cls, path: str, name: Optional[str] = None) -> 'MediaFile':
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        name = name or os.path.basename(path)
+        return cls(
+            path=path,
+            name=name,
+            sha256=digest.hexdigest(),
+            size=os.path.getsize(path),
+            mime=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+        )
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> Optional['MediaFile']:
+        return cls(**data) if data else None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def read_bytes(self) -> bytes:
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+
+def save_upload(stream, filename: str, directory: str = UPLOAD_DIR) -> MediaFile:
+    """
+    Store an uploaded attachment under its content hash, so uploading the
+    same file again (any name, any campaign) maps to the same MediaFile.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp:
+        shutil.copyfileobj(stream, tmp)
+    staged = MediaFile.from_path(tmp.name, filename)
+    path = os.path.join(directory, staged.sha256 + os.path.splitext(filename)[1].lower())
+    if os.path.exists(path):
+        os.remove(tmp.name)
+    else:
+        os.replace(tmp.name, path)
+    staged.path = path
+    return staged
+
+
+class FileIdCache:
+    """
+    content hash -> Telegram file_id, per bot (a file_id only works for the
+    bot that uploaded it). Persisted so later campaigns skip the upload too.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self._conn = connect(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS telegram_file_ids (
+                bot TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (bot, sha256, kind)
+            )
+            """
+        )
+        self._lock = threading.Lock()
+        self._ids: Dict[Tuple[str, str, str], str] = {
+            (bot, sha256, kind): file_id
+            for bot, sha256, kind, file_id in self._conn.execute(
+                "SELECT bot, sha256, kind, file_id FROM telegram_file_ids"
+            )
+        }
+
+    def get(self, bot: str, media: MediaFile) -> Optional[str]:
+        return self._ids.get((bot, media.sha256, media.kind))
+
+    def put(self, bot: str, media: MediaFile, file_id: str):
+        with self._lock:
+            self._ids[(bot, media.sha256, media.kind)] = file_id
+            self._conn.execute(
+                "INSERT OR REPLACE INTO telegram_file_ids (bot, sha256, kind, file_id, created_at) VALUES (?, ?, ?, ?, ?)",
+                (bot, media.sha256, media.kind, file_id, time.time())
+            )
+
+    def forget(self, bot: str, media: MediaFile):
+        """Drop a file_id Telegram no longer accepts"""
+        with self._lock:
+            if self._ids.pop((bot, media.sha256, media.kind), None) is not None:
+                self._conn.execute(
+                    "DELETE FROM telegram_file_ids WHERE bot = ? AND sha256 = ? AND kind = ?",
+                    (bot, media.sha256, media.kind)
+                )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Shared by every Telegram engine
+file_id_cache = FileIdCache()
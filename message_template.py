@@ -0,0 +1,141 @@
+"""
+Message Templates for NexoraMsg
+Per-recipient messages with {column} placeholders filled from an uploaded
+CSV/XLSX, compiled once per campaign
+"""
+
+import csv
+import html
+import io
+import os
+import re
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import openpyxl
+
+# {column} or {column|default}; {{ and }} are literal braces
+PLACEHOLDER = re.compile(r"\{\{|\}\}|\{([^{}|]+)(?:\|([^{}]*))?\}")
+
+# Header names recognised as the recipient column (otherwise the first column is used)
+RECIPIENT_COLUMNS = ('phone', 'number', 'phone_number', 'mobile', 'whatsapp',
+                     'recipient', 'chat_id', 'username', 'telegram')
+
+
+class TemplateError(ValueError):
+    """Template refers to a column the recipient file does not have"""
+
+
+@lru_cache(maxsize=8192)
+def _quote(value: str) -> str:
+    # Column values repeat a lot (first names, cities): encode each once
+    return quote(value)
+
+
+class CompiledTemplate:
+    """
+    A message split into static text and variable slots. Static text is
+    URL-encoded once at compile time, so rendering a personalised message
+    is a join over a handful of pre-encoded pieces.
+    """
+
+    def __init__(self, source: str, columns: Optional[Sequence[str]] = None):
+        self.source = source
+        self.columns = list(columns or [])
+        positions = {name.strip().lower(): i for i, name in enumerate(self.columns)}
+
+        # segments: str for static text, (column index, default) for a slot
+        segments: List = []
+        static: List[str] = []
+        last = 0
+        for match in PLACEHOLDER.finditer(source):
+            static.append(source[last:match.start()])
+            last = match.end()
+            token = match.group(0)
+            if token in ('{{', '}}'):
+                static.append(token[0])
+                continue
+            name = match.group(1).strip()
+            if name.lower() not in positions:
+                raise TemplateError(
+                    f"Unknown placeholder {{{name}}}; available columns: {', '.join(self.columns) or 'none'}"
+                )
+            segments.append(''.join(static))
+            static = []
+            segments.append((positions[name.lower()], match.group(2) or ''))
+        static.append(source[last:])
+        segments.append(''.join(static))
+
+        self.segments = [seg for seg in segments if seg != '']
+        self.fields = [self.columns[seg[0]] for seg in self.segments if isinstance(seg, tuple)]
+        self._encoded = [_quote(seg) if isinstance(seg, str) else seg for seg in self.segments]
+        self.is_static = not self.fields
+        if self.is_static:
+            self._static_text = ''.join(self.segments)
+            self._static_url = quote(self._static_text)
+
+    @staticmethod
+    def _value(row: Optional[Sequence], slot: Tuple[int, str]) -> str:
+        index, default = slot
+        value = row[index] if row is not None and index < len(row) else None
+        return default if value is None or value == '' else str(value)
+
+    def render(self, row: Optional[Sequence] = None) -> str:
+        """Plain text for one recipient's row"""
+        if self.is_static:
+            return self._static_text
+        return ''.join(seg if isinstance(seg, str) else self._value(row, seg) for seg in self.segments)
+
+    def render_html(self, row: Optional[Sequence] = None) -> str:
+        """Text for Telegram's HTML parse mode: column values are escaped, the template's own markup is kept"""
+        if self.is_static:
+            return self._static_text
+        return ''.join(seg if isinstance(seg, str) else html.escape(self._value(row, seg), quote=False)
+                       for seg in self.segments)
+
+    def render_url(self, row: Optional[Sequence] = None) -> str:
+        """URL-encoded text for the WhatsApp send?text= link"""
+        if self.is_static:
+            return self._static_url
+        return ''.join(seg if isinstance(seg, str) else _quote(self._value(row, seg)) for seg in self._encoded)
+
+
+def _recipient_column(header: List[str]) -> int:
+    lowered = [h.strip().lower() for h in header]
+    for name in RECIPIENT_COLUMNS:
+        if name in lowered:
+            return lowered.index(name)
+    return 0
+
+
+def read_recipient_table(filename: str, stream) -> Tuple[List[str], List[str], List[list]]:
+    """
+    Parse an uploaded CSV/XLSX with a header row.
+    Returns (columns, recipients, rows) where rows[i] holds every column of recipients[i].
+    """
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        wb = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        try:
+            table = [['' if cell is None else str(cell) for cell in row]
+                     for row in wb.worksheets[0].iter_rows(values_only=True)]
+        finally:
+            wb.close()
+    elif ext in ('.csv', '.txt', ''):
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        table = list(csv.reader(text))
+    else:
+        raise ValueError(f"Unsupported recipient file type: {ext} (use .csv or .xlsx)")
+
+    table = [row for row in table if any(cell.strip() for cell in row)]
+    if not table:
+        return [], [], []
+    columns = [h.strip() or f"column{i + 1}" for i, h in enumerate(table[0])]
+    key = _recipient_column(columns)
+    recipients, rows = [], []
+    for row in table[1:]:
+        if key < len(row) and row[key].strip():
+            recipients.append(row[key].strip())
+            rows.append([cell.strip() for cell in row])
+    return columns, recipients, rows
@@ -0,0 +1,196 @@
+"""
+Metrics for NexoraMsg
+Fixed-bucket histograms and counters for the send hot paths, exported in
+the Prometheus text format
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds: from a fast DOM probe up to the multi-minute anti-ban delay
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class _Timer:
+    """Context manager observing the time spent in its block"""
+    __slots__ = ('_child', '_started')
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _HistogramChild:
+    """One label combination: per-bucket counts, sum and count"""
+    __slots__ = ('_bounds', '_counts', '_sum', '_lock')
+
+    def __init__(self, bounds: Sequence[float]):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)    # the last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        slot = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[slot] += 1
+            self._sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _CounterChild:
+    __slots__ = ('_value', '_lock')
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Child for one label combination (created on first use, then a dict lookup)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _label_text(self, values: tuple, extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items(), key=lambda item: item[0])
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        """Observe on a histogram without labels"""
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        """Time a block on a histogram without labels"""
+        return self.labels().time()
+
+    def _render_child(self, values, child) -> List[str]:
+        counts, total = child.snapshot()
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else _number(bound)
+            labels = self._label_text(values, 'le="%s"' % le)
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {_number(total)}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {cumulative}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        """Increment a counter without labels"""
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{self._label_text(values)} {_number(child.value)}"]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+REGISTRY: List[_Metric] = []
+
+STAGE_SECONDS = Histogram(
+    'nexora_send_stage_seconds', 'Time spent in each stage of sending one message',
+    ('platform', 'stage'),
+)
+MESSAGES = Counter('nexora_messages_total', 'Recipients finished, by outcome', ('platform', 'outcome'))
+RETRIES = Counter('nexora_retries_total', 'Transient failures re-queued with backoff', ('platform',))
+LOG_WRITE_SECONDS = Histogram('nexora_log_write_seconds', 'Time to append one send log record')
+XLSX_EXPORT_SECONDS = Histogram('nexora_xlsx_export_seconds', 'Time to export a send log to Excel')
+TASK_LOCK_WAIT_SECONDS = Histogram(
+    'nexora_task_lock_wait_seconds', 'Time waiting for the TaskManager lock in update_task',
+    buckets=(0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0),
+)
+TASK_LOCK_HOLD_SECONDS = Histogram(
+    'nexora_task_lock_hold_seconds', 'Time holding the TaskManager lock in update_task',
+    buckets=(0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0),
+)
+
+
+def stage(platform: str, name: str) -> _Timer:
+    """Time a block as one send stage: `with stage('whatsapp', 'open_chat'): ...`"""
+    return STAGE_SECONDS.labels(platform, name).time()
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
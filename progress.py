@@ -0,0 +1,219 @@
+"""
+Campaign Progress for NexoraMsg
+Thread-safe counters, resume checkpoint and per-session rollup for one campaign
+"""
+
+import threading
+from collections import deque
+from typing import Optional
+
+import clock
+from eta import CampaignEstimator
+from metrics import MESSAGES, RETRIES
+
+# Browser memory samples kept in the task (about 4 hours at one a minute)
+RSS_HISTORY = 240
+
+
+def _ranges(indices) -> list:
+    """Sorted [start, end) runs covering a set of indices"""
+    ranges = []
+    for idx in sorted(indices):
+        if ranges and ranges[-1][1] == idx:
+            ranges[-1][1] = idx + 1
+        else:
+            ranges.append([idx, idx + 1])
+    return ranges
+
+
+class CampaignProgress:
+    """
+    Collects results from any number of sender threads and mirrors them
+    into the task via task_manager.update_task.
+
+    next_index is the resume checkpoint: it only advances past a
+    contiguous run of finished recipients, so results arriving out of
+    order (concurrent Telegram sends, several WhatsApp sessions, retries
+    waiting on backoff) never make a restart skip anyone. The recipients
+    already finished above it are kept in the task as finished_ahead
+    ([start, end) ranges), and pending() leaves them out when resuming,
+    so a restart never sends to them twice either.
+
+    Failed recipients are appended to the task's dead letters
+    (task_manager.add_dead_letter) so they can be re-submitted, and only
+    dead_letter_count goes into the task; retries counts re-queued
+    transient failures and recovered the recipients that got through on
+    a later attempt.
+
+    Every result also refreshes the ETA fields (estimated_remaining, eta,
+    eta_low, eta_high; see eta.py) and elapsed.
+    """
+
+    OUTCOMES = ('sent', 'failed', 'invalid')
+
+    def __init__(self, total: int, task_manager=None, task_id=None, start_index: int = 0,
+                 platform: str = 'unknown', accounts=None, lanes: int = 1):
+        self.total = total
+        self.platform = platform
+        self.task_manager = task_manager
+        self.task_id = task_id
+        self.start_index = start_index
+        self.counts = {outcome: 0 for outcome in self.OUTCOMES}
+        self.sessions = {}
+        self.retries = 0
+        self.recovered = 0
+        self.dead_letter_count = 0
+        self._retrying = set()
+        self.counters = {}
+        self.rss_mb = {}
+        self.rss_history = deque(maxlen=RSS_HISTORY)
+        self.done = start_index
+        self._timings = {}   # name -> (count, mean)
+        self.next_index = start_index
+        self._completed = set()
+        self._finished_ahead = []
+        self._started = clock.monotonic()
+        self.estimator = CampaignEstimator(platform, total, accounts, lanes)
+        self._lock = threading.Lock()
+
+        task = self.task_manager.get_task(self.task_id) if self.task_manager and self.task_id else {}
+        self.resuming = bool(start_index or task.get('finished_ahead'))
+        if self.resuming:
+            # Resuming: carry on from the checkpointed counters
+            for outcome in self.OUTCOMES:
+                self.counts[outcome] = task.get(outcome, 0)
+            self.sessions = {name: dict(stats) for name, stats in (task.get('sessions') or {}).items()}
+            self.retries = task.get('retries', 0)
+            self.recovered = task.get('recovered', 0)
+            self.dead_letter_count = task.get('dead_letter_count', len(task.get('dead_letters') or []))
+            self.rss_history.extend(task.get('rss_history') or [])
+            # Their results are already in the counts above: they are neither sent nor counted again
+            for start, end in task.get('finished_ahead') or []:
+                self._completed.update(range(max(start, start_index), min(end, total)))
+            self.done += len(self._completed)
+            self._finished_ahead = task.get('finished_ahead') or []
+        self._done_at_start = self.done
+
+    def pending(self):
+        """Indices still to be sent: from start_index on, minus the ones finished before a restart"""
+        return [idx for idx in range(self.start_index, self.total) if idx not in self._completed]
+
+    def _update(self, **fields):
+        if self.task_manager and self.task_id:
+            self.task_manager.update_task(self.task_id, **fields)
+
+    def start(self, idx: int, recipient, **fields):
+        """A recipient is now in flight"""
+        self._update(current_recipient=str(recipient), **fields)
+
+    def count(self, **increments):
+        """Add to campaign-level counters (e.g. media uploads) and push them"""
+        with self._lock:
+            for name, amount in increments.items():
+                if name not in self.counters and self.resuming:
+                    # Resuming: continue from the checkpointed value
+                    self.counters[name] = self.task_manager.get_task(self.task_id).get(name, 0)
+                self.counters[name] = self.counters.get(name, 0) + amount
+            self._update(**{name: self.counters[name] for name in increments})
+
+    def sample_rss(self, session: str, rss_mb: float):
+        """Record a browser memory sample; rss_history is the bounded time series"""
+        with self._lock:
+            self.rss_mb[session] = rss_mb
+            self.rss_history.append({'time': round(clock.time(), 1), 'session': session, 'rss_mb': rss_mb})
+            self._update(
+                rss_mb=dict(self.rss_mb),
+                peak_rss_mb=max(sample['rss_mb'] for sample in self.rss_history),
+                rss_history=list(self.rss_history),
+            )
+
+    def retry(self, idx: int, recipient, error: str, backoff: float):
+        """A transient failure was re-queued; the recipient is not finished yet"""
+        RETRIES.labels(self.platform).inc()
+        with self._lock:
+            self.retries += 1
+            self._retrying.add(idx)
+            self.estimator.retried()
+            self._update(retries=self.retries, retrying=len(self._retrying),
+                         last_retry={'recipient': str(recipient), 'error': error, 'backoff': round(backoff, 1)})
+
+    def record(self, idx: int, recipient, outcome: str, session: Optional[str] = None,
+               timings: Optional[dict] = None, error: Optional[str] = None,
+               attempts: int = 1, service_time: Optional[float] = None, **fields):
+        """
+        Count one finished recipient and push the new totals.
+        timings ({name: value}) are kept as last_<name> / avg_<name> task stats.
+        service_time is the seconds its last send took, pacing excluded
+        (None if it was never paced, e.g. a cached invalid number).
+        A 'failed' outcome is appended to the dead letters with its error.
+        """
+        MESSAGES.labels(self.platform, outcome).inc()
+        with self._lock:
+            self.counts[outcome] += 1
+            self.done += 1
+            update = {}
+            if idx in self._retrying:
+                self._retrying.discard(idx)
+                update['retrying'] = len(self._retrying)
+            if outcome == 'sent' and attempts > 1:
+                self.recovered += 1
+                update['recovered'] = self.recovered
+            if outcome == 'failed':
+                self.dead_letter_count += 1
+                update['dead_letter_count'] = self.dead_letter_count
+                if self.task_manager and self.task_id:
+                    self.task_manager.add_dead_letter(self.task_id, {
+                        'index': idx,
+                        'recipient': str(recipient),
+                        'error': error,
+                        'attempts': attempts,
+                        'time': clock.time(),
+                    })
+            if session is not None:
+                stats = self.sessions.setdefault(session, {o: 0 for o in self.OUTCOMES})
+                stats[outcome] = stats.get(outcome, 0) + 1
+
+            self.estimator.observe(session, outcome, service_time)
+            self._completed.add(idx)
+            while self.next_index in self._completed:
+                self._completed.discard(self.next_index)
+                self.next_index += 1
+            finished_ahead = _ranges(self._completed)
+            if finished_ahead != self._finished_ahead:
+                self._finished_ahead = finished_ahead
+                update['finished_ahead'] = finished_ahead
+
+            elapsed = max(clock.monotonic() - self._started, 1e-6)
+            update.update(self.counts)
+            update.update(
+                current_index=self.done,
+                current_recipient=str(recipient),
+                progress_percent=int(self.done / self.total * 100) if self.total else 100,
+                throughput=round((self.done - self._done_at_start) / elapsed, 4),
+                next_index=self.next_index,
+                elapsed=int(elapsed),
+            )
+            update.update(self.estimator.fields(self.done))
+            if self.sessions:
+                update['sessions'] = {name: dict(stats) for name, stats in self.sessions.items()}
+            for name, value in (timings or {}).items():
+                if value is None:
+                    continue
+                count, mean = self._timings.get(name, (0, 0.0))
+                count += 1
+                mean += (value - mean) / count
+                self._timings[name] = (count, mean)
+                update[f'last_{name}'] = value
+                update[f'avg_{name}'] = round(mean, 1)
+            update.update(fields)
+            self._update(**update)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = max(clock.monotonic() - self._started, 1e-6)
+            snap = dict(self.counts)
+            snap['done'] = self.done
+            snap['retries'] = self.retries
+            snap['recovered'] = self.recovered
+            snap['throughput'] = round((self.done - self._done_at_start) / elapsed, 2)
+            return snap
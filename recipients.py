@@ -0,0 +1,81 @@
+"""
+Recipient Lists for NexoraMsg
+Compact, read-only recipient lists: one UTF-8 buffer and an array of end
+offsets instead of a Python str object per recipient
+"""
+
+from array import array
+from collections.abc import Sequence
+from typing import Iterable, Tuple
+
+
+class RecipientList(Sequence):
+    """
+    Immutable list of recipients. A 12-digit number costs 16 bytes here
+    (12 of text, 4 of offset) against about 70 as an item of a list of str;
+    items are decoded back to str only when read.
+    """
+    __slots__ = ('_data', '_ends')
+
+    def __init__(self, recipients: Iterable = ()):
+        if isinstance(recipients, RecipientList):
+            self._data, self._ends = recipients._data, recipients._ends
+            return
+        parts = []
+        ends = array('I')
+        position = 0
+        for recipient in recipients:
+            encoded = str(recipient).encode('utf-8')
+            parts.append(encoded)
+            position += len(encoded)
+            ends.append(position)
+        self._data = b''.join(parts)
+        self._ends = ends
+
+    @classmethod
+    def from_bytes(cls, data: bytes, ends: bytes) -> 'RecipientList':
+        """Rebuild a list stored with to_bytes()"""
+        recipients = cls()
+        recipients._data = bytes(data)
+        recipients._ends = array('I')
+        recipients._ends.frombytes(ends)
+        return recipients
+
+    def to_bytes(self) -> Tuple[bytes, bytes]:
+        """(text, offsets), e.g. for two BLOB columns"""
+        return self._data, self._ends.tobytes()
+
+    def __len__(self) -> int:
+        return len(self._ends)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self._ends)
+        end = self._ends[index]
+        start = self._ends[index - 1] if index else 0
+        return self._data[start:end].decode('utf-8')
+
+    def __iter__(self):
+        data = self._data
+        start = 0
+        for end in self._ends:
+            yield data[start:end].decode('utf-8')
+            start = end
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, RecipientList):
+            return self._data == other._data and self._ends == other._ends
+        if isinstance(other, (list, tuple)):
+            return len(self) == len(other) and all(a == str(b) for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"RecipientList({len(self)} recipients, {len(self._data)} bytes)"
+
+    def nbytes(self) -> int:
+        """Bytes held by the buffer and the offsets"""
+        return len(self._data) + len(self._ends) * self._ends.itemsize
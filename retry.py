@@ -0,0 +1,159 @@
+"""
+Retry Engine for NexoraMsg
+Classifies send failures and re-queues transient ones with exponential backoff
+"""
+
+import heapq
+import itertools
+import os
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+import requests
+from selenium.common.exceptions import (
+    JavascriptException,
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+    WebDriverException,
+)
+
+import clock
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+# Exceptions worth another attempt: timeouts, DOM churn, lost connections
+TRANSIENT_EXCEPTIONS = (
+    TimeoutException,
+    StaleElementReferenceException,
+    NoSuchElementException,
+    JavascriptException,
+    WebDriverException,
+    requests.ConnectionError,
+    requests.Timeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+# Chat outcomes (see wa_dom.CHAT_OUTCOMES) that may clear up by themselves
+TRANSIENT_CHAT_OUTCOMES = ('offline', 'logged_out', 'timeout')
+
+
+def classify(error: BaseException) -> str:
+    """'transient' if retrying the same send later may succeed, else 'permanent'"""
+    outcome = getattr(error, 'outcome', None)
+    if outcome is not None:
+        return TRANSIENT if outcome.status in TRANSIENT_CHAT_OUTCOMES else PERMANENT
+    return TRANSIENT if isinstance(error, TRANSIENT_EXCEPTIONS) else PERMANENT
+
+
+def classify_http(status_code: Optional[int]) -> str:
+    """Bot API responses: throttling and server errors are transient, other 4xx are not"""
+    if status_code is None or status_code == 429 or status_code >= 500:
+        return TRANSIENT
+    return PERMANENT
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with jitter; retried sends still wait for a scheduler slot"""
+    max_attempts: int = 3           # total attempts, first one included
+    base_delay: float = 2.0         # backoff before the first retry (seconds)
+    factor: float = 2.0
+    max_delay: float = 600.0
+
+    def delay(self, attempt: int) -> float:
+        """Backoff after `attempt` failed attempts (1-based), randomised over its upper half"""
+        ceiling = min(self.max_delay, self.base_delay * self.factor ** (attempt - 1))
+        return random.uniform(ceiling / 2, ceiling)
+
+
+MAX_ATTEMPTS = int(os.getenv('NEXORA_MAX_ATTEMPTS', '3'))
+
+# Backoff per platform: WhatsApp retries wait on the order of its anti-ban spacing
+RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    'whatsapp': RetryPolicy(max_attempts=MAX_ATTEMPTS, base_delay=60.0, max_delay=900.0),
+    'telegram': RetryPolicy(max_attempts=MAX_ATTEMPTS, base_delay=2.0, max_delay=120.0),
+}
+
+
+class WorkQueue:
+    """
+    Recipient indices still to be sent for one sender: fresh ones in order,
+    plus transient failures that come back once their backoff has passed.
+    Due retries go first. get() returns None once everything is finished
+    (nothing fresh, nothing waiting, nothing in flight) or the task stops.
+    """
+
+    def __init__(self, indices: Iterable[int], policy: RetryPolicy):
+        self.policy = policy
+        self._fresh = deque(indices)
+        self._retries = []          # heap of (due, seq, idx)
+        self._seq = itertools.count()
+        self._attempts: Dict[int, int] = {}
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def get(self, stop_event: Optional[threading.Event] = None) -> Optional[int]:
+        """Next index to send, blocking while only not-yet-due retries remain"""
+        with self._cond:
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    return None
+                now = clock.monotonic()
+                if self._retries and self._retries[0][0] <= now:
+                    idx = heapq.heappop(self._retries)[2]
+                elif self._fresh:
+                    idx = self._fresh.popleft()
+                elif not self._retries and not self._in_flight:
+                    return None
+                else:
+                    timeout = self._retries[0][0] - now if self._retries else None
+                    # Wake up periodically so a stop is noticed
+                    clock.wait_condition(self._cond, min(timeout, 0.5) if timeout is not None else 0.5)
+                    continue
+                self._in_flight += 1
+                return idx
+
+    def remaining(self) -> int:
+        """Indices not handed out yet: fresh ones plus retries waiting for their backoff"""
+        with self._cond:
+            return len(self._fresh) + len(self._retries)
+
+    def attempts(self, idx: int) -> int:
+        """Attempts made so far for an index, the one in progress included"""
+        with self._cond:
+            return self._attempts.get(idx, 0) + 1
+
+    def done(self, idx: int):
+        """The index reached a final outcome"""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def requeue(self, idx: int):
+        """Put an index back at the front without counting an attempt (the send never happened)"""
+        with self._cond:
+            self._in_flight -= 1
+            self._fresh.appendleft(idx)
+            self._cond.notify_all()
+
+    def retry(self, idx: int) -> Optional[float]:
+        """
+        Put a transient failure back with backoff. Returns the backoff in
+        seconds, or None when it is out of attempts (caller dead-letters it).
+        """
+        with self._cond:
+            attempt = self._attempts.get(idx, 0) + 1
+            self._in_flight -= 1
+            self._cond.notify_all()
+            if attempt >= self.policy.max_attempts:
+                return None
+            self._attempts[idx] = attempt
+            delay = self.policy.delay(attempt)
+            heapq.heappush(self._retries, (clock.monotonic() + delay, next(self._seq), idx))
+            return delay
@@ -0,0 +1,262 @@
+"""
+Send Scheduler for NexoraMsg
+Hands out send slots from per-account and per-platform token buckets
+"""
+
+import itertools
+import random
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import clock
+
+# WhatsApp anti-ban spacing between sends on one account (seconds)
+WHATSAPP_MIN_DELAY = 35.0
+WHATSAPP_MAX_DELAY = 180.0
+
+
+@dataclass
+class BucketPolicy:
+    """Pacing policy for one bucket scope"""
+    rate: float                                 # tokens per second
+    capacity: int = 1                           # burst size
+    jitter: Tuple[float, float] = (0.0, 0.0)    # extra random spacing per grant (seconds)
+
+    def mean_interval(self) -> float:
+        """Expected spacing between consecutive grants"""
+        base = 1.0 / self.rate if self.rate > 0 else 0.0
+        return base + (self.jitter[0] + self.jitter[1]) / 2
+
+
+class TokenBucket:
+    """Token bucket tracked in virtual time (GCRA): no refill thread needed"""
+
+    def __init__(self, policy: BucketPolicy):
+        self.policy = policy
+        self.next_free = 0.0   # monotonic time the bucket is next fully drained to
+
+    def earliest(self, now: float) -> float:
+        """Earliest monotonic time a token is available"""
+        interval = 1.0 / self.policy.rate if self.policy.rate > 0 else 0.0
+        burst_credit = interval * (self.policy.capacity - 1)
+        return max(now, self.next_free - burst_credit)
+
+    def commit(self, slot: float):
+        """Consume a token for a grant at slot"""
+        interval = 1.0 / self.policy.rate if self.policy.rate > 0 else 0.0
+        low, high = self.policy.jitter
+        spacing = interval + (random.uniform(low, high) if high > 0 else 0.0)
+        self.next_free = max(self.next_free, slot) + spacing
+
+    def idle(self, now: float) -> bool:
+        return self.next_free <= now
+
+
+@dataclass
+class Grant:
+    """A reserved send slot"""
+    slot: float                         # monotonic time the send may start
+    platform: str
+    account: str
+    label: Optional[str] = None
+    seq: int = 0
+    reserved_at: float = field(default_factory=lambda: clock.monotonic())
+
+    @property
+    def delay(self) -> float:
+        """Total time between reservation and slot"""
+        return max(0.0, self.slot - self.reserved_at)
+
+    def wall_time(self) -> float:
+        """Slot as a wall clock timestamp"""
+        return clock.time() + (self.slot - clock.monotonic())
+
+
+class SendScheduler:
+    """
+    Single pacing authority shared by every sender.
+
+    Buckets are keyed by scope:
+      '<platform>'                  - whole platform
+      '<platform>:account:<name>'   - one WhatsApp profile / Telegram bot
+      '<platform>:chat:<id>'        - one destination chat
+    A scope only limits sends when a policy is set for it. A policy set on
+    a narrower scope (e.g. 'telegram:account:<bot>' or 'telegram:chat:<bot>')
+    wins over the wider one, so a sender can pace its own accounts without
+    changing anyone else's.
+    """
+
+    PRUNE_THRESHOLD = 10000
+
+    def __init__(self):
+        self._policies: Dict[str, BucketPolicy] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._pending: List[Grant] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def set_policy(self, scope: str, policy: Optional[BucketPolicy]):
+        """Set (or clear with None) the policy for a scope: 'platform', 'platform:account[:<name>]' or 'platform:chat[:<prefix>]'"""
+        with self._lock:
+            if policy is None:
+                self._policies.pop(scope, None)
+            else:
+                self._policies[scope] = policy
+            for key in list(self._buckets):
+                if key == scope or (':' in scope and key.startswith(scope + ':')):
+                    resolved = self._policy_for(key)
+                    if resolved is None:
+                        del self._buckets[key]
+                    else:
+                        self._buckets[key].policy = resolved
+
+    def get_policy(self, scope: str) -> Optional[BucketPolicy]:
+        with self._lock:
+            return self._policies.get(scope)
+
+    def _policy_for(self, key: str) -> Optional[BucketPolicy]:
+        """Policy of the narrowest scope covering a bucket key ('telegram:chat:7:42' -> 'telegram:chat:7' -> 'telegram:chat')"""
+        parts = key.split(':')
+        for end in range(len(parts), min(2, len(parts)) - 1, -1):
+            policy = self._policies.get(':'.join(parts[:end]))
+            if policy is not None:
+                return policy
+        return None
+
+    def _bucket_keys(self, platform: str, account: str, chat=None) -> List[Tuple[str, BucketPolicy]]:
+        keys = [platform, f"{platform}:account:{account}"]
+        if chat is not None:
+            keys.append(f"{platform}:chat:{chat}")
+        return [(key, policy) for key in keys for policy in [self._policy_for(key)] if policy is not None]
+
+    def _prune(self, now: float):
+        for key in [k for k, b in self._buckets.items() if ':chat:' in k and b.idle(now)]:
+            del self._buckets[key]
+
+    def reserve(self, platform: str, account: str = 'default', chat=None,
+                label: Optional[str] = None) -> Grant:
+        """Reserve the next slot allowed by every applicable bucket"""
+        with self._lock:
+            now = clock.monotonic()
+            buckets = []
+            for key, policy in self._bucket_keys(platform, account, chat):
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = TokenBucket(policy)
+                buckets.append(bucket)
+
+            slot = max([now] + [b.earliest(now) for b in buckets])
+            for bucket in buckets:
+                bucket.commit(slot)
+
+            grant = Grant(slot=slot, platform=platform, account=account,
+                          label=label, seq=next(self._seq), reserved_at=now)
+            self._pending.append(grant)
+
+            if len(self._buckets) > self.PRUNE_THRESHOLD:
+                self._prune(now)
+            return grant
+
+    def defer(self, platform: str, account: str, seconds: float):
+        """Push an account's next slot at least `seconds` into the future (e.g. Telegram retry_after)"""
+        key = f"{platform}:account:{account}"
+        with self._lock:
+            policy = self._policy_for(key)
+            if policy is None:
+                return
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(policy)
+            interval = 1.0 / policy.rate if policy.rate > 0 else 0.0
+            burst_credit = interval * (policy.capacity - 1)
+            bucket.next_free = max(bucket.next_free, clock.monotonic() + seconds + burst_credit)
+
+    def wait(self, grant: Grant, stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        Block until the grant's slot. Returns False if stop_event fired first.
+        """
+        try:
+            while True:
+                remaining = grant.slot - clock.monotonic()
+                if remaining <= 0:
+                    return True
+                if stop_event is not None:
+                    if clock.wait(stop_event, remaining):
+                        return False
+                else:
+                    clock.sleep(remaining)
+        finally:
+            self.release(grant)
+
+    def acquire(self, platform: str, account: str = 'default', chat=None,
+                label: Optional[str] = None,
+                stop_event: Optional[threading.Event] = None) -> Optional[Grant]:
+        """Reserve and wait for a slot. Returns None if stopped while waiting."""
+        grant = self.reserve(platform, account, chat, label)
+        return grant if self.wait(grant, stop_event) else None
+
+    def release(self, grant: Grant):
+        """Drop a grant from the upcoming queue (used or abandoned)"""
+        with self._lock:
+            try:
+                self._pending.remove(grant)
+            except ValueError:
+                pass
+
+    def upcoming(self, platform: Optional[str] = None, account: Optional[str] = None) -> List[dict]:
+        """Reserved-but-not-yet-reached slots, soonest first"""
+        with self._lock:
+            grants = sorted(self._pending, key=lambda g: (g.slot, g.seq))
+        now = clock.monotonic()
+        wall_now = clock.time()
+        return [
+            {
+                'platform': g.platform,
+                'account': g.account,
+                'label': g.label,
+                'in_seconds': round(max(0.0, g.slot - now), 3),
+                'at': wall_now + max(0.0, g.slot - now),
+            }
+            for g in grants
+            if (platform is None or g.platform == platform)
+            and (account is None or g.account == account)
+        ]
+
+    def next_free(self, platform: str, account: str = 'default') -> float:
+        """Seconds until the account could be granted its next slot"""
+        with self._lock:
+            now = clock.monotonic()
+            slot = now
+            for key, _ in self._bucket_keys(platform, account):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    slot = max(slot, bucket.earliest(now))
+            return slot - now
+
+    def projected_finish(self, platform: str, account: str, remaining: int) -> float:
+        """Expected seconds to grant `remaining` more slots on one account"""
+        if remaining <= 0:
+            return 0.0
+        with self._lock:
+            policies = [p for _, p in self._bucket_keys(platform, account)]
+        interval = max([p.mean_interval() for p in policies] + [0.0])
+        return self.next_free(platform, account) + interval * (remaining - 1)
+
+
+def wait_while_paused(pause_event: Optional[threading.Event], stop_event: Optional[threading.Event] = None):
+    """Block while a task is paused; returns early once it is stopped"""
+    while pause_event is not None and pause_event.is_set():
+        if stop_event is not None and clock.wait(stop_event, 0.5):
+            return
+        if stop_event is None:
+            clock.sleep(0.5)
+
+
+# Global scheduler instance shared by all senders
+scheduler = SendScheduler()
+scheduler.set_policy('whatsapp:account', BucketPolicy(
+    rate=1.0 / WHATSAPP_MIN_DELAY,
+    capacity=1,
+    jitter=(0.0, WHATSAPP_MAX_DELAY - WHATSAPP_MIN_DELAY),
+))
@@ -1,112 +1,29 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from urllib.parse import quote
-import time
 import os
-import openpyxl
-from datetime import datetime
-import random
-import qrcode
-from io import BytesIO
+import threading
+import clock
+from sendlog import SendLogWriter
+from scheduler import scheduler, wait_while_paused
+from progress import CampaignProgress
+from driver_pool import driver_pool, MAX_RESTARTS
+from invalid_cache import invalid_cache
+from retry import RETRY_POLICIES, TRANSIENT, WorkQueue, classify
+from message_template import CompiledTemplate
+from wa_dom import probe, clear_input, click, wait_for_send_confirmation, open_chat_in_app, wait_for_chat, attach_media, stage_media
+from media import MediaFile
+from metrics import stage
+from selenium.common.exceptions import TimeoutException
 
 # Global Chrome driver (reused across calls)
 driver = None
 
-def generate_qr_code(data="https://web.whatsapp.com"):
-    """Generate QR code image and save it"""
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(data)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    qr_path = os.path.join(os.getcwd(), 'static', 'qr_code.png')
-    os.makedirs('static', exist_ok=True)
-    img.save(qr_path)
-    return qr_path
-
-def get_random_delay():
-    """Get random delay between 35 seconds and 3 minutes"""
-    return random.uniform(35, 180)
-
-def init_driver():
+def init_driver(profile='default'):
+    """Return the logged-in driver for a profile (the default one is kept in the global)"""
     global driver
-    if driver is None:
-        user_data_dir = os.path.join(os.getcwd(), 'user_data', 'default_profile')
-        os.makedirs(user_data_dir, exist_ok=True)
-
-        options = webdriver.ChromeOptions()
-        
-        # Try to find Chromium on Raspberry Pi or Desktop
-        chromium_paths = [
-            '/usr/bin/chromium-browser',  # Raspberry Pi standard location
-            '/usr/bin/chromium',          # Alternative location
-            '/snap/bin/chromium',         # Snap installation
-            '/usr/bin/google-chrome',     # Google Chrome
-            '/Applications/Chromium.app/Contents/MacOS/Chromium'  # macOS
-        ]
-        
-        chromium_found = False
-        for path in chromium_paths:
-            if os.path.exists(path):
-                options.binary_location = path
-                chromium_found = True
-                print(f"✅ Found Chromium at: {path}")
-                break
-        
-        if not chromium_found:
-            print("⚠️  Chromium not found in standard paths, using system default...")
-        
-        options.add_argument(f'--user-data-dir={user_data_dir}')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        
-        # Raspberry Pi optimizations
-        options.add_argument('--disable-gpu')  # Disable GPU rendering (Pi issue fix)
-        options.add_argument('--disable-extensions')
-        options.add_argument('--disable-plugins')
-        options.add_argument('--disable-software-rasterizer')
-        options.add_argument('--disable-3d-apis')
-        options.add_argument('--disable-client-side-phishing-detection')
-        
-        try:
-            # Try with specific chromedriver
-            chromedriver_paths = [
-                '/usr/bin/chromedriver',
-                '/snap/bin/chromium.chromedriver',
-                '/usr/lib/chromium-browser/chromedriver'
-            ]
-            
-            service = None
-            for path in chromedriver_paths:
-                if os.path.exists(path):
-                    service = Service(path)
-                    print(f"✅ Found chromedriver at: {path}")
-                    break
-            
-            if service:
-                driver = webdriver.Chrome(service=service, options=options)
-            else:
-                # Fallback to automatic chromedriver
-                driver = webdriver.Chrome(options=options)
-        except Exception as e:
-            print(f"⚠️  Chromedriver init error: {e}, trying fallback...")
-            driver = webdriver.Chrome(options=options)
-
-        # Generate and display QR code before showing WhatsApp Web
-        qr_path = generate_qr_code()
-        print(f"📱 QR Code generated at: {qr_path}")
-        print("🔐 Please scan the QR code from your phone to login to WhatsApp Web")
-        
-        # Load WhatsApp Web and wait for user login
-        driver.get('https://web.whatsapp.com')
-        WebDriverWait(driver, 300).until(
-            EC.presence_of_element_located((By.ID, "side"))
-        )
-        print("✅ WhatsApp Web loaded successfully!")
-    return driver
+    session = driver_pool.get(profile)
+    if profile == 'default':
+        driver = session.driver
+    return session.driver
 
 def check_and_clear_draft(driver, number):
     """
@@ -114,39 +31,12 @@ def check_and_clear_draft(driver, number):
     Returns True if draft was detected, False if message was sent.
     """
     try:
-        # Look for the message input field
-        input_selectors = [
-            "//div[@contenteditable='true'][@data-tab='1']",  # Message input
-            "//div[@contenteditable='true'][@role='textbox']",
-            "//div[@contenteditable='true'][@spellcheck='false']",
-            "//div[@data-testid='msg-input']"
-        ]
-        
-        for selector in input_selectors:
-            try:
-                input_field = driver.find_element(By.XPATH, selector)
-                text_content = input_field.text or input_field.get_attribute("textContent") or ""
-                
-                if text_content.strip():  # If there's still text in input field
-                    print(f"📝 Draft detected for {number} - clearing...")
-                    
-                    # Try to select all and delete
-                    try:
-                        input_field.clear()
-                    except:
-                        # Fallback: use keyboard shortcuts
-                        driver.execute_script("""
-                            const elem = arguments[0];
-                            elem.textContent = '';
-                            elem.innerText = '';
-                            const event = new Event('input', { bubbles: true });
-                            elem.dispatchEvent(event);
-                        """, input_field)
-                    
-                    time.sleep(0.5)
-                    return True  # Draft was detected and cleared
-            except:
-                continue
+        # One round trip reads the input box (cached selector first)
+        state = probe(driver)
+        if state.has_draft:
+            print(f"📝 Draft detected for {number} - clearing...")
+            clear_input(driver, state)
+            return True  # Draft was detected and cleared
         
         return False  # No draft found
     
@@ -161,37 +51,15 @@ def verify_message_sent(driver, number):
     2. Input field is empty (indicates message sent)
     """
     try:
-        # Method 1: Check if send button is no longer visible/clickable
-        try:
-            send_button = driver.find_element(By.XPATH, '//span[@data-icon="send"]')
-            if send_button.is_displayed():
-                # Send button still visible and clickable means message might still be draft
-                try:
-                    driver.execute_script("arguments[0].scrollIntoView(true);", send_button)
-                    return False
-                except:
-                    pass
-        except:
-            # Send button not found - good sign, message likely sent
-            pass
+        state = probe(driver)
         
-        # Method 2: Check if message input field is empty
-        input_selectors = [
-            "//div[@contenteditable='true'][@data-tab='1']",
-            "//div[@contenteditable='true'][@role='textbox']",
-            "//div[@contenteditable='true'][@spellcheck='false']",
-        ]
+        # Send button still visible means message might still be draft
+        if state.send_visible:
+            return False
         
-        for selector in input_selectors:
-            try:
-                input_field = driver.find_element(By.XPATH, selector)
-                text_content = input_field.text or input_field.get_attribute("textContent") or ""
-                
-                if text_content.strip():
-                    # Still has text - message wasn't sent
-                    return False
-            except:
-                continue
+        # Still has text - message wasn't sent
+        if state.has_draft:
+            return False
         
         # Message appears to have been sent successfully
         return True
@@ -200,197 +68,417 @@ def verify_message_sent(driver, number):
         print(f"⚠️ Error verifying send for {number}: {e}")
         return True  # Assume sent to continue
 
-def send_whatsapp_messages_with_log(numbers, message, log_path, append=False, task_manager=None, task_id=None):
-    # Prepare Excel workbook for logging
-    if append and os.path.exists(log_path):
-        wb = openpyxl.load_workbook(log_path)
-        ws = wb.active
-    else:
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "WhatsApp Logs"
-        ws.append(['Phone Number', 'Status', 'Timestamp', 'Delay Used (sec)'])
+# How chats are opened: 'url' reloads WhatsApp Web per recipient,
+# 'inapp' opens the chat inside the running app (falls back to 'url')
+NAV_MODE = os.getenv('WHATSAPP_NAV_MODE', 'url')
 
-    driver = init_driver()
+def open_chat(driver, number, encoded_message, mode=None):
+    """Navigate to a recipient's chat with the message prefilled. Returns the mode that worked."""
+    url = f"https://web.whatsapp.com/send?phone={number}&text={encoded_message}"
+    if (mode or NAV_MODE) == 'inapp':
+        try:
+            if open_chat_in_app(driver, url):
+                return 'inapp'
+        except Exception as e:
+            print(f"⚠️ In-app navigation error for {number}: {e}")
+        print(f"↩️ In-app navigation failed for {number}, reloading via URL...")
+    driver.get(url)
+    return 'url'
+
+# How long to wait for the chat to open (send button, or a reason it won't appear)
+OPEN_TIMEOUT = 40
+# How long to wait for an attachment's preview after pasting it (seconds)
+ATTACH_TIMEOUT = 20
+# How long to wait for the outgoing bubble's tick after clicking send (seconds)
+CONFIRM_TIMEOUT = 15
+RETRY_CONFIRM_TIMEOUT = 10
+
+# Log status for each way a chat can fail to open
+CHAT_FAILURES = {
+    'offline': "Failed: Offline",
+    'logged_out': "Failed: Logged out",
+    'timeout': "Failed: Timed out waiting for chat",
+}
+
+class ChatUnavailable(Exception):
+    """The chat did not become ready (invalid number, offline, logged out or timeout)"""
+    def __init__(self, outcome):
+        super().__init__(outcome.status)
+        self.outcome = outcome
+
+class SendClicked(Exception):
+    """Send was clicked, then something failed: the message may have gone out, never retry it"""
+    def __init__(self, error, timings):
+        super().__init__(str(error))
+        self.error = error
+        self.timings = timings
+
+def send_whatsapp_message(driver, number, encoded_message, media=None):
+    """
+    Open the chat for one number, click send and wait for the outgoing bubble.
+    With media, the session's staged attachment is pasted in and the message
+    becomes its caption.
+    Returns {'open_ms': ..., 'confirm_ms': ...}; confirm_ms is None if unconfirmed.
+    Raises ChatUnavailable as soon as WhatsApp shows why the chat can't be used,
+    and SendClicked for any error from the click on.
+    """
+    with stage('whatsapp', 'navigate'):
+        open_chat(driver, number, encoded_message)
 
-    encoded_message = quote(message)
+    # Resolves on the first of: send button, invalid number, logged out, offline
+    with stage('whatsapp', 'chat_ready'):
+        outcome = wait_for_chat(driver, OPEN_TIMEOUT)
+    if not outcome.ready:
+        raise ChatUnavailable(outcome)
+    timings = {'open_ms': outcome.latency_ms, 'confirm_ms': None}
+    baseline = outcome.state.outgoing_count
+    if media is not None:
+        with stage('whatsapp', 'attach'):
+            attachment = attach_media(driver, media, ATTACH_TIMEOUT)
+        if not attachment.ready:
+            raise TimeoutException(f"Attachment preview did not open ({attachment.status})")
+        timings['attach_ms'] = attachment.latency_ms
     
-    sent_count = 0
-    failed_count = 0
-    invalid_count = 0
+    try:
+        with stage('whatsapp', 'click_send'):
+            if media is not None:
+                click(driver, 'media_send')
+            else:
+                click(driver, 'send', outcome.state)
+        
+        # Resolves as soon as the new bubble shows its pending/sent tick
+        with stage('whatsapp', 'confirm'):
+            confirmation = wait_for_send_confirmation(driver, baseline, CONFIRM_TIMEOUT)
+        if confirmation.confirmed:
+            timings['confirm_ms'] = confirmation.latency_ms
+            return timings
+        
+        with stage('whatsapp', 'verify'):
+            return _verify_and_retry_send(driver, number, baseline, timings)
+    except Exception as e:
+        # The click may have reached WhatsApp even if its round trip failed
+        raise SendClicked(e, timings) from e
 
-    for idx, number in enumerate(numbers):
+def _verify_and_retry_send(driver, number, baseline, timings):
+    """The tick did not show up: check the send went through, clicking send once more if not"""
+    # Verify message was actually sent (check for success indicators)
+    if not verify_message_sent(driver, number):
+        print(f"⚠️ Send verification failed for {number}, checking again...")
+        # Try clicking send button once more if visible
         try:
-            # Update task progress
-            if task_manager and task_id:
-                task_manager.update_task(
-                    task_id,
-                    current_index=idx + 1,
-                    current_recipient=number,
-                    progress_percent=int((idx + 1) / len(numbers) * 100)
-                )
-            
-            # Get random delay between sends
-            delay = get_random_delay()
-            
-            url = f"https://web.whatsapp.com/send?phone={number}&text={encoded_message}"
-            driver.get(url)
+            state = probe(driver)
+            if state.send_visible:
+                print(f"📤 Retrying send for {number}...")
+                click(driver, 'send', state)
+                confirmation = wait_for_send_confirmation(driver, baseline, RETRY_CONFIRM_TIMEOUT)
+                if confirmation.confirmed:
+                    timings['confirm_ms'] = confirmation.latency_ms
+                    return timings
+        except:
+            pass
+        
+        # Don't let a stuck draft leak into the next chat
+        with stage('whatsapp', 'draft_clear'):
+            check_and_clear_draft(driver, number)
+    return timings
 
-            # Wait for the send button and click
-            send_button = WebDriverWait(driver, 40).until(
-                EC.element_to_be_clickable((By.XPATH, '//span[@data-icon="send"]'))
-            )
-            send_button.click()
-            
-            # Check if message is still in draft and force send if needed
-            time.sleep(2)  # Wait for message to be processed
-            draft_detected = check_and_clear_draft(driver, number)
-            
-            if draft_detected:
-                print(f"📤 Draft detected for {number}, forcing send...")
-                time.sleep(1)
-                try:
-                    send_button = WebDriverWait(driver, 10).until(
-                        EC.element_to_be_clickable((By.XPATH, '//span[@data-icon="send"]'))
-                    )
-                    send_button.click()
-                    time.sleep(2)
-                except:
-                    pass
-            
-            # Verify message was actually sent (check for success indicators)
-            send_verified = verify_message_sent(driver, number)
-            if not send_verified:
-                print(f"⚠️ Send verification failed for {number}, checking again...")
-                time.sleep(1)
-                # Try clicking send button once more if visible
-                try:
-                    send_button = driver.find_element(By.XPATH, '//span[@data-icon="send"]')
-                    if send_button:
-                        print(f"📤 Retrying send for {number}...")
-                        send_button.click()
-                        time.sleep(2)
-                except:
-                    pass
-
-            print(f"✅ Message sent to {number}")
-            ws.append([number, "Sent", datetime.now().strftime("%Y-%m-%d %H:%M:%S"), f"{delay:.1f}"])
-            sent_count += 1
+def _is_invalid_number(driver):
+    """True if WhatsApp is showing the invalid-number popup"""
+    try:
+        return probe(driver).invalid_number
+    except Exception:
+        return False
+
+def _fail_or_retry(idx, number, status, error, transient, attempt, session, queue, log, progress, timings=None):
+    """Re-queue a transient failure with backoff, or log it as failed (dead letter)"""
+    timings = timings or {}
+    backoff = queue.retry(idx) if transient else None
+    if backoff is not None:
+        print(f"🔁 Retrying {number} in {backoff:.1f}s (attempt {attempt + 1}/{queue.policy.max_attempts}): {error}")
+        progress.retry(idx, number, error, backoff)
+        return
+    if not transient:
+        queue.done(idx)
+    print(f"❌ Failed to send to {number}: {error}")
+    log.write(number, status, session=session.name, attempts=attempt, **timings)
+    progress.record(idx, number, 'failed', session=session.name, timings=timings, error=error, attempts=attempt)
+
+def _watch_memory(session, progress):
+    """Sample the browser's RSS into the task and recycle the tab when it grows too large"""
+    sample = session.check_memory()
+    if sample is None:
+        return
+    rss_mb, recycled = sample
+    if recycled:
+        progress.count(browser_recycles=1)
+    if rss_mb is not None:
+        progress.sample_rss(session.name, rss_mb)
+
+def _stage_session_media(driver, media, progress):
+    """The attachment crosses into the browser once per session, not per chat"""
+    if media is None:
+        return
+    with stage('whatsapp', 'stage_media'):
+        staged = stage_media(driver, media)
+    if staged:
+        progress.count(media_uploads=1, media_bytes_uploaded=staged)
+
+def _restart_session(session, dead_driver, progress):
+    """Relaunch a lost browser (other campaigns on it wait); records restart count and downtime"""
+    lost_at = clock.monotonic()
+    with session.send_lock:
+        restarted = driver_pool.restart(session, dead_driver)
+    downtime = round(clock.monotonic() - lost_at, 1)
+    if restarted:
+        progress.count(driver_restarts=1, driver_downtime_s=downtime)
+    return restarted
+
+def _recover_session(session, dead_driver, media, progress):
+    """Restart a lost browser and stage the attachment again. Returns the new driver, or None."""
+    if not _restart_session(session, dead_driver, progress):
+        return None
+    try:
+        _stage_session_media(session.driver, media, progress)
+    except Exception as stage_error:
+        print(f"⚠️ [{session.name}] Could not stage attachment after restart: {stage_error}")
+    return session.driver
+
+def _whatsapp_session_loop(session, queue, numbers, encoded_message_for, log, progress, stop_event=None, pause_event=None, media=None):
+    """
+    Send recipients taken from the campaign's queue, paced by this session's
+    own account budget. A session that is logged out puts its recipient back
+    and stops, so the other sessions send the rest.
+    encoded_message_for(idx) returns the URL-encoded message for recipient idx.
+    """
+    driver = session.driver
+    restarts = 0
+    _stage_session_media(driver, media, progress)
+    while True:
+        wait_while_paused(pause_event, stop_event)
+        idx = queue.get(stop_event)
+        if idx is None:
+            if stop_event is not None and stop_event.is_set():
+                print("⛔ Sending stopped")
+            break
+        number = numbers[idx]
+        attempt = queue.attempts(idx)
+        # Known-invalid numbers are skipped before any navigation or pacing
+        if invalid_cache.is_invalid(number):
+            print(f"⚠️ Invalid number (cached): {number}")
+            log.write(number, "Invalid (cached)", session=session.name)
+            progress.record(idx, number, 'invalid', session=session.name)
+            queue.done(idx)
+            continue
+        try:
+            progress.start(idx, number, current_session=session.name)
             
-            # Update task stats
-            if task_manager and task_id:
-                task_manager.update_task(task_id, sent=sent_count, current_delay=delay)
+            # Wait for the shared scheduler to grant this account a send slot
+            grant = scheduler.reserve('whatsapp', session.name, label=number)
+            progress.start(idx, number, current_delay=round(grant.delay, 1), next_send_at=grant.wall_time())
+            if grant.delay > 0:
+                print(f"⏳ [{session.name}] Waiting {grant.delay:.1f} seconds for next send slot... ({idx+1}/{len(numbers)})")
+            with stage('whatsapp', 'pacing'):
+                granted = scheduler.wait(grant, stop_event)
+            if not granted:
+                print("⛔ Sending stopped")
+                queue.done(idx)
+                break
+            delay = grant.delay
+            sending_since = clock.monotonic()
             
-            # Random delay between messages to avoid WhatsApp ban
-            print(f"⏳ Waiting {delay:.1f} seconds before next message... ({idx+1}/{len(numbers)})")
-            time.sleep(delay)
+            # Campaigns sharing this account take turns on its browser
+            with session.send_lock:
+                _watch_memory(session, progress)
+                with stage('whatsapp', 'send'):
+                    timings = send_whatsapp_message(driver, number, encoded_message_for(idx), media)
+
+            if timings['confirm_ms'] is None:
+                print(f"✅ Message sent to {number} (unconfirmed)")
+            else:
+                print(f"✅ Message sent to {number} (confirmed in {timings['confirm_ms']:.0f} ms)")
+            invalid_cache.mark_valid(number)
+            log.write(number, "Sent", delay, session=session.name, attempts=attempt, **timings)
+            progress.record(idx, number, 'sent', session=session.name, timings=timings, attempts=attempt,
+                            service_time=clock.monotonic() - sending_since)
+            queue.done(idx)
+
+        except SendClicked as e:
+            # Sending again could deliver the message twice: count it as sent, unconfirmed
+            print(f"⚠️ Send clicked for {number} but not confirmed: {e.error}")
+            log.write(number, "Sent (unconfirmed)", delay, session=session.name, attempts=attempt,
+                      error=str(e.error), **e.timings)
+            progress.record(idx, number, 'sent', session=session.name, timings=e.timings, attempts=attempt,
+                            service_time=clock.monotonic() - sending_since)
+            queue.done(idx)
+            if restarts < MAX_RESTARTS and session.is_lost(e.error):
+                restarts += 1
+                driver = _recover_session(session, driver, media, progress) or driver
+
+        except ChatUnavailable as e:
+            outcome = e.outcome
+            timings = {'open_ms': outcome.latency_ms}
+            if outcome.status == 'invalid':
+                print(f"⚠️ Invalid number: {number} (detected in {outcome.latency_ms:.0f} ms)")
+                invalid_cache.mark_invalid(number)
+                log.write(number, "Invalid", session=session.name, **timings)
+                progress.record(idx, number, 'invalid', session=session.name, timings=timings,
+                                service_time=clock.monotonic() - sending_since)
+                queue.done(idx)
+            else:
+                if outcome.status == 'logged_out':
+                    # Nothing was sent: leave this recipient and the rest to the other sessions
+                    session.healthy = False
+                    session.error = "Logged out of WhatsApp Web"
+                    print(f"🔒 [{session.name}] Logged out of WhatsApp Web, this session stops sending")
+                    queue.requeue(idx)
+                    break
+                status = CHAT_FAILURES.get(outcome.status, f"Failed: {outcome.status}")
+                print(f"⚠️ Could not open chat for {number}: {outcome.status} after {outcome.latency_ms:.0f} ms")
+                _fail_or_retry(idx, number, status, outcome.status, classify(e) == TRANSIENT,
+                               attempt, session, queue, log, progress, timings)
 
         except Exception as e:
-            if "Phone number shared via URL is invalid" in driver.page_source:
+            # A crashed or hung browser: bring it back. Send was not clicked yet (see
+            # SendClicked), so the recipient goes back like any other failed attempt.
+            if restarts < MAX_RESTARTS and session.is_lost(e):
+                restarts += 1
+                driver = _recover_session(session, driver, media, progress) or driver
+            if _is_invalid_number(driver):
                 print(f"⚠️ Invalid number: {number}")
-                ws.append([number, "Invalid", datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "-"])
-                invalid_count += 1
+                invalid_cache.mark_invalid(number)
+                log.write(number, "Invalid", session=session.name)
+                progress.record(idx, number, 'invalid', session=session.name)
+                queue.done(idx)
             else:
-                print(f"❌ Failed to send to {number}: {e}")
-                ws.append([number, f"Failed: {str(e)}", datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "-"])
-                failed_count += 1
-            
-            # Update task stats
-            if task_manager and task_id:
-                task_manager.update_task(task_id, failed=failed_count, invalid=invalid_count)
+                _fail_or_retry(idx, number, f"Failed: {str(e)}", str(e), classify(e) == TRANSIENT,
+                               attempt, session, queue, log, progress)
+
+def send_whatsapp_messages_with_log(numbers, message, log_path, append=False, task_manager=None, task_id=None, profiles=None, stop_event=None, pause_event=None, start_index=0, columns=None, rows=None, attachment=None):
+    """
+    Send messages via WhatsApp Web
+    
+    Every healthy profile session (see driver_pool) takes recipients from
+    one shared queue, each paced by its own scheduler budget, and the
+    per-session results are rolled up into the task's stats. Raises
+    RuntimeError if every session is logged out before the end.
+    
+    With columns/rows (from an uploaded recipient file) message is a
+    template whose {column} placeholders are filled from rows[i].
+    attachment (a MediaFile dict) is sent with every message.
+    """
+    sessions = driver_pool.acquire(profiles)
+    if not sessions:
+        raise RuntimeError("No WhatsApp session is available")
+    try:
+        _send_whatsapp_campaign(sessions, numbers, message, log_path, append, task_manager, task_id,
+                                stop_event, pause_event, start_index, columns, rows, attachment)
+    finally:
+        driver_pool.release(sessions)
+
+def _send_whatsapp_campaign(sessions, numbers, message, log_path, append, task_manager, task_id,
+                            stop_event, pause_event, start_index, columns, rows, attachment):
+    """Run one sender thread per acquired session, all taking recipients from one queue"""
+    encoded_message_for = _message_renderer(message, columns, rows, 'url')
+    progress = CampaignProgress(len(numbers), task_manager, task_id, start_index, platform='whatsapp',
+                                accounts=[session.name for session in sessions])
+    # One queue for all sessions: whatever a logged-out session leaves, the others send
+    queue = WorkQueue(progress.pending(), RETRY_POLICIES['whatsapp'])
+    if len(sessions) > 1:
+        print(f"🔀 Sharing {queue.remaining()} recipients across {len(sessions)} WhatsApp sessions")
+
+    # Stream each result to disk as it happens (XLSX is exported on demand)
+    log = SendLogWriter(log_path, append=append)
+    try:
+        threads = []
+        for session in sessions:
+            thread = threading.Thread(
+                target=clock.enlisted(_whatsapp_session_loop),
+                args=(session, queue, numbers, encoded_message_for, log, progress, stop_event, pause_event,
+                      MediaFile.from_dict(attachment)),
+                name=f"WhatsApp-{session.name}",
+                daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+    finally:
+        log.close()
+    print(f"📄 Log saved to {log.path}")
+    unsent = queue.remaining()
+    if unsent and not (stop_event is not None and stop_event.is_set()):
+        raise RuntimeError(f"Logged out of WhatsApp Web on every session, {unsent} recipients not sent: "
+                           f"scan the QR code and resubmit")
 
-    wb.save(log_path)
-    print(f"📄 Log saved to {log_path}")
+def _message_renderer(message, columns=None, rows=None, encoding='url'):
+    """
+    idx -> message text for one recipient. The template is compiled once;
+    without per-recipient rows the message is encoded once and reused.
+    """
+    if not columns or not rows:
+        text = quote(message) if encoding == 'url' else message
+        return lambda idx: text
+    template = CompiledTemplate(message, columns)
+    render = template.render_url if encoding == 'url' else template.render_html
+    return lambda idx: render(rows[idx])
 
 def close_driver():
     global driver
-    if driver:
-        driver.quit()
-        driver = None
+    driver_pool.close()
+    driver = None
 
 
-def send_telegram_messages_with_log(chat_ids, message, log_path, append=False, api_token=None, task_manager=None, task_id=None):
+def send_telegram_messages_with_log(chat_ids, message, log_path, append=False, api_token=None, task_manager=None, task_id=None, config=None, start_index=0, stop_event=None, pause_event=None, columns=None, rows=None, attachment=None):
     """
     Send messages via Telegram Bot API
     
     Args:
         chat_ids: List of Telegram chat IDs or usernames
         message: Message to send
-        log_path: Path to save Excel log
+        log_path: Log path (results are streamed to the matching .jsonl file)
         append: Whether to append to existing log
-        api_token: Telegram Bot API token (from @BotFather)
+        api_token: Telegram Bot API token (from @BotFather); several comma
+                   separated tokens spread the chats across those bots
         task_manager: Task manager for progress tracking
         task_id: Task ID for progress updates
+        config: Optional TelegramConfig (concurrency, rate limits, API URL)
+        start_index: Index of the first chat to send to (when resuming)
+        stop_event / pause_event: Set to stop or pause the campaign
+        columns / rows: Template variables per chat (message is then a {column} template)
+        attachment: Optional MediaFile dict sent with every message (uploaded once per bot)
     """
-    import requests
+    from telegram_engine import TelegramEngine
     
     if not api_token:
         print("❌ Telegram API token not provided!")
         return
     
-    # Prepare Excel workbook for logging
-    if append and os.path.exists(log_path):
-        wb = openpyxl.load_workbook(log_path)
-        ws = wb.active
-    else:
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Telegram Logs"
-        ws.append(['Chat ID', 'Status', 'Timestamp', 'Delay Used (sec)'])
-
-    base_url = f"https://api.telegram.org/bot{api_token}/sendMessage"
-    
-    sent_count = 0
-    failed_count = 0
+    # Stream each result to disk as it happens (XLSX is exported on demand)
+    log = SendLogWriter(log_path, append=append)
 
-    for idx, chat_id in enumerate(chat_ids):
-        try:
-            # Update task progress
-            if task_manager and task_id:
-                task_manager.update_task(
-                    task_id,
-                    current_index=idx + 1,
-                    current_recipient=str(chat_id),
-                    progress_percent=int((idx + 1) / len(chat_ids) * 100)
-                )
-            
-            # Get random delay between sends
-            delay = get_random_delay()
-            
-            payload = {
-                "chat_id": chat_id,
-                "text": message,
-                "parse_mode": "HTML"
-            }
-            
-            response = requests.post(base_url, json=payload, timeout=10)
-            
-            if response.status_code == 200:
-                print(f"✅ Message sent to {chat_id}")
-                ws.append([chat_id, "Sent", datetime.now().strftime("%Y-%m-%d %H:%M:%S"), f"{delay:.1f}"])
-                sent_count += 1
-            else:
-                error_msg = response.json().get('description', 'Unknown error')
-                print(f"❌ Failed to send to {chat_id}: {error_msg}")
-                ws.append([chat_id, f"Failed: {error_msg}", datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "-"])
-                failed_count += 1
-            
-            # Update task stats
-            if task_manager and task_id:
-                task_manager.update_task(task_id, sent=sent_count, failed=failed_count, current_delay=delay)
-            
-            # Random delay between messages
-            print(f"⏳ Waiting {delay:.1f} seconds before next message... ({idx+1}/{len(chat_ids)})")
-            time.sleep(delay)
-            
-        except Exception as e:
-            print(f"❌ Error sending to {chat_id}: {e}")
-            ws.append([chat_id, f"Error: {str(e)}", datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "-"])
-            failed_count += 1
-            
-            # Update task stats
-            if task_manager and task_id:
-                task_manager.update_task(task_id, failed=failed_count)
+    def log_result(chat_id, ok, error, waited):
+        if ok:
+            print(f"✅ Message sent to {chat_id}")
+            log.write(chat_id, "Sent", waited)
+        elif error.startswith("Error: "):
+            print(f"❌ Error sending to {chat_id}: {error[7:]}")
+            log.write(chat_id, error)
+        else:
+            print(f"❌ Failed to send to {chat_id}: {error}")
+            log.write(chat_id, f"Failed: {error}")
+
+    engine = TelegramEngine(api_token, config)
+    try:
+        stats = engine.send_all(
+            chat_ids, message, on_result=log_result,
+            message_for=_message_renderer(message, columns, rows, 'html'),
+            media=MediaFile.from_dict(attachment),
+            task_manager=task_manager, task_id=task_id, start_index=start_index,
+            stop_event=stop_event, pause_event=pause_event
+        )
+    finally:
+        engine.close()
+        log.close()
 
-    wb.save(log_path)
-    print(f"📄 Log saved to {log_path}")
\ No newline at end of file
+    print(f"📨 Telegram: {stats['sent']} sent, {stats['failed']} failed, {stats['throttled']} throttled ({stats['throughput']} msg/s)")
+    print(f"📄 Log saved to {log.path}")
@@ -0,0 +1,124 @@
+"""
+Send Log for NexoraMsg
+Append-only, crash-safe JSONL record of every send with on-demand XLSX export
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Iterator, Optional
+
+import openpyxl
+
+import clock
+from metrics import LOG_WRITE_SECONDS, XLSX_EXPORT_SECONDS
+
+# Excel layout per platform: (sheet title, recipient column header)
+EXPORT_LAYOUTS = {
+    'whatsapp': ("WhatsApp Logs", "Phone Number"),
+    'telegram': ("Telegram Logs", "Chat ID"),
+}
+
+
+def records_path_for(log_path: str) -> str:
+    """JSONL record file backing an (xlsx) log path"""
+    root, ext = os.path.splitext(log_path)
+    return log_path if ext == '.jsonl' else root + '.jsonl'
+
+
+class SendLogWriter:
+    """
+    Appends one JSON line per send result.
+
+    Every record is flushed to the OS immediately, so a crash of the app
+    loses nothing; fsync is batched (every `fsync_every` records or
+    `fsync_interval` seconds) to bound what a power cut can lose without
+    paying a disk sync per message.
+    """
+
+    def __init__(self, log_path: str, append: bool = True,
+                 fsync_every: int = 20, fsync_interval: float = 2.0):
+        self.path = records_path_for(log_path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a' if append else 'w', encoding='utf-8')
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def write(self, recipient, status: str, delay: Optional[float] = None, **extra):
+        """Append one result"""
+        started = time.perf_counter()
+        record = {
+            'recipient': str(recipient),
+            'status': status,
+            'timestamp': clock.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'delay': round(delay, 1) if delay is not None else None,
+        }
+        record.update(extra)
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            now = time.monotonic()
+            if self._unsynced >= self.fsync_every or now - self._last_sync >= self.fsync_interval:
+                self._sync(now)
+        LOG_WRITE_SECONDS.observe(time.perf_counter() - started)
+
+    def _sync(self, now: float):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = now
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            self._sync(time.monotonic())
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_records(log_path: str) -> Iterator[dict]:
+    """Stream records back, skipping a torn last line left by a crash"""
+    path = records_path_for(log_path)
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def export_xlsx(log_path: str, xlsx_path: str, platform: str = 'whatsapp') -> str:
+    """Build the Excel log from the record file using openpyxl's write-only mode"""
+    title, id_header = EXPORT_LAYOUTS.get(platform, EXPORT_LAYOUTS['whatsapp'])
+
+    with XLSX_EXPORT_SECONDS.time():
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(title)
+        ws.append([id_header, 'Status', 'Timestamp', 'Delay Used (sec)'])
+        for record in read_records(log_path):
+            delay = record.get('delay')
+            ws.append([
+                record.get('recipient'),
+                record.get('status'),
+                record.get('timestamp'),
+                f"{delay:.1f}" if delay is not None else "-",
+            ])
+        wb.save(xlsx_path)
+    return xlsx_path
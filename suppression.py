@@ -0,0 +1,183 @@
+"""
+Suppression Index for NexoraMsg
+Persistent, hashed "do not message" index: recipients already contacted,
+opt-outs and blocked contacts, checked before a campaign is created
+"""
+
+import hashlib
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+from sendlog import read_records
+from taskstore import DEFAULT_DB_PATH, connect
+
+# Suppression reasons, strongest first (a recipient is reported under the first match)
+REASONS = ('blocked', 'opt_out', 'contacted')
+
+
+def normalize(platform: str, recipient) -> str:
+    """Canonical form of a recipient (digits for phone numbers, lowercase for usernames)"""
+    value = str(recipient).strip()
+    if platform == 'whatsapp':
+        return ''.join(filter(str.isdigit, value))
+    return value.lower()
+
+
+def _hash(platform: str, canonical: str) -> int:
+    digest = hashlib.blake2b(f"{platform}:{canonical}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)   # fits SQLite INTEGER
+
+
+def recipient_key(platform: str, recipient) -> int:
+    """
+    64-bit hash of a platform-qualified recipient. Numbers are never stored
+    in clear text, and fixed-size integer keys keep the index compact.
+    """
+    return _hash(platform, normalize(platform, recipient))
+
+
+class SortedKeys:
+    """
+    Sorted array of 64-bit recipient keys: 8 bytes per entry, where a set of
+    ints costs 60-70, so millions of entries fit a Pi.
+    Membership is O(log n), not a set's O(1). That is the price of the
+    smaller index: about 23 comparisons at ten million entries, done in C
+    by bisect. Hashing the recipient costs more than the lookup.
+    """
+    __slots__ = ('keys',)
+
+    def __init__(self, keys: Iterable[int] = (), presorted: bool = False):
+        self.keys = array('q', keys if presorted else sorted(keys))
+
+    def __contains__(self, key: int) -> bool:
+        i = bisect_left(self.keys, key)
+        return i < len(self.keys) and self.keys[i] == key
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add_many(self, fresh: Iterable[int]):
+        """Merge in keys that are not present yet (one O(n) pass per batch)"""
+        self.keys = array('q', heapq.merge(self.keys, sorted(fresh)))
+
+    def remove_many(self, keys: set):
+        self.keys = array('q', (key for key in self.keys if key not in keys))
+
+
+class SuppressionIndex:
+    """
+    One in-memory sorted key array per reason (see SortedKeys) backed by a
+    SQLite table so the index survives restarts.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._conn = connect(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS suppression (
+                key INTEGER NOT NULL,
+                reason TEXT NOT NULL,
+                added_at REAL NOT NULL,
+                PRIMARY KEY (key, reason)
+            ) WITHOUT ROWID
+            """
+        )
+        self._lock = threading.Lock()
+        self._sets: Dict[str, SortedKeys] = {}
+        for reason in REASONS:
+            rows = self._conn.execute("SELECT key FROM suppression WHERE reason = ? ORDER BY key", (reason,))
+            self._sets[reason] = SortedKeys((key for (key,) in rows), presorted=True)
+
+    def add(self, platform: str, recipients: Iterable, reason: str = 'contacted') -> int:
+        """Suppress recipients for a reason. Returns how many were new."""
+        if reason not in REASONS:
+            raise ValueError(f"Unknown suppression reason: {reason}")
+        now = time.time()
+        with self._lock:
+            known = self._sets[reason]
+            canonical = (normalize(platform, r) for r in recipients)
+            fresh = {key for key in (_hash(platform, c) for c in canonical if c) if key not in known}
+            if not fresh:
+                return 0
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO suppression (key, reason, added_at) VALUES (?, ?, ?)",
+                    ((key, reason, now) for key in fresh)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            known.add_many(fresh)
+        return len(fresh)
+
+    def remove(self, platform: str, recipients: Iterable, reason: str) -> int:
+        """Lift a suppression (e.g. a contact opted back in). Returns how many were removed."""
+        with self._lock:
+            known = self._sets.get(reason, SortedKeys())
+            keys = {key for key in (recipient_key(platform, r) for r in recipients) if key in known}
+            if not keys:
+                return 0
+            self._conn.executemany(
+                "DELETE FROM suppression WHERE key = ? AND reason = ?",
+                ((key, reason) for key in keys)
+            )
+            known.remove_many(keys)
+        return len(keys)
+
+    def reason_for(self, platform: str, recipient):
+        """First suppression reason matching a recipient, or None"""
+        key = recipient_key(platform, recipient)
+        for reason in REASONS:
+            if key in self._sets[reason]:
+                return reason
+        return None
+
+    def filter(self, platform: str, recipients: Iterable, skip_contacted: bool = True) -> Tuple[List[str], Dict[str, int]]:
+        """
+        Dedupe an incoming list and drop suppressed recipients in one pass
+        (one O(log n) SortedKeys lookup per recipient and reason).
+        Returns (kept recipients in their original order, {reason: dropped count})
+        where reason is 'empty', 'duplicate' or one of REASONS.
+        """
+        reasons = [r for r in REASONS if skip_contacted or r != 'contacted']
+        dropped = {reason: 0 for reason in ('empty', 'duplicate') + tuple(reasons)}
+        kept, seen = [], set()
+        with self._lock:
+            sets = [(reason, self._sets[reason]) for reason in reasons]
+            for recipient in recipients:
+                canonical = normalize(platform, recipient)
+                if not canonical:
+                    dropped['empty'] += 1
+                    continue
+                key = _hash(platform, canonical)
+                if key in seen:
+                    dropped['duplicate'] += 1
+                    continue
+                seen.add(key)
+                for reason, suppressed in sets:
+                    if key in suppressed:
+                        dropped[reason] += 1
+                        break
+                else:
+                    kept.append(recipient)
+        return kept, {reason: count for reason, count in dropped.items() if count}
+
+    def ingest_log(self, log_path: str, platform: str) -> int:
+        """Mark every successfully sent recipient of a send log as contacted"""
+        sent = (r['recipient'] for r in read_records(log_path) if r.get('status', '').startswith('Sent'))
+        return self.add(platform, sent, reason='contacted')
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {reason: len(keys) for reason, keys in self._sets.items()}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -6,11 +6,16 @@ Manages background sending tasks with proper state management
 from enum import Enum
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
+import heapq
+import itertools
+import os
 import threading
-from queue import Queue, PriorityQueue
+from queue import Empty, Full, PriorityQueue
 import uuid
 
+import clock
+
 class TaskStatus(Enum):
     """Task lifecycle states"""
     IDLE = "idle"
@@ -42,8 +47,13 @@ class Task:
     """Background task container"""
     id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
     platform: str = "whatsapp"
+    account: str = "default"
     recipients: List[str] = field(default_factory=list)
     message: str = ""
+    # Per-recipient template variables: rows[i] holds the `columns` of recipients[i]
+    columns: List[str] = field(default_factory=list)
+    rows: Optional[List[list]] = None
+    attachment: Optional[dict] = None   # MediaFile.to_dict() sent with every message
     status: TaskStatus = TaskStatus.IDLE
     priority: TaskPriority = TaskPriority.NORMAL
     
@@ -60,6 +70,8 @@ class Task:
     # Logging
     messages: List[Message] = field(default_factory=list)
     log_file: Optional[str] = None
+    start_index: int = 0  # first recipient to send to (when resuming)
+    resumed: bool = False  # picked up again after a restart: earlier results are kept
     
     # Configuration
     min_delay: float = 35.0
@@ -95,123 +107,253 @@ class Task:
         }
 
 
+class QueueFullError(Exception):
+    """Raised when a task is rejected because the queue is at capacity"""
+
+
 class TaskQueue:
-    """Thread-safe task queue with priority support"""
+    """Thread-safe, bounded task queue with priority support"""
     
-    def __init__(self, max_workers: int = 1):
-        self.queue: PriorityQueue = PriorityQueue()
-        self.active_task: Optional[Task] = None
-        self.completed_tasks: List[Task] = []
+    def __init__(self, max_workers: int = 1, max_pending: int = 0):
+        # maxsize 0 means unbounded
+        self.queue: PriorityQueue = PriorityQueue(maxsize=max_pending)
+        self.active_tasks: Dict[str, Task] = {}
+        # Finished tasks are only counted: holding them would keep every
+        # recipient list ever queued alive
+        self.completed_count = 0
         self.max_workers = max_workers
+        self.max_pending = max_pending
         self.lock = threading.RLock()
-        
-    def add_task(self, task: Task, priority: TaskPriority = TaskPriority.NORMAL):
-        """Add task to queue"""
+        self._seq = itertools.count()
+    
+    @property
+    def active_task(self) -> Optional[Task]:
+        """First running task (single-worker view)"""
         with self.lock:
-            task.priority = priority
-            self.queue.put((priority.value, task.id, task))
+            return next(iter(self.active_tasks.values()), None)
+        
+    def add_task(self, task: Task, priority: TaskPriority = TaskPriority.NORMAL,
+                 block: bool = False, timeout: Optional[float] = None):
+        """
+        Add task to queue.
+        When the queue is full, rejects with QueueFullError, or with
+        block=True waits (up to timeout) for room instead.
+        """
+        task.priority = priority
+        task.status = TaskStatus.QUEUED
+        try:
+            # The sequence number keeps equal priorities FIFO and never compares Tasks
+            self.queue.put((priority.value, next(self._seq), task), block=block, timeout=timeout)
+        except Full:
+            raise QueueFullError(f"Task queue is full ({self.max_pending} pending)")
     
-    def get_next_task(self) -> Optional[Task]:
-        """Get next task from queue"""
+    def get_next_task(self, timeout: Optional[float] = None) -> Optional[Task]:
+        """Block until a task is available (or timeout); None means shut down"""
         try:
-            _, task_id, task = self.queue.get_nowait()
-            with self.lock:
-                self.active_task = task
-            return task
-        except:
+            _, _, task = self.queue.get(timeout=timeout)
+        except Empty:
             return None
+        if task is not None:
+            with self.lock:
+                self.active_tasks[task.id] = task
+        return task
+    
+    def _finish(self, task: Task, status: TaskStatus):
+        with self.lock:
+            task.status = status
+            self.completed_count += 1
+            self.active_tasks.pop(task.id, None)
     
     def mark_completed(self, task: Task):
         """Mark task as completed"""
-        with self.lock:
-            task.status = TaskStatus.COMPLETED
-            self.completed_tasks.append(task)
-            self.active_task = None
+        self._finish(task, TaskStatus.COMPLETED)
+    
+    def mark_stopped(self, task: Task):
+        """Mark task as stopped before finishing"""
+        self._finish(task, TaskStatus.STOPPED)
     
     def mark_failed(self, task: Task, error: str):
         """Mark task as failed"""
-        with self.lock:
-            task.status = TaskStatus.FAILED
-            self.completed_tasks.append(task)
-            self.active_task = None
+        self._finish(task, TaskStatus.FAILED)
     
     def get_active_task(self) -> Optional[Task]:
         """Get currently active task"""
+        return self.active_task
+    
+    def _targets(self, task_id: Optional[str], states) -> List[Task]:
+        """Active tasks (one by id, or all) currently in one of `states`"""
         with self.lock:
-            return self.active_task
-    
-    def pause_task(self):
-        """Pause active task"""
-        if self.active_task:
-            self.active_task.status = TaskStatus.PAUSED
-            self.active_task.pause_event.set()
-    
-    def resume_task(self):
-        """Resume paused task"""
-        if self.active_task:
-            self.active_task.status = TaskStatus.RUNNING
-            self.active_task.pause_event.clear()
-    
-    def stop_task(self):
-        """Stop active task"""
-        if self.active_task:
-            self.active_task.status = TaskStatus.STOPPED
-            self.active_task.stop_event.set()
+            if task_id is None:
+                tasks = list(self.active_tasks.values())
+            else:
+                task = self.active_tasks.get(task_id)
+                tasks = [task] if task else []
+            return [task for task in tasks if task.status in states]
+    
+    def _remove_queued(self, task_id: str) -> Optional[Task]:
+        """Take a task that has not started out of the queue"""
+        with self.queue.mutex:
+            for entry in self.queue.queue:
+                if entry[2] is not None and entry[2].id == task_id:
+                    self.queue.queue.remove(entry)
+                    heapq.heapify(self.queue.queue)
+                    self.queue.unfinished_tasks -= 1
+                    self.queue.not_full.notify()
+                    return entry[2]
+        return None
+    
+    def pause_task(self, task_id: Optional[str] = None) -> List[Task]:
+        """Pause a running task (all running tasks if no id given). Returns the tasks paused."""
+        with self.lock:
+            tasks = self._targets(task_id, (TaskStatus.RUNNING,))
+            for task in tasks:
+                task.status = TaskStatus.PAUSED
+                task.pause_event.set()
+        return tasks
+    
+    def resume_task(self, task_id: Optional[str] = None) -> List[Task]:
+        """Resume a paused task (all paused tasks if no id given). Returns the tasks resumed."""
+        with self.lock:
+            tasks = self._targets(task_id, (TaskStatus.PAUSED,))
+            for task in tasks:
+                task.status = TaskStatus.RUNNING
+                task.pause_event.clear()
+        return tasks
+    
+    def stop_task(self, task_id: Optional[str] = None) -> List[Task]:
+        """
+        Stop a running or paused task (all of them if no id given). A task
+        that is still queued is taken out of the queue and never runs.
+        Returns the tasks stopped.
+        """
+        # QUEUED here: just taken by a worker that has not started it yet
+        with self.lock:
+            tasks = self._targets(task_id, (TaskStatus.QUEUED, TaskStatus.RUNNING, TaskStatus.PAUSED))
+            for task in tasks:
+                task.status = TaskStatus.STOPPED
+                task.stop_event.set()
+                task.pause_event.clear()
+        if task_id is not None and not tasks:
+            task = self._remove_queued(task_id)
+            if task is not None:
+                task.stop_event.set()
+                self._finish(task, TaskStatus.STOPPED)
+                tasks = [task]
+        return tasks
+    
+    def pending(self) -> List[Task]:
+        """Queued tasks in the order workers will take them"""
+        with self.queue.mutex:
+            entries = sorted(self.queue.queue, key=lambda entry: entry[:2])
+        return [task for _, _, task in entries if task is not None]
     
     def get_queue_size(self) -> int:
         """Get number of tasks in queue"""
         return self.queue.qsize()
     
+    def is_full(self) -> bool:
+        return self.queue.full()
+    
     def get_stats(self) -> dict:
         """Get queue statistics"""
         with self.lock:
             return {
                 'queue_size': self.queue.qsize(),
-                'active_task': self.active_task.id if self.active_task else None,
-                'completed_count': len(self.completed_tasks),
-                'total_messages': sum(len(t.messages) for t in self.completed_tasks)
+                'max_pending': self.max_pending,
+                'active_task': next(iter(self.active_tasks), None),
+                'active_tasks': list(self.active_tasks),
+                'completed_count': self.completed_count
             }
+    
+    def shutdown(self, workers: int):
+        """Wake idle workers with one stop sentinel each"""
+        for _ in range(workers):
+            self.queue.put((0, next(self._seq), None))
 
 
 # Global task queue instance
-task_queue = TaskQueue(max_workers=1)
+task_queue = TaskQueue(
+    max_workers=int(os.getenv('NEXORA_WORKERS', '2')),
+    max_pending=int(os.getenv('NEXORA_MAX_PENDING', '20'))
+)
+
+
+def dispatch_task(task: Task, task_manager=None, **sender_kwargs):
+    """Run a task through the real WhatsApp or Telegram sender"""
+    from sender import send_whatsapp_messages_with_log, send_telegram_messages_with_log
+    
+    common = dict(
+        append=task.resumed or task.start_index > 0,
+        task_manager=task_manager,
+        task_id=task.id,
+        stop_event=task.stop_event,
+        pause_event=task.pause_event,
+        start_index=task.start_index,
+        columns=task.columns,
+        rows=task.rows,
+        attachment=task.attachment,
+    )
+    common.update(sender_kwargs)
+    if task.platform == 'whatsapp':
+        send_whatsapp_messages_with_log(task.recipients, task.message, task.log_file, **common)
+    elif task.platform == 'telegram':
+        send_telegram_messages_with_log(task.recipients, task.message, task.log_file, **common)
+    else:
+        raise ValueError(f"Unknown platform: {task.platform}")
 
 
 class TaskExecutor:
-    """Executes tasks with proper state management"""
+    """Executes tasks on a fixed-size pool of worker threads"""
     
-    def __init__(self, queue: TaskQueue):
+    def __init__(self, queue: TaskQueue, handler: Optional[Callable[[Task], None]] = None):
         self.queue = queue
+        self.handler = handler or dispatch_task
         self.worker_threads = []
+        self.lock = threading.Lock()
+    
+    def start_workers(self, count: Optional[int] = None):
+        """Start the worker pool (no-op if already running)"""
+        with self.lock:
+            if self.worker_threads:
+                return
+            for i in range(count or self.queue.max_workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"TaskWorker-{i}",
+                    daemon=True
+                )
+                thread.start()
+                self.worker_threads.append(thread)
     
-    def start_workers(self, count: int = 1):
-        """Start worker threads"""
-        for i in range(count):
-            thread = threading.Thread(
-                target=self._worker_loop,
-                name=f"TaskWorker-{i}",
-                daemon=True
-            )
-            thread.start()
-            self.worker_threads.append(thread)
+    def shutdown(self):
+        """Ask every idle worker to exit"""
+        self.queue.shutdown(len(self.worker_threads))
     
     def _worker_loop(self):
-        """Main worker loop"""
+        """Main worker loop: sleeps in a blocking dequeue while idle"""
         while True:
             task = self.queue.get_next_task()
-            if task:
-                self._execute_task(task)
+            if task is None:
+                break
+            self._execute_task(task)
     
     def _execute_task(self, task: Task):
         """Execute a single task"""
         try:
-            task.status = TaskStatus.RUNNING
-            task.start_time = datetime.now()
+            with self.queue.lock:
+                # Stopped while waiting for this worker: the handler returns at once
+                if task.status != TaskStatus.STOPPED:
+                    # A task paused before a restart comes back paused
+                    task.status = TaskStatus.PAUSED if task.pause_event.is_set() else TaskStatus.RUNNING
+            task.start_time = clock.now()
+            task.total = len(task.recipients)
             
-            # Simulate task execution
-            # In real usage, this would call send_whatsapp_messages_with_log or send_telegram_messages_with_log
+            self.handler(task)
             
-            task.status = TaskStatus.COMPLETED
-            self.queue.mark_completed(task)
+            task.elapsed = int((clock.now() - task.start_time).total_seconds())
+            if task.stop_event.is_set():
+                self.queue.mark_stopped(task)
+            else:
+                self.queue.mark_completed(task)
         except Exception as e:
             self.queue.mark_failed(task, str(e))
@@ -0,0 +1,227 @@
+"""
+Durable Task Store for NexoraMsg
+SQLite (WAL) persistence behind TaskManager so campaigns survive restarts,
+and the archive finished campaigns are evicted to
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import clock
+from recipients import RecipientList
+
+# Default database location (override with NEXORA_DB)
+DEFAULT_DB_PATH = os.getenv('NEXORA_DB', os.path.join('data', 'nexoramsg.db'))
+
+# Seconds a write waits for another connection's lock before failing
+BUSY_TIMEOUT = float(os.getenv('NEXORA_DB_TIMEOUT', '30'))
+
+# Task states that should be picked up again after a restart
+UNFINISHED_STATES = ('queued', 'running', 'paused')
+
+# Task states that never change again
+FINISHED_STATES = ('completed', 'failed', 'stopped', 'rejected')
+
+# Per-recipient fields, written once to task_payloads rather than with every checkpoint
+PAYLOAD_FIELDS = ('recipients', 'rows')
+
+# Counters summed over every stored task by totals()
+COUNTED_FIELDS = ('sent', 'failed', 'invalid')
+
+
+def connect(path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """
+    Connection to the shared database used by every store (tasks,
+    suppression, invalid numbers, media): autocommit, usable from any
+    thread, WAL so readers never block the writer
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class TaskStore:
+    """
+    Stores each task as one JSON row keyed by task id. The recipients (as a
+    RecipientList buffer) and template rows live in task_payloads, and
+    recipients that failed for good are appended to dead_letters, so the
+    per-second progress checkpoints of a large campaign stay small.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._conn = connect(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_updated ON tasks(updated_at)")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_payloads (
+                id TEXT PRIMARY KEY,
+                recipients BLOB NOT NULL,
+                recipient_ends BLOB NOT NULL,
+                rows TEXT
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                recipient TEXT NOT NULL,
+                error TEXT,
+                attempts INTEGER NOT NULL,
+                time REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_dead_letters_task ON dead_letters(task_id)")
+        self._lock = threading.Lock()
+        self._migrate_payloads()
+
+    def _migrate_payloads(self):
+        """Move the payload fields of tasks stored before task_payloads existed out of their JSON"""
+        rows = self._conn.execute(
+            "SELECT t.data FROM tasks t LEFT JOIN task_payloads p ON p.id = t.id WHERE p.id IS NULL"
+        ).fetchall()
+        tasks = [json.loads(data) for (data,) in rows]
+        self.save_many(tasks, tasks)
+
+    def save_many(self, tasks: Iterable[dict], payloads: Iterable[dict] = (),
+                  dead_letters: Iterable[Tuple[str, dict]] = ()):
+        """
+        Upsert a batch of task dicts in a single transaction. The payload
+        fields are only written for the tasks in `payloads` (new tasks, or
+        ones whose recipients or rows changed). dead_letters are new
+        (task id, entry) pairs, appended to that task's dead letters.
+        """
+        now = clock.time()
+        rows = [
+            (task['id'], task.get('status', 'queued'), now, now,
+             json.dumps({key: value for key, value in task.items() if key not in PAYLOAD_FIELDS}))
+            for task in tasks
+        ]
+        payload_rows = []
+        for task in payloads:
+            data, ends = RecipientList(task.get('recipients') or ()).to_bytes()
+            rows_json = json.dumps(task['rows']) if task.get('rows') is not None else None
+            payload_rows.append((task['id'], data, ends, rows_json))
+        dead_letter_rows = [
+            (task_id, entry['index'], entry['recipient'], entry.get('error'), entry.get('attempts', 1), entry['time'])
+            for task_id, entry in dead_letters
+        ]
+        if not rows and not payload_rows and not dead_letter_rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    """
+                    INSERT INTO tasks (id, status, created_at, updated_at, data)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        status = excluded.status,
+                        updated_at = excluded.updated_at,
+                        data = excluded.data
+                    """,
+                    rows
+                )
+                self._conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO task_payloads (id, recipients, recipient_ends, rows)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    payload_rows
+                )
+                self._conn.executemany(
+                    "INSERT INTO dead_letters (task_id, idx, recipient, error, attempts, time) VALUES (?, ?, ?, ?, ?, ?)",
+                    dead_letter_rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _select(self, where: str = "", params=()) -> List[dict]:
+        """Tasks with their payload fields, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT t.data, p.recipients, p.recipient_ends, p.rows
+                FROM tasks t LEFT JOIN task_payloads p ON p.id = t.id
+                {where} ORDER BY t.created_at
+                """,
+                params
+            ).fetchall()
+        tasks = []
+        for data, recipients, ends, rows in rows:
+            task = json.loads(data)
+            if recipients is not None:
+                task['recipients'] = RecipientList.from_bytes(recipients, ends)
+                task['rows'] = json.loads(rows) if rows is not None else None
+            tasks.append(task)
+        return tasks
+
+    def load(self, task_id: str) -> Optional[dict]:
+        """One task (e.g. an archived one), or None"""
+        tasks = self._select("WHERE t.id = ?", (task_id,))
+        return tasks[0] if tasks else None
+
+    def load_all(self) -> List[dict]:
+        """All stored tasks, oldest first"""
+        return self._select()
+
+    def load_unfinished(self) -> List[dict]:
+        """Tasks that were queued or running when the app stopped"""
+        placeholders = ','.join('?' * len(UNFINISHED_STATES))
+        return self._select(f"WHERE t.status IN ({placeholders})", UNFINISHED_STATES)
+
+    def load_recent(self, since: float) -> List[dict]:
+        """Unfinished tasks and the finished ones updated after `since` (a timestamp)"""
+        placeholders = ','.join('?' * len(FINISHED_STATES))
+        return self._select(f"WHERE t.status NOT IN ({placeholders}) OR t.updated_at >= ?",
+                            (*FINISHED_STATES, since))
+
+    def load_dead_letters(self, task_id: str) -> List[dict]:
+        """A task's dead letters in the order they failed"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, recipient, error, attempts, time FROM dead_letters WHERE task_id = ? ORDER BY rowid",
+                (task_id,)
+            ).fetchall()
+        return [{'index': idx, 'recipient': recipient, 'error': error, 'attempts': attempts, 'time': at}
+                for idx, recipient, error, attempts, at in rows]
+
+    def totals(self) -> dict:
+        """Task count per status and the COUNTED_FIELDS summed over every stored task"""
+        sums = ', '.join(f"COALESCE(SUM(json_extract(data, '$.{name}')), 0)" for name in COUNTED_FIELDS)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT status, COUNT(*), {sums} FROM tasks GROUP BY status").fetchall()
+        totals = {'tasks': {}, **{name: 0 for name in COUNTED_FIELDS}}
+        for status, count, *values in rows:
+            totals['tasks'][status] = count
+            for name, value in zip(COUNTED_FIELDS, values):
+                totals[name] += int(value)
+        return totals
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,339 @@
+"""
+Telegram Sending Engine for NexoraMsg
+Pooled, concurrent Bot API sender spread over one or more bots, with
+rate-limit-aware pipelining
+"""
+
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import clock
+from media import MediaFile, file_id_cache
+from metrics import stage
+from progress import CampaignProgress
+from retry import RETRY_POLICIES, TRANSIENT, WorkQueue, classify, classify_http
+from scheduler import BucketPolicy, scheduler, wait_while_paused
+
+# Base URL of the Bot API (point it at a local stub server for testing)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+# Longest caption Telegram accepts on a photo or document
+CAPTION_LIMIT = 1024
+
+
+@dataclass
+class TelegramConfig:
+    """Telegram pacing and connection settings"""
+    api_url: str = TELEGRAM_API_URL
+    concurrency: int = int(os.getenv('TELEGRAM_CONCURRENCY', '8'))
+    global_rate: float = float(os.getenv('TELEGRAM_GLOBAL_RATE', '25'))   # msg/s per bot
+    per_chat_rate: float = float(os.getenv('TELEGRAM_PER_CHAT_RATE', '1'))  # msg/s per chat
+    # Telegram-specific jitter per send (seconds), independent of the WhatsApp anti-ban delay
+    min_delay: float = 0.0
+    max_delay: float = 0.0
+    timeout: float = 10.0
+    # How many 429 responses one message may get before it is given up on
+    max_throttle_retries: int = int(os.getenv('TELEGRAM_MAX_THROTTLE_RETRIES', '10'))
+
+
+def parse_tokens(api_tokens: Union[str, Iterable[str]]) -> List[str]:
+    """Bot tokens from a comma separated string (e.g. TELEGRAM_BOT_TOKEN) or a list"""
+    if isinstance(api_tokens, str):
+        api_tokens = api_tokens.split(',')
+    # dict.fromkeys drops repeated tokens but keeps their order
+    return list(dict.fromkeys(token.strip() for token in api_tokens if token and token.strip()))
+
+
+def bot_account(token: str, index: int) -> str:
+    """Scheduler account name of a bot: the numeric id in front of its token"""
+    return token.split(':', 1)[0] or f'bot{index}'
+
+
+def bot_index(chat_id, bots: int) -> int:
+    """Which of `bots` bots a chat is pinned to (stable hash)"""
+    if bots <= 1:
+        return 0
+    return zlib.crc32(str(chat_id).encode()) % bots
+
+
+@dataclass
+class TelegramBot:
+    """One bot token and its throttling state"""
+    token: str
+    base_url: str
+    account: str
+    retry_until: float = 0.0    # monotonic time Telegram asked us to wait until
+    throttled: int = 0          # 429 responses received
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    upload_lock: threading.Lock = field(default_factory=threading.Lock)   # one upload per file at a time
+
+
+class TelegramEngine:
+    """
+    Sends Bot API messages over a persistent connection pool.
+
+    With several bot tokens every chat is pinned to one bot (stable hash),
+    so a chat always hears from the same bot, and each bot gets its own
+    rate budget and worker pool: throughput scales with the number of bots
+    and a bot that is throttled never holds up the others.
+    """
+
+    def __init__(self, api_tokens: Union[str, Iterable[str]], config: Optional[TelegramConfig] = None):
+        self.config = config or TelegramConfig()
+        tokens = parse_tokens(api_tokens)
+        if not tokens:
+            raise ValueError("At least one Telegram bot token is required")
+
+        api_url = self.config.api_url.rstrip('/')
+        self.bots = [
+            TelegramBot(token=token, base_url=f"{api_url}/bot{token}",
+                        account=bot_account(token, i))
+            for i, token in enumerate(tokens)
+        ]
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(1, self.config.concurrency) * len(self.bots),
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.file_ids = file_id_cache
+        self.media_uploads = 0
+        self.media_bytes_uploaded = 0
+        self._stats_lock = threading.Lock()
+
+        # Pace only this engine's bots, so engines with other configs run side by side
+        self.scheduler = scheduler
+        account_policy = BucketPolicy(
+            rate=self.config.global_rate,
+            capacity=max(1, self.config.concurrency),
+            jitter=(self.config.min_delay, self.config.max_delay),
+        )
+        chat_policy = BucketPolicy(rate=self.config.per_chat_rate)
+        for bot in self.bots:
+            self.scheduler.set_policy(f'telegram:account:{bot.account}', account_policy)
+            self.scheduler.set_policy(f'telegram:chat:{bot.account}', chat_policy)
+
+    def bot_for(self, chat_id) -> TelegramBot:
+        """Sticky chat -> bot assignment (the same on every run)"""
+        return self.bots[bot_index(chat_id, len(self.bots))]
+
+    def _wait_for_slot(self, bot: TelegramBot, chat_id, stop_event=None) -> Optional[float]:
+        """Block until the scheduler grants a slot for this bot and chat (None if stopped)"""
+        waited = 0.0
+        while True:
+            # Telegram's per-chat limit is per bot: the chat bucket is keyed by both
+            grant = self.scheduler.acquire('telegram', bot.account, chat=f"{bot.account}:{chat_id}",
+                                           label=str(chat_id), stop_event=stop_event)
+            if grant is None:
+                return None
+            waited += grant.delay
+            # Slots handed out before a 429 arrived are not used until retry_after has passed
+            if clock.monotonic() >= bot.retry_until:
+                return waited
+
+    def _throttle(self, bot: TelegramBot, retry_after: float):
+        """Honour a 429: hold every send on this bot back for retry_after seconds"""
+        with bot.lock:
+            bot.throttled += 1
+            bot.retry_until = max(bot.retry_until, clock.monotonic() + retry_after)
+        self.scheduler.defer('telegram', bot.account, retry_after)
+        print(f"🐢 Telegram bot {bot.account} throttled, retrying after {retry_after:.0f}s")
+
+    def _remember_file_id(self, bot: TelegramBot, media: MediaFile, response):
+        """Cache the file_id Telegram assigned to a fresh upload"""
+        result = response.json().get('result') or {}
+        uploaded = result.get(media.kind) or result.get('document') or result.get('animation')
+        if isinstance(uploaded, list):      # photo: every size shares the upload, keep the largest
+            uploaded = uploaded[-1] if uploaded else None
+        if uploaded and uploaded.get('file_id'):
+            self.file_ids.put(bot.account, media, uploaded['file_id'])
+        with self._stats_lock:
+            self.media_uploads += 1
+            self.media_bytes_uploaded += media.size
+
+    def _post(self, bot: TelegramBot, chat_id, text: Optional[str], media: Optional[MediaFile] = None):
+        """
+        One Bot API call: sendMessage, or sendPhoto/sendDocument by cached
+        file_id. Only the first send of a file per bot uploads its bytes;
+        concurrent first sends wait for that upload instead of repeating it.
+        """
+        if media is None:
+            payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
+            return self.session.post(f"{bot.base_url}/sendMessage", json=payload, timeout=self.config.timeout)
+
+        url = f"{bot.base_url}/{'sendPhoto' if media.kind == 'photo' else 'sendDocument'}"
+        fields = {"chat_id": chat_id, "parse_mode": "HTML"}
+        if text:
+            fields["caption"] = text
+        file_id = self.file_ids.get(bot.account, media)
+        if file_id is not None:
+            response = self.session.post(url, json={**fields, media.kind: file_id}, timeout=self.config.timeout)
+            if response.status_code != 400 or 'file' not in response.text.lower():
+                return response
+            # Telegram no longer knows this file_id: upload again
+            self.file_ids.forget(bot.account, media)
+
+        with bot.upload_lock:
+            file_id = self.file_ids.get(bot.account, media)
+            if file_id is None:
+                response = self.session.post(
+                    url, data=fields, files={media.kind: (media.name, media.read_bytes(), media.mime)},
+                    timeout=max(self.config.timeout, 120)
+                )
+                if response.status_code == 200:
+                    self._remember_file_id(bot, media, response)
+                return response
+        return self.session.post(url, json={**fields, media.kind: file_id}, timeout=self.config.timeout)
+
+    def send_message(self, chat_id, text: str, stop_event=None,
+                     media: Optional[MediaFile] = None) -> Optional[Tuple[bool, str, float, int]]:
+        """
+        Send one message (optionally with an attachment, the text becoming
+        its caption) on the chat's bot, respecting rate limits. A 429 is
+        not a failure: the bot is held back for retry_after and the message
+        is sent again once it may.
+        Returns (ok, error_description, seconds_waited_for_slot, http_status),
+        or None if stop_event fired while waiting for a slot.
+        """
+        bot = self.bot_for(chat_id)
+        if media is None:
+            steps = [(text, None)]
+        elif len(text) <= CAPTION_LIMIT:
+            steps = [(text, media)]
+        else:
+            # Too long for a caption: the attachment goes first, then the text
+            steps = [(None, media), (text, None)]
+
+        waited = 0.0
+        for step_text, step_media in steps:
+            throttles = 0
+            while True:
+                with stage('telegram', 'pacing'):
+                    slot_wait = self._wait_for_slot(bot, chat_id, stop_event)
+                if slot_wait is None:
+                    return None
+                waited += slot_wait
+                with stage('telegram', 'request' if step_media is None else 'request_media'):
+                    response = self._post(bot, chat_id, step_text, step_media)
+                if response.status_code == 200:
+                    break
+                try:
+                    data = response.json()
+                except ValueError:
+                    data = {}
+                error_msg = data.get('description') or f"HTTP {response.status_code}"
+                if response.status_code == 429 and throttles < self.config.max_throttle_retries:
+                    throttles += 1
+                    retry_after = (data.get('parameters') or {}).get('retry_after') or 1
+                    self._throttle(bot, float(retry_after))
+                    continue
+                return False, error_msg, waited, response.status_code
+        return True, "", waited, 200
+
+    def send_all(self, chat_ids: Iterable, message: str,
+                 on_result: Optional[Callable] = None,
+                 message_for: Optional[Callable[[int], str]] = None,
+                 media: Optional[MediaFile] = None,
+                 task_manager=None, task_id=None, start_index: int = 0,
+                 stop_event=None, pause_event=None) -> dict:
+        """
+        Send message to every chat concurrently, each bot feeding its own
+        worker pool with its share of the chats. Transient failures (network
+        errors, 5xx, persistent 429) are re-queued with backoff; the rest
+        are final and end up in the task's dead letters.
+
+        on_result(chat_id, ok, error, waited) is called once per chat,
+        serialized under a lock so callers can write logs without locking.
+        message_for(idx), if given, returns a personalised text per chat.
+        media, if given, is attached to every message (uploaded once per bot).
+        Returns final counters.
+        """
+        chat_ids = list(chat_ids)
+        workers = max(1, self.config.concurrency)
+        progress = CampaignProgress(len(chat_ids), task_manager, task_id, start_index, platform='telegram',
+                                    accounts=[bot.account for bot in self.bots], lanes=workers)
+        result_lock = threading.Lock()
+
+        shards = {bot.account: [] for bot in self.bots}
+        for idx in progress.pending():
+            shards[self.bot_for(chat_ids[idx]).account].append(idx)
+
+        def _send(bot, queue, idx, chat_id, in_flight):
+            attempt = queue.attempts(idx)
+            service_time = None
+            try:
+                text = message_for(idx) if message_for else message
+                started = clock.monotonic()
+                result = self.send_message(chat_id, text, stop_event, media)
+                if result is None:
+                    queue.done(idx)
+                    return
+                ok, error, waited, status_code = result
+                service_time = max(clock.monotonic() - started - waited, 0.0)
+                transient = not ok and classify_http(status_code) == TRANSIENT
+            except Exception as e:
+                ok, error, waited = False, f"Error: {e}", 0.0
+                transient = classify(e) == TRANSIENT
+            finally:
+                in_flight.release()
+
+            backoff = queue.retry(idx) if transient else None
+            if backoff is not None:
+                print(f"🔁 Retrying {chat_id} in {backoff:.1f}s (attempt {attempt + 1}/{queue.policy.max_attempts}): {error}")
+                progress.retry(idx, chat_id, error, backoff)
+                return
+            if not transient:
+                queue.done(idx)
+            with result_lock:
+                if on_result:
+                    on_result(chat_id, ok, error, waited)
+                progress.record(idx, chat_id, 'sent' if ok else 'failed',
+                                session=bot.account if len(self.bots) > 1 else None,
+                                error=error or None, attempts=attempt, service_time=service_time,
+                                current_delay=round(waited, 3),
+                                throttled=sum(b.throttled for b in self.bots),
+                                **({'media_uploads': self.media_uploads,
+                                    'media_bytes_uploaded': self.media_bytes_uploaded} if media else {}))
+
+        def _feed(bot, indices):
+            queue = WorkQueue(indices, RETRY_POLICIES['telegram'])
+            in_flight = threading.BoundedSemaphore(workers * 2)
+            with ThreadPoolExecutor(max_workers=workers,
+                                    thread_name_prefix=f"TelegramSend-{bot.account}") as pool:
+                while True:
+                    wait_while_paused(pause_event, stop_event)
+                    idx = queue.get(stop_event)
+                    if idx is None:
+                        break
+                    in_flight.acquire()
+                    pool.submit(clock.participating(_send), bot, queue, idx, chat_ids[idx], in_flight)
+
+        if len(self.bots) > 1:
+            print(f"🔀 Spreading {sum(map(len, shards.values()))} chats across {len(self.bots)} Telegram bots")
+        feeders = [
+            threading.Thread(target=_feed, args=(bot, shards[bot.account]),
+                             name=f"TelegramFeed-{bot.account}", daemon=True)
+            for bot in self.bots
+        ]
+        for feeder in feeders:
+            feeder.start()
+        for feeder in feeders:
+            feeder.join()
+
+        snap = progress.snapshot()
+        snap['throttled'] = sum(bot.throttled for bot in self.bots)
+        snap['media_uploads'] = self.media_uploads
+        return snap
+
+    def close(self):
+        self.session.close()
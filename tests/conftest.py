@@ -0,0 +1,13 @@
+"""
+Test setup for NexoraMsg: every store opens its database on import, so point
+NEXORA_DB and the working directory at a scratch directory first
+"""
+
+import os
+import sys
+import tempfile
+
+SCRATCH = tempfile.mkdtemp(prefix='nexora-tests-')
+os.environ['NEXORA_DB'] = os.path.join(SCRATCH, 'nexoramsg.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(SCRATCH)
@@ -0,0 +1,46 @@
+"""HTTP API input validation and the dashboard page"""
+
+import re
+
+import pytest
+
+import app
+from taskstore import FINISHED_STATES
+
+
+@pytest.fixture
+def client():
+    with app.app.test_client() as client:
+        yield client
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'count': 'many'}, 'count must be a whole number'),
+    ({'count': [5]}, 'count must be a whole number'),
+    ({'count': 10 ** 9}, 'count must be between 1 and'),
+    ({'count': 10, 'platform': 'telegram', 'bots': 'x'}, 'bots must be a whole number'),
+    ({'count': 10, 'profiles': [1, 2]}, 'profiles must be a list of profile names'),
+    ({'count': 10, 'start': 'tomorrow'}, 'start must look like'),
+    ([1, 2], 'Expected a JSON object'),
+])
+def test_dry_run_rejects_bad_input(client, body, error):
+    response = client.post('/api/dry_run', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith(error)
+
+
+def test_queue_stats_count_every_message(client):
+    before = client.get('/api/queue').get_json()['total_messages']
+    task_id = app.task_manager.create_task('whatsapp', ['919000000010', '919000000011', '919000000012'], 'hi')
+    app.task_manager.update_task(task_id, sent=1, failed=1, invalid=1)
+
+    stats = client.get('/api/queue').get_json()
+    assert stats['total_messages'] == before + 3
+    assert stats['total_messages'] == sum(stats['totals'][name] for name in ('sent', 'failed', 'invalid'))
+
+
+def test_dashboard_closes_the_stream_on_every_finished_state():
+    with app.app.test_request_context():
+        page = app.render_template('dashboard.html', task_id='t', telegram_token=False)
+    [line] = [line for line in page.splitlines() if 'const FINISHED_STATES' in line]
+    assert set(re.findall(r"'(\w+)'", line)) == set(FINISHED_STATES)
@@ -0,0 +1,35 @@
+"""Browser process cleanup: only kill what is still the same browser process"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from driver_pool import _process_table, _stale_browser_pids
+
+pytestmark = pytest.mark.skipif(not os.path.isdir('/proc'), reason="reads /proc")
+
+
+@pytest.fixture
+def child():
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    yield process.pid
+    process.kill()
+    process.wait()
+
+
+def test_running_descendant_is_stale(child):
+    start = _process_table()[child][1]
+    assert _stale_browser_pids(os.getpid(), {child: start}) == [child]
+
+
+def test_reused_pid_is_left_alone(child):
+    start = _process_table()[child][1]
+    assert _stale_browser_pids(os.getpid(), {child: start + 1}) == []
+
+
+def test_process_outside_the_tree_is_left_alone(child):
+    table = _process_table()
+    outsider = next(pid for pid, (ppid, _) in table.items() if pid not in (os.getpid(), child) and ppid != os.getpid())
+    assert _stale_browser_pids(os.getpid(), {outsider: table[outsider][1]}) == []
@@ -0,0 +1,38 @@
+"""Dry run: a campaign queued, paused and resumed in simulated time"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import clock
+
+DRY_RUN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dryrun.py')
+
+
+def test_passive_wakeup_waits_for_other_sleepers():
+    simulated = clock.SimulatedClock()
+    woke = []
+
+    def sleeper(passive):
+        simulated.sleep(60, passive=passive)
+        woke.append((passive, simulated.monotonic()))
+
+    passive = threading.Thread(target=sleeper, args=(True,))
+    passive.start()
+    passive.join(0.2)
+    assert passive.is_alive() and simulated.monotonic() == 0
+    sleeper(False)
+    passive.join(1)
+    assert sorted(woke) == [(False, 60), (True, 60)]
+
+
+def test_pause_goes_through_the_task_queue():
+    command = [sys.executable, DRY_RUN, '--json', '--platform', 'telegram', '--count', '200',
+               '--pause-at', '0.001', '--pause-for', '1']
+    result = json.loads(subprocess.run(command, capture_output=True, text=True, timeout=120, check=True).stdout)
+
+    assert result['sent'] == 200 and result['failed'] == 0
+    # 200 chats at the default 25 msg/s take about 8 s; the pause 3.6 s in adds its hour
+    assert 3600 <= result['duration_s'] < 3700
@@ -0,0 +1,95 @@
+"""Message templates: compiling, rendering per recipient and reading recipient files"""
+
+import io
+from urllib.parse import quote, unquote
+
+import openpyxl
+import pytest
+
+from message_template import CompiledTemplate, TemplateError, read_recipient_table
+from sender import _message_renderer
+
+COLUMNS = ['Phone', 'Name', 'City']
+
+
+def test_placeholders_are_filled_from_the_row():
+    template = CompiledTemplate("Hi {name}, see you in {City|town}!", COLUMNS)
+
+    assert template.fields == ['Name', 'City']
+    assert template.render(['919000000001', 'Asha', 'Pune']) == "Hi Asha, see you in Pune!"
+    # Empty or missing values fall back to the default (or nothing)
+    assert template.render(['919000000002', '', '']) == "Hi , see you in town!"
+    assert template.render(['919000000003']) == "Hi , see you in town!"
+
+
+def test_doubled_braces_are_literal():
+    template = CompiledTemplate("{{code}} for {Name}: {{}}", COLUMNS)
+
+    assert template.render(['1', 'Ravi', 'Goa']) == "{code} for Ravi: {}"
+
+
+def test_unknown_placeholder_names_the_available_columns():
+    with pytest.raises(TemplateError, match=r"Unknown placeholder \{email\}; available columns: Phone, Name, City"):
+        CompiledTemplate("Hi {email}", COLUMNS)
+
+
+def test_static_message_has_no_fields():
+    template = CompiledTemplate("Sale today & tomorrow", COLUMNS)
+
+    assert template.is_static and template.fields == []
+    assert template.render(['1', 'x', 'y']) == "Sale today & tomorrow"
+    assert template.render_url() == quote("Sale today & tomorrow")
+
+
+def test_url_rendering_matches_quoting_the_whole_text():
+    template = CompiledTemplate("Hi {Name} 👋\nWin 50% off & more in {City}?", COLUMNS)
+    row = ['1', 'Zoë & Co', 'São Paulo/SP']
+
+    assert template.render_url(row) == quote(template.render(row))
+    assert unquote(template.render_url(row)) == template.render(row)
+
+
+def test_html_rendering_escapes_values_but_not_the_template():
+    template = CompiledTemplate("<b>Hi {Name}</b>", COLUMNS)
+
+    assert template.render_html(['1', '<Tom & Jerry>', '']) == "<b>Hi &lt;Tom &amp; Jerry&gt;</b>"
+
+
+def test_renderer_per_recipient_index():
+    rows = [['1', 'Asha', 'Pune'], ['2', 'Ravi', 'Goa']]
+
+    assert [_message_renderer("Hi {Name}", COLUMNS, rows, 'html')(i) for i in (0, 1)] == ["Hi Asha", "Hi Ravi"]
+    assert _message_renderer("Hi {Name}", COLUMNS, rows)(1) == quote("Hi Ravi")
+    # Without rows the message is sent as it is
+    assert _message_renderer("Hi {Name}", None, None, 'html')(5) == "Hi {Name}"
+
+
+def test_csv_recipient_column_is_found_by_header():
+    data = "\ufeffName,Mobile,City\nAsha,919000000001,Pune\n,,\nNo number,,Goa\nRavi, 919000000002 ,Goa\n"
+
+    columns, recipients, rows = read_recipient_table('list.csv', io.BytesIO(data.encode()))
+
+    assert columns == ['Name', 'Mobile', 'City']
+    assert recipients == ['919000000001', '919000000002']
+    assert rows == [['Asha', '919000000001', 'Pune'], ['Ravi', '919000000002', 'Goa']]
+
+
+def test_xlsx_recipient_table():
+    wb = openpyxl.Workbook()
+    wb.active.append(['chat_id', 'Name', None])
+    wb.active.append([1001, 'Asha', None])
+    wb.active.append([1002, None, 'x'])
+    stream = io.BytesIO()
+    wb.save(stream)
+    stream.seek(0)
+
+    columns, recipients, rows = read_recipient_table('list.xlsx', stream)
+
+    assert columns == ['chat_id', 'Name', 'column3']
+    assert recipients == ['1001', '1002']
+    assert rows == [['1001', 'Asha', ''], ['1002', '', 'x']]
+
+
+def test_unsupported_file_type():
+    with pytest.raises(ValueError, match='Unsupported recipient file type'):
+        read_recipient_table('list.pdf', io.BytesIO(b''))
@@ -0,0 +1,27 @@
+"""Campaign progress: resume checkpoint and counters across a restart"""
+
+import app
+from progress import CampaignProgress
+
+
+def test_resume_skips_recipients_finished_above_the_checkpoint():
+    manager = app.TaskManager()
+    task_id = manager.create_task('whatsapp', ['a', 'b', 'c', 'd'], 'hi')
+    progress = CampaignProgress(4, manager, task_id, platform='whatsapp')
+    progress.retry(0, 'a', 'timeout', 900)
+    progress.record(1, 'b', 'sent')
+    progress.record(2, 'c', 'failed', error='boom')
+
+    task = manager.get_task(task_id)
+    assert task['next_index'] == 0 and task['finished_ahead'] == [[1, 3]]
+
+    # Restart: resume_unfinished_tasks starts again at next_index
+    resumed = CampaignProgress(4, manager, task_id, task['next_index'], platform='whatsapp')
+    assert resumed.pending() == [0, 3]
+    resumed.record(0, 'a', 'sent', attempts=2)
+    resumed.record(3, 'd', 'invalid')
+
+    task = manager.get_task(task_id)
+    assert (task['sent'], task['failed'], task['invalid']) == (2, 1, 1)
+    assert task['current_index'] == 4 and task['next_index'] == 4
+    assert task['finished_ahead'] == []
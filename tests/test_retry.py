@@ -0,0 +1,125 @@
+"""Retry engine: failure classification, backoff and the WorkQueue, and dead letters"""
+
+import threading
+
+import pytest
+import requests
+from selenium.common.exceptions import TimeoutException
+
+import app
+import clock
+import retry
+from fakes import StubTelegramConfig, StubTelegramServer
+from retry import PERMANENT, TRANSIENT, RetryPolicy, WorkQueue, classify, classify_http
+from sender import ChatUnavailable
+from telegram_engine import TelegramConfig, TelegramEngine
+from wa_dom import ChatOutcome, DomState
+
+
+def _outcome(status):
+    return ChatOutcome(status, latency_ms=0.0, state=DomState())
+
+
+@pytest.fixture
+def simulated(monkeypatch):
+    monkeypatch.setattr(clock, '_clock', clock.SimulatedClock())
+
+
+def test_classification():
+    assert classify(TimeoutException()) == TRANSIENT
+    assert classify(requests.ConnectionError()) == TRANSIENT
+    assert classify(ValueError('bad template')) == PERMANENT
+    assert [classify(ChatUnavailable(_outcome(status))) for status in ('offline', 'logged_out', 'timeout', 'invalid')] == [
+        TRANSIENT, TRANSIENT, TRANSIENT, PERMANENT]
+    assert [classify_http(status) for status in (None, 429, 500, 503, 400, 403)] == [
+        TRANSIENT, TRANSIENT, TRANSIENT, TRANSIENT, PERMANENT, PERMANENT]
+
+
+def test_backoff_doubles_within_its_upper_half_and_is_capped():
+    policy = RetryPolicy(base_delay=2.0, factor=2.0, max_delay=10.0)
+
+    for attempt, ceiling in [(1, 2.0), (2, 4.0), (3, 8.0), (4, 10.0), (9, 10.0)]:
+        delays = [policy.delay(attempt) for _ in range(50)]
+        assert all(ceiling / 2 <= delay <= ceiling for delay in delays)
+
+
+def test_fresh_indices_go_out_in_order_then_the_queue_finishes():
+    queue = WorkQueue([3, 1, 2], RetryPolicy())
+
+    taken = [queue.get() for _ in range(3)]
+    for idx in taken:
+        queue.done(idx)
+
+    assert taken == [3, 1, 2]
+    assert queue.get() is None
+
+
+def test_retry_comes_back_after_its_backoff_and_before_fresh_work(simulated):
+    queue = WorkQueue([0, 1, 2], RetryPolicy(max_attempts=3, base_delay=10.0, factor=1.0))
+
+    assert queue.get() == 0
+    backoff = queue.retry(0)
+    assert 5.0 <= backoff <= 10.0
+    assert queue.get() == 1
+    queue.done(1)
+    # Retry not due yet: fresh work first, then wait for the backoff
+    assert queue.get() == 2
+    queue.done(2)
+    assert queue.remaining() == 1
+    assert queue.get() == 0
+    assert clock.monotonic() >= backoff
+    assert queue.attempts(0) == 2
+
+
+def test_out_of_attempts_is_final(simulated):
+    queue = WorkQueue([7], RetryPolicy(max_attempts=2, base_delay=1.0))
+
+    assert queue.get() == 7
+    assert queue.retry(7) is not None
+    assert queue.get() == 7
+    assert queue.retry(7) is None
+    assert queue.get() is None
+
+
+def test_requeue_does_not_count_an_attempt():
+    queue = WorkQueue([0, 1], RetryPolicy(max_attempts=2))
+
+    assert queue.get() == 0
+    queue.requeue(0)
+
+    assert queue.get() == 0
+    assert queue.attempts(0) == 1
+
+
+def test_get_waits_for_work_in_flight_and_stops():
+    queue = WorkQueue([0], RetryPolicy())
+    stop_event = threading.Event()
+    assert queue.get() == 0
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(queue.get(stop_event)))
+    waiter.start()
+
+    waiter.join(0.2)
+    assert waiter.is_alive()
+    stop_event.set()
+    waiter.join(2)
+    assert results == [None]
+
+
+def test_failures_out_of_retries_become_dead_letters(monkeypatch):
+    monkeypatch.setitem(retry.RETRY_POLICIES, 'telegram', RetryPolicy(max_attempts=2, base_delay=0.0))
+    manager = app.TaskManager()
+    chats = ['6000', '6001', '6002']
+    task_id = manager.create_task('telegram', chats, 'hi')
+
+    with StubTelegramServer(StubTelegramConfig(failure_rate=1.0)) as stub:
+        engine = TelegramEngine('601:token', TelegramConfig(api_url=stub.url, global_rate=0, per_chat_rate=0))
+        stats = engine.send_all(chats, 'hi', task_manager=manager, task_id=task_id)
+        engine.close()
+
+    dead_letters = manager.get_dead_letters(task_id)
+    assert stats['failed'] == 3
+    assert sorted((entry['index'], entry['recipient'], entry['attempts']) for entry in dead_letters) == [
+        (0, '6000', 2), (1, '6001', 2), (2, '6002', 2)]
+    assert {entry['error'] for entry in dead_letters} == {'Internal Server Error'}
+    assert manager.get_task(task_id)['dead_letter_count'] == 3
@@ -0,0 +1,125 @@
+"""Send scheduler: token bucket pacing and scope precedence"""
+
+import threading
+
+import pytest
+
+import clock
+from scheduler import BucketPolicy, SendScheduler
+from telegram_engine import TelegramConfig, TelegramEngine
+
+
+def test_narrower_scope_wins_over_the_platform_wide_policy():
+    pacing = SendScheduler()
+    pacing.set_policy('telegram:account', BucketPolicy(rate=1.0))
+    pacing.set_policy('telegram:account:fast', BucketPolicy(rate=100.0))
+
+    slow = [pacing.reserve('telegram', 'slow').slot for _ in range(2)]
+    assert slow[1] - slow[0] == pytest.approx(1.0)
+    fast = [pacing.reserve('telegram', 'fast').slot for _ in range(2)]
+    assert fast[1] - fast[0] == pytest.approx(0.01)
+
+
+def test_engines_pace_only_their_own_bots(monkeypatch):
+    import telegram_engine
+    pacing = SendScheduler()
+    monkeypatch.setattr(telegram_engine, 'scheduler', pacing)
+
+    slow = TelegramEngine('1:slow', TelegramConfig(global_rate=2, per_chat_rate=1, concurrency=1))
+    fast = TelegramEngine('2:fast', TelegramConfig(global_rate=0, per_chat_rate=0, concurrency=1))
+
+    assert pacing.get_policy('telegram:account:1').rate == 2
+    assert pacing.get_policy('telegram:account:2').rate == 0
+    assert pacing.get_policy('telegram:account') is None
+    # The second engine left the first one's pacing alone
+    assert pacing.projected_finish('telegram', '1', 3) == pytest.approx(1.0)
+    assert pacing.projected_finish('telegram', '2', 3) == 0.0
+    slow.close()
+    fast.close()
+
+
+def test_burst_up_to_capacity_then_one_slot_per_interval():
+    pacing = SendScheduler()
+    pacing.set_policy('telegram:account', BucketPolicy(rate=10.0, capacity=3))
+
+    now = clock.monotonic()
+    slots = [pacing.reserve('telegram', 'bot').slot - now for _ in range(6)]
+
+    assert slots[:3] == pytest.approx([0, 0, 0], abs=0.01)
+    assert slots[3:] == pytest.approx([0.1, 0.2, 0.3], abs=0.01)
+
+
+def test_every_applicable_bucket_limits_the_slot():
+    pacing = SendScheduler()
+    pacing.set_policy('telegram:account', BucketPolicy(rate=100.0))
+    pacing.set_policy('telegram:chat', BucketPolicy(rate=1.0))
+
+    now = clock.monotonic()
+    slots = [pacing.reserve('telegram', 'bot', chat=chat).slot - now for chat in (1, 2, 1)]
+
+    # Another chat is held back only by the account bucket, the same chat by its own
+    assert slots == pytest.approx([0.0, 0.01, 1.0], abs=0.005)
+
+
+def test_jitter_stays_within_its_bounds():
+    pacing = SendScheduler()
+    pacing.set_policy('whatsapp:account', BucketPolicy(rate=1.0, jitter=(2.0, 5.0)))
+
+    slots = [pacing.reserve('whatsapp', 'phone').slot for _ in range(50)]
+
+    gaps = [later - earlier for earlier, later in zip(slots, slots[1:])]
+    assert all(3.0 <= gap <= 6.0 for gap in gaps)
+    assert max(gaps) - min(gaps) > 0.5
+
+
+def test_defer_pushes_the_account_back():
+    pacing = SendScheduler()
+    pacing.set_policy('telegram:account', BucketPolicy(rate=10.0, capacity=5))
+
+    pacing.defer('telegram', 'bot', 30)
+
+    assert pacing.next_free('telegram', 'bot') == pytest.approx(30.0, abs=0.05)
+    assert pacing.next_free('telegram', 'other') == 0.0
+
+
+def test_unpoliced_platform_is_never_held_back():
+    pacing = SendScheduler()
+    now = clock.monotonic()
+
+    assert all(pacing.reserve('telegram', 'bot').slot - now < 0.01 for _ in range(100))
+
+
+def test_upcoming_lists_reserved_slots_until_they_are_used(monkeypatch):
+    monkeypatch.setattr(clock, '_clock', clock.SimulatedClock())
+    pacing = SendScheduler()
+    pacing.set_policy('whatsapp:account', BucketPolicy(rate=0.1))
+
+    grants = [pacing.reserve('whatsapp', 'phone', label=str(i)) for i in range(3)]
+
+    assert [slot['label'] for slot in pacing.upcoming('whatsapp')] == ['0', '1', '2']
+    assert [slot['in_seconds'] for slot in pacing.upcoming('whatsapp')] == [0.0, 10.0, 20.0]
+    assert pacing.upcoming('telegram') == []
+    assert pacing.wait(grants[0]) and pacing.wait(grants[1])
+    assert clock.monotonic() == 10.0
+    assert [slot['label'] for slot in pacing.upcoming()] == ['2']
+
+
+def test_wait_returns_early_when_stopped(monkeypatch):
+    monkeypatch.setattr(clock, '_clock', clock.SimulatedClock())
+    pacing = SendScheduler()
+    pacing.set_policy('whatsapp:account', BucketPolicy(rate=0.01))
+    stop_event = threading.Event()
+    pacing.reserve('whatsapp', 'phone')
+    stop_event.set()
+
+    assert pacing.acquire('whatsapp', 'phone', stop_event=stop_event) is None
+    assert pacing.upcoming() == [{'platform': 'whatsapp', 'account': 'phone', 'label': None,
+                                  'in_seconds': 0.0, 'at': pytest.approx(clock.time())}]
+
+
+def test_projected_finish_counts_the_remaining_slots():
+    pacing = SendScheduler()
+    pacing.set_policy('whatsapp:account', BucketPolicy(rate=0.5, jitter=(0.0, 2.0)))
+
+    assert pacing.projected_finish('whatsapp', 'phone', 0) == 0.0
+    assert pacing.projected_finish('whatsapp', 'phone', 4) == pytest.approx(3 * 3.0, abs=0.01)
@@ -0,0 +1,129 @@
+"""WhatsApp sender against fake browsers: failover between sessions, no duplicate sends"""
+
+import os
+
+import pytest
+from selenium.common.exceptions import InvalidSessionIdException, WebDriverException
+
+import app
+import retry
+import sender
+from driver_pool import DriverPool
+from fakes import FakeBrowserConfig, FakeWebDriver
+from scheduler import scheduler
+from sendlog import read_records
+
+
+@pytest.fixture
+def campaign(monkeypatch):
+    """Runs a WhatsApp campaign with no pacing on fake browsers; returns (run, pool)"""
+    policy = scheduler.get_policy('whatsapp:account')
+    scheduler.set_policy('whatsapp:account', None)
+    for name, retry_policy in retry.RETRY_POLICIES.items():
+        monkeypatch.setitem(retry.RETRY_POLICIES, name, retry.RetryPolicy(
+            max_attempts=retry_policy.max_attempts, base_delay=0.0))
+    pool = DriverPool(launcher=FakeWebDriver.launcher())
+    monkeypatch.setattr(sender, 'driver_pool', pool)
+    os.makedirs(os.path.join('static', 'logs'), exist_ok=True)
+    manager = app.TaskManager()
+
+    def run(recipients, profiles):
+        task_id = manager.create_task('whatsapp', recipients, 'hi')
+        log_path = os.path.join('static', 'logs', f'whatsapp_test_{task_id}.xlsx')
+        sender.send_whatsapp_messages_with_log(recipients, 'hi', log_path, task_manager=manager,
+                                               task_id=task_id, profiles=profiles)
+        task = manager.get_task(task_id)
+        task['records'] = read_records(log_path)
+        return task
+
+    yield run, pool
+    scheduler.set_policy('whatsapp:account', policy)
+
+
+def test_logged_out_session_hands_over_its_recipients(campaign):
+    run, pool = campaign
+    pool.get('first').driver.logged_out = True
+    # The healthy session is a little slower, so the logged-out one gets to take a recipient
+    pool.launcher = FakeWebDriver.launcher(FakeBrowserConfig(get_latency=0.01))
+    recipients = [str(919100000000 + i) for i in range(6)]
+
+    task = run(recipients, ['first', 'second'])
+
+    assert task['sent'] == 6 and task['failed'] == 0
+    assert pool.sessions['first'].driver.sent == 0
+    assert pool.sessions['second'].driver.sent == 6
+    assert not pool.sessions['first'].healthy
+    assert pool.sessions['first'].error == "Logged out of WhatsApp Web"
+
+
+def test_every_session_logged_out_fails_the_campaign(campaign):
+    run, pool = campaign
+    pool.get('only').driver.logged_out = True
+
+    with pytest.raises(RuntimeError, match="Logged out of WhatsApp Web"):
+        run([str(919200000000 + i) for i in range(3)], ['only'])
+
+
+class UnconfirmableDriver(FakeWebDriver):
+    """Sends on click, then the confirmation round trip fails"""
+
+    def _confirm(self, *args):
+        raise WebDriverException("connection reset while waiting for the tick")
+
+
+def test_error_after_click_is_not_retried(campaign):
+    run, pool = campaign
+    pool.launcher = lambda profile='default': UnconfirmableDriver(profile=profile)
+
+    task = run(['919300000000', '919300000001'], ['clicked'])
+
+    assert pool.sessions['clicked'].driver.sent == 2
+    assert task['sent'] == 2 and task['failed'] == 0
+    assert [record['status'] for record in task['records']] == ['Sent (unconfirmed)'] * 2
+
+
+class CrashingDriver(FakeWebDriver):
+    """The browser dies once, at the given round trip; sends are counted across restarts"""
+    crash_in = None
+    sends = {}
+
+    def _crash(self, where):
+        if CrashingDriver.crash_in == where:
+            CrashingDriver.crash_in = None
+            self.window_handles = []
+            raise InvalidSessionIdException("invalid session id")
+
+    def execute_script(self, script, *args):
+        if not self.window_handles:
+            raise InvalidSessionIdException("invalid session id")
+        return super().execute_script(script, *args)
+
+    def get(self, url):
+        self._crash('get')
+        super().get(url)
+
+    def _send(self):
+        CrashingDriver.sends[self.number] = CrashingDriver.sends.get(self.number, 0) + 1
+        super()._send()
+
+    def _confirm(self, *args):
+        self._crash('confirm')
+        return super()._confirm(*args)
+
+
+@pytest.mark.parametrize('crash_in, status, attempts', [
+    ('confirm', 'Sent (unconfirmed)', 1),   # after the click: restarted, never sent again
+    ('get', 'Sent', 2),                     # before the click: sent once on the new browser
+])
+def test_browser_crash_sends_exactly_once(campaign, monkeypatch, crash_in, status, attempts):
+    run, pool = campaign
+    monkeypatch.setattr(CrashingDriver, 'crash_in', crash_in)
+    monkeypatch.setattr(CrashingDriver, 'sends', {})
+    pool.launcher = lambda profile='default': CrashingDriver(profile=profile)
+
+    task = run(['919400000000'], [f'crash-{crash_in}'])
+
+    assert CrashingDriver.sends == {'919400000000': 1}
+    assert task['sent'] == 1 and task['driver_restarts'] == 1
+    [record] = task['records']
+    assert (record['status'], record['attempts']) == (status, attempts)
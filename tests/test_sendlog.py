@@ -0,0 +1,78 @@
+"""Send log: JSONL records, crash tolerance and the on-demand XLSX export"""
+
+import io
+import os
+
+import openpyxl
+
+import app
+from sendlog import SendLogWriter, export_xlsx, read_records, records_path_for
+
+
+def test_records_round_trip(tmp_path):
+    log_path = str(tmp_path / 'whatsapp_log.xlsx')
+    with SendLogWriter(log_path, append=False) as log:
+        log.write('919000000001', 'Sent', 41.26, session='a', attempts=1)
+        log.write('919000000002', 'Invalid number')
+
+    records = list(read_records(log_path))
+
+    assert records_path_for(log_path) == str(tmp_path / 'whatsapp_log.jsonl')
+    assert [(r['recipient'], r['status'], r['delay']) for r in records] == [
+        ('919000000001', 'Sent', 41.3), ('919000000002', 'Invalid number', None)]
+    assert records[0]['session'] == 'a' and records[0]['attempts'] == 1
+
+
+def test_append_keeps_earlier_records(tmp_path):
+    log_path = str(tmp_path / 'resumed.jsonl')
+    with SendLogWriter(log_path, append=False) as log:
+        log.write('1', 'Sent')
+    with SendLogWriter(log_path, append=True) as log:
+        log.write('2', 'Sent')
+    with SendLogWriter(log_path, append=False) as log:
+        log.write('3', 'Sent')
+
+    assert [r['recipient'] for r in read_records(log_path)] == ['3']
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    log_path = str(tmp_path / 'crashed.jsonl')
+    with SendLogWriter(log_path, append=False) as log:
+        log.write('1', 'Sent')
+    with open(log_path, 'a', encoding='utf-8') as f:
+        f.write('{"recipient": "2", "sta')
+
+    assert [r['recipient'] for r in read_records(log_path)] == ['1']
+    assert list(read_records(str(tmp_path / 'missing.xlsx'))) == []
+
+
+def test_xlsx_export_per_platform(tmp_path):
+    log_path = str(tmp_path / 'telegram_log.xlsx')
+    with SendLogWriter(log_path, append=False) as log:
+        log.write('1001', 'Sent', 1.5)
+        log.write('1002', 'Failed: Forbidden')
+
+    export_xlsx(records_path_for(log_path), log_path, platform='telegram')
+
+    sheet = openpyxl.load_workbook(log_path)['Telegram Logs']
+    rows = [row for row in sheet.iter_rows(values_only=True)]
+    assert rows[0] == ('Chat ID', 'Status', 'Timestamp', 'Delay Used (sec)')
+    assert [(row[0], row[1], row[3]) for row in rows[1:]] == [('1001', 'Sent', '1.5'), ('1002', 'Failed: Forbidden', '-')]
+
+
+def test_download_exports_again_once_the_records_change():
+    os.makedirs(os.path.join('static', 'logs'), exist_ok=True)
+    log_path = os.path.join('static', 'logs', 'whatsapp_log_test.xlsx')
+    with SendLogWriter(log_path, append=False) as log:
+        log.write('919000000001', 'Sent', 40.0)
+
+    with app.app.test_client() as client:
+        assert client.get('/download/whatsapp_log_missing.xlsx').status_code == 404
+        first = client.get('/download/whatsapp_log_test.xlsx').get_data()
+        with SendLogWriter(log_path, append=True) as log:
+            log.write('919000000002', 'Sent', 50.0)
+        os.utime(records_path_for(log_path), (os.path.getmtime(log_path) + 1,) * 2)
+        second = client.get('/download/whatsapp_log_test.xlsx').get_data()
+
+    counts = [openpyxl.load_workbook(io.BytesIO(data))['WhatsApp Logs'].max_row for data in (first, second)]
+    assert counts == [2, 3]
@@ -0,0 +1,90 @@
+"""Suppression index: filtering incoming recipients, reasons and persistence"""
+
+import pytest
+
+from sendlog import SendLogWriter
+from suppression import SortedKeys, SuppressionIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SuppressionIndex(str(tmp_path / 'suppression.db'))
+    yield index
+    index.close()
+
+
+def test_filter_drops_empty_duplicate_and_suppressed(index):
+    index.add('whatsapp', ['+91 90000 00001'], reason='contacted')
+    index.add('whatsapp', ['919000000002'], reason='opt_out')
+    index.add('whatsapp', ['919000000003'], reason='blocked')
+
+    kept, dropped = index.filter('whatsapp', [
+        '919000000004', ' ', '919000000001', '919000000002', '91-9000-000004', '919000000003', '919000000005',
+    ])
+
+    assert kept == ['919000000004', '919000000005']
+    assert dropped == {'empty': 1, 'duplicate': 1, 'contacted': 1, 'opt_out': 1, 'blocked': 1}
+
+
+def test_contacted_can_be_messaged_again(index):
+    index.add('whatsapp', ['919000000001'], reason='contacted')
+    index.add('whatsapp', ['919000000002'], reason='opt_out')
+
+    kept, dropped = index.filter('whatsapp', ['919000000001', '919000000002'], skip_contacted=False)
+
+    assert kept == ['919000000001']
+    assert dropped == {'opt_out': 1}
+
+
+def test_strongest_reason_is_reported(index):
+    index.add('telegram', ['@Someone'], reason='contacted')
+    index.add('telegram', ['@someone'], reason='blocked')
+
+    assert index.reason_for('telegram', '@SOMEONE') == 'blocked'
+    assert index.filter('telegram', ['@someone'])[1] == {'blocked': 1}
+    # Platforms never share entries
+    assert index.reason_for('whatsapp', '@someone') is None
+
+
+def test_add_and_remove_count_only_changes(index):
+    assert index.add('whatsapp', ['919000000001', '919000000001', '919000000002'], reason='opt_out') == 2
+    assert index.add('whatsapp', ['919000000002'], reason='opt_out') == 0
+    assert index.remove('whatsapp', ['919000000002', '919000000009'], reason='opt_out') == 1
+    assert index.stats() == {'blocked': 0, 'opt_out': 1, 'contacted': 0}
+    with pytest.raises(ValueError):
+        index.add('whatsapp', ['919000000001'], reason='unknown')
+
+
+def test_index_survives_a_restart(tmp_path, index):
+    index.add('whatsapp', ['919000000001', '919000000002'], reason='blocked')
+    index.remove('whatsapp', ['919000000002'], reason='blocked')
+
+    reopened = SuppressionIndex(index.path)
+    try:
+        assert reopened.filter('whatsapp', ['919000000001', '919000000002'])[0] == ['919000000002']
+    finally:
+        reopened.close()
+
+
+def test_sent_recipients_of_a_log_become_contacted(tmp_path, index):
+    log_path = str(tmp_path / 'whatsapp_log.jsonl')
+    with SendLogWriter(log_path, append=False) as log:
+        log.write('919000000001', 'Sent')
+        log.write('919000000002', 'Sent (unconfirmed)')
+        log.write('919000000003', 'Invalid number')
+        log.write('919000000004', 'Failed: timeout')
+
+    assert index.ingest_log(log_path, 'whatsapp') == 2
+    kept, dropped = index.filter('whatsapp', ['919000000001', '919000000002', '919000000003', '919000000004'])
+    assert kept == ['919000000003', '919000000004']
+    assert dropped == {'contacted': 2}
+
+
+def test_sorted_keys_stay_sorted():
+    keys = SortedKeys([5, -3, 9])
+    keys.add_many([7, -10])
+    keys.remove_many({9})
+
+    assert list(keys.keys) == [-10, -3, 5, 7]
+    assert 7 in keys and 9 not in keys and 0 not in keys
+    assert len(keys) == 4
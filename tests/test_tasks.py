@@ -0,0 +1,180 @@
+"""Task lifecycle: control actions, resuming after a restart, totals and eviction"""
+
+import pytest
+
+import app
+import clock
+from progress import CampaignProgress
+from tasks import Task, TaskExecutor, TaskStatus, task_queue
+from taskstore import TaskStore
+
+
+@pytest.fixture
+def client():
+    with app.app.test_client() as client:
+        yield client
+
+
+def test_paused_task_is_unfinished(tmp_path):
+    store = TaskStore(str(tmp_path / 'tasks.db'))
+    manager = app.TaskManager(store=store)
+    task_id = manager.create_task('whatsapp', ['919000000001'], 'hi')
+    manager.update_task(task_id, status='paused')
+    manager.flush()
+
+    assert [task['id'] for task in store.load_unfinished()] == [task_id]
+    restarted = app.TaskManager(store=store)
+    assert [task['id'] for task in restarted.unfinished_tasks()] == [task_id]
+
+
+def test_paused_task_resumes_paused():
+    task_id = app.task_manager.create_task('whatsapp', ['919000000002'], 'hi')
+    task = Task(id=task_id, recipients=['919000000002'])
+    task.pause_event.set()
+    task_queue.add_task(task)
+    seen = []
+    executor = TaskExecutor(task_queue, handler=lambda task: seen.append(task.status))
+    assert task_queue.get_next_task(timeout=1) is task
+    executor._execute_task(task)
+    assert seen == [TaskStatus.PAUSED]
+
+
+def test_control_finished_task_conflicts(client):
+    task_id = app.task_manager.create_task('whatsapp', ['919000000003'], 'hi')
+    app.task_manager.update_task(task_id, status='completed')
+
+    for action in ('pause', 'resume', 'stop'):
+        response = client.post(f'/api/task/{task_id}/{action}')
+        assert response.status_code == 409
+    assert app.task_manager.get_task(task_id)['status'] == 'completed'
+
+
+def test_stop_queued_task_removes_it(client):
+    task_id = app.task_manager.create_task('whatsapp', ['919000000004'], 'hi')
+    task = Task(id=task_id, recipients=['919000000004'])
+    task_queue.add_task(task)
+
+    assert client.post(f'/api/task/{task_id}/pause').status_code == 409
+    assert client.post(f'/api/task/{task_id}/stop').status_code == 200
+    assert task not in task_queue.pending()
+    assert task.stop_event.is_set()
+    assert app.task_manager.get_task(task_id)['status'] == 'stopped'
+
+
+def test_unknown_task_not_found(client):
+    assert client.post('/api/task/missing/stop').status_code == 404
+
+
+def test_dead_letters_are_appended_not_pushed(tmp_path):
+    store = TaskStore(str(tmp_path / 'tasks.db'))
+    manager = app.TaskManager(store=store)
+    recipients = [f'91900000001{i}' for i in range(3)]
+    task_id = manager.create_task('whatsapp', recipients, 'hi')
+    progress = CampaignProgress(len(recipients), manager, task_id, platform='whatsapp')
+
+    for idx, recipient in enumerate(recipients):
+        progress.record(idx, recipient, 'failed', error='boom', attempts=3)
+        if idx == 0:
+            manager.flush()
+
+    task = manager.get_task(task_id)
+    assert task['dead_letter_count'] == 3 and 'dead_letters' not in task
+    assert [entry['recipient'] for entry in manager.get_dead_letters(task_id)] == recipients
+    manager.flush()
+    restarted = app.TaskManager(store=store)
+    assert [entry['index'] for entry in restarted.get_dead_letters(task_id)] == [0, 1, 2]
+
+
+def test_legacy_dead_letters_are_still_listed(tmp_path):
+    manager = app.TaskManager(store=TaskStore(str(tmp_path / 'tasks.db')))
+    task_id = manager.create_task('whatsapp', ['919000000020'], 'hi')
+    legacy = [{'index': 0, 'recipient': '919000000020', 'error': 'boom', 'attempts': 1, 'time': 0.0}]
+    manager.update_task(task_id, dead_letters=legacy)
+
+    assert manager.get_dead_letters(task_id) == legacy
+
+
+def test_control_after_handler_finished_keeps_final_status(client):
+    task_id = app.task_manager.create_task('whatsapp', ['919000000030'], 'hi')
+    task = Task(id=task_id, recipients=['919000000030'])
+    task_queue.add_task(task)
+    responses = []
+
+    def handler(task):
+        # The worker reported the end, but mark_completed has not run yet
+        app.task_manager.update_task(task.id, status='completed')
+        responses.append(client.post(f'/api/task/{task.id}/pause').status_code)
+
+    assert task_queue.get_next_task(timeout=1) is task
+    TaskExecutor(task_queue, handler=handler)._execute_task(task)
+    assert responses == [409]
+    assert app.task_manager.get_task(task_id)['status'] == 'completed'
+    assert task.status == TaskStatus.COMPLETED
+
+
+def test_retention_runs_on_the_task_clock(tmp_path, monkeypatch):
+    monkeypatch.setattr(clock, '_clock', clock.SimulatedClock())
+    manager = app.TaskManager(store=TaskStore(str(tmp_path / 'tasks.db')), retention=3600)
+    task_id = manager.create_task('whatsapp', ['919000000009'], 'hi')
+    manager.update_task(task_id, status='completed')
+    manager.flush()
+
+    manager.evict()
+    assert task_id in manager.tasks
+    clock.sleep(3601)
+    manager.evict()
+    assert task_id not in manager.tasks
+    assert manager.get_task(task_id)['status'] == 'completed'
+
+
+def test_totals_follow_every_change_and_survive_a_restart(tmp_path):
+    store = TaskStore(str(tmp_path / 'tasks.db'))
+    manager = app.TaskManager(store=store)
+    first = manager.create_task('whatsapp', ['919000000011', '919000000012'], 'hi')
+    second = manager.create_task('telegram', ['1001', '1002', '1003'], 'hi')
+    manager.update_task(first, status='running', sent=1, invalid=1)
+    manager.update_task(first, status='completed', sent=1)
+    manager.update_task(second, status='running', sent=2, failed=1)
+    manager.update_task(second, sent=1, failed=2)
+
+    totals = manager.totals()
+    assert totals == {'tasks': {'completed': 1, 'running': 1}, 'sent': 2, 'failed': 2, 'invalid': 1}
+    manager.flush()
+    assert app.TaskManager(store=store).totals() == totals
+
+
+def test_eviction_keeps_unfinished_tasks(tmp_path, monkeypatch):
+    monkeypatch.setattr(clock, '_clock', clock.SimulatedClock())
+    manager = app.TaskManager(store=TaskStore(str(tmp_path / 'tasks.db')), retention=60)
+    running = manager.create_task('whatsapp', ['919000000013'], 'hi')
+    finished = manager.create_task('whatsapp', ['919000000014'], 'hi')
+    manager.update_task(running, status='running')
+    manager.update_task(finished, status='completed', sent=1)
+
+    manager.flush()
+    clock.sleep(61)
+    manager.evict()
+
+    assert running in manager.tasks and finished not in manager.tasks
+    assert set(manager.get_all_tasks()) == {running}
+    # Evicted tasks are still served from the store, and still counted
+    assert manager.get_task(finished)['sent'] == 1
+    assert manager.get_changes(finished, since=0) == (1, manager.get_task(finished))
+    assert manager.totals()['tasks'] == {'running': 1, 'completed': 1}
+
+
+def test_evicted_task_comes_back_when_updated(tmp_path, monkeypatch):
+    monkeypatch.setattr(clock, '_clock', clock.SimulatedClock())
+    manager = app.TaskManager(store=TaskStore(str(tmp_path / 'tasks.db')), retention=60)
+    task_id = manager.create_task('whatsapp', ['919000000015'], 'hi')
+    manager.update_task(task_id, status='stopped')
+    manager.flush()
+    clock.sleep(61)
+    manager.evict()
+    assert task_id not in manager.tasks
+
+    assert not manager.set_status(task_id, 'running')
+    manager.update_task(task_id, status='queued')
+
+    assert manager.tasks[task_id]['status'] == 'queued'
+    assert manager.totals()['tasks'] == {'queued': 1}
@@ -0,0 +1,151 @@
+"""Telegram engine against the stub Bot API: delivery, spreading over bots, retries, uploads and 429s"""
+
+import pytest
+
+import clock
+import retry
+import telegram_engine
+from fakes import StubTelegramConfig, StubTelegramServer
+from media import MediaFile
+from scheduler import SendScheduler
+from telegram_engine import TelegramConfig, TelegramEngine
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """Builds an unpaced engine on a stub Bot API; returns (engine, stub)"""
+    for name, policy in retry.RETRY_POLICIES.items():
+        monkeypatch.setitem(retry.RETRY_POLICIES, name, retry.RetryPolicy(
+            max_attempts=policy.max_attempts, base_delay=0.0))
+    started = []
+
+    def build(tokens, stub_config=None, **config):
+        stub = StubTelegramServer(stub_config).start()
+        engine = TelegramEngine(tokens, TelegramConfig(api_url=stub.url, global_rate=0, per_chat_rate=0, **config))
+        started.append((engine, stub))
+        return engine, stub
+
+    yield build
+    for engine, stub in started:
+        engine.close()
+        stub.stop()
+
+
+def test_every_chat_gets_one_message(engine):
+    telegram, stub = engine('101:token')
+    results = []
+
+    stats = telegram.send_all(range(1000, 1050), 'hi', on_result=lambda *result: results.append(result))
+
+    assert stats['sent'] == 50 and stats['failed'] == 0
+    assert stub.requests['sendMessage'] == 50
+    assert sorted(chat for chat, ok, *_ in results if ok) == list(range(1000, 1050))
+
+
+def test_chats_stick_to_one_bot(engine):
+    telegram, _ = engine('201:a,202:b')
+    restarted, _ = engine('201:a,202:b')
+    chats = range(2000, 2100)
+
+    assignment = [telegram.bot_for(chat).account for chat in chats]
+    stats = telegram.send_all(chats, 'hi')
+
+    assert set(assignment) == {'201', '202'}
+    assert [restarted.bot_for(chat).account for chat in chats] == assignment
+    assert stats['sent'] == 100
+
+
+def test_server_errors_are_retried_then_given_up(engine):
+    telegram, stub = engine('301:token', StubTelegramConfig(failure_rate=1.0))
+
+    stats = telegram.send_all(range(3000, 3004), 'hi')
+
+    attempts = retry.RETRY_POLICIES['telegram'].max_attempts
+    assert stats['sent'] == 0 and stats['failed'] == 4
+    assert stub.requests['sendMessage'] == 4 * attempts
+
+
+def test_attachment_is_uploaded_once_per_bot(engine, tmp_path):
+    path = tmp_path / 'flyer.png'
+    path.write_bytes(b'test_attachment_is_uploaded_once_per_bot')
+    telegram, stub = engine('401:token', concurrency=1)
+
+    stats = telegram.send_all(range(4000, 4005), 'hi', media=MediaFile.from_path(str(path)))
+
+    assert stats['sent'] == 5
+    assert stub.requests['sendPhoto'] == 5
+    assert stub.requests['uploads'] == 1
+
+
+class ThrottlingStub(StubTelegramServer):
+    """Answers the first `throttled` requests with 429 retry_after, then accepts"""
+
+    def __init__(self, throttled, retry_after=30):
+        super().__init__(StubTelegramConfig(retry_after=retry_after))
+        self.throttled = throttled
+
+    def _respond(self, path, content_type):
+        with self._lock:
+            throttle = self.throttled > 0
+            self.throttled -= throttle
+        if throttle:
+            self.requests['throttled'] += 1
+            return 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 30',
+                         'parameters': {'retry_after': self.config.retry_after}}
+        return super()._respond(path, content_type)
+
+
+@pytest.fixture
+def throttled(monkeypatch):
+    """Engine on a ThrottlingStub in simulated time; returns build(throttled, **config) -> (engine, stub)"""
+    # The feeder hands chats to the send pool outside the simulation (see dryrun.py)
+    monkeypatch.setattr(clock, '_clock', clock.SimulatedClock(settle=0.0002))
+    # Buckets left by other tests would be in another clock's time
+    monkeypatch.setattr(telegram_engine, 'scheduler', SendScheduler())
+    started = []
+
+    def build(count, **config):
+        stub = ThrottlingStub(count).start()
+        engine = TelegramEngine(f'5{len(started)}1:token', TelegramConfig(
+            api_url=stub.url, global_rate=0, per_chat_rate=0, **config))
+        started.append((engine, stub))
+        return engine, stub
+
+    yield build
+    for engine, stub in started:
+        engine.close()
+        stub.stop()
+
+
+def test_429_waits_retry_after_then_sends(throttled):
+    telegram, stub = throttled(1)
+
+    ok, error, waited, status = telegram.send_message(5000, 'hi')
+
+    assert (ok, error, status) == (True, '', 200)
+    assert waited == pytest.approx(30.0)
+    assert clock.monotonic() == pytest.approx(30.0)
+    assert telegram.bots[0].throttled == 1
+    assert (stub.requests['throttled'], stub.requests['sendMessage']) == (1, 1)
+
+
+def test_429_holds_back_every_chat_on_the_bot(throttled):
+    telegram, stub = throttled(1, concurrency=1)
+    sent_at = []
+
+    stats = telegram.send_all(range(5100, 5105), 'hi', on_result=lambda *result: sent_at.append(clock.monotonic()))
+
+    assert stats['sent'] == 5 and stats['failed'] == 0
+    assert len(sent_at) == 5 and min(sent_at) >= 30.0
+    assert stub.requests['throttled'] == 1
+
+
+def test_429_is_given_up_after_max_throttle_retries(throttled):
+    telegram, stub = throttled(10, max_throttle_retries=2)
+
+    ok, error, waited, status = telegram.send_message(5200, 'hi')
+
+    assert (ok, status) == (False, 429)
+    assert error.startswith('Too Many Requests')
+    assert waited == pytest.approx(60.0)
+    assert stub.requests['throttled'] == 3
@@ -0,0 +1,541 @@
+"""
+WhatsApp Web DOM Probe for NexoraMsg
+Reads the whole chat UI state in one execute_script round trip, using a
+per-session cache of the selectors that last matched
+"""
+
+import base64
+import threading
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Candidate CSS selectors per UI element, most likely first.
+# WhatsApp changes its markup from time to time; the probe tries the cached
+# selector first and falls back to the rest of the list (re-discovery).
+SELECTORS: Dict[str, List[str]] = {
+    'input': [
+        "div[contenteditable='true'][data-tab='1']",      # Message input
+        "div[contenteditable='true'][role='textbox']",
+        "div[contenteditable='true'][spellcheck='false']",
+        "div[data-testid='msg-input']",
+    ],
+    'send': [
+        "span[data-icon='send']",
+        "button[aria-label='Send']",
+        "span[data-testid='send']",
+    ],
+    'chat': [
+        "#main footer",
+        "#main",
+    ],
+    'side': [
+        "#side",
+    ],
+    'outgoing': [
+        "div.message-out",
+        "div[data-testid='msg-container'] .message-out",
+    ],
+    'dialog': [
+        "div[role='dialog']",
+        "div[data-animate-modal-popup='true']",
+        "div[data-testid='popup-contents']",
+    ],
+    'offline': [                                           # Connectivity banner
+        "span[data-icon='alert-phone']",
+        "span[data-icon='alert-computer']",
+        "span[data-icon='alert-offline']",
+        "div[data-testid='alert-phone']",
+    ],
+    'login': [                                             # QR login screen
+        "canvas[aria-label='Scan me!']",
+        "div[data-ref] canvas",
+        "div[data-testid='qrcode']",
+    ],
+    'media_send': [                                        # Send button of the attachment preview
+        "div[role='dialog'] span[data-icon='send']",
+        "span[data-icon='wds-ic-send-filled']",
+    ],
+}
+
+INVALID_NUMBER_TEXT = "Phone number shared via URL is invalid"
+
+# Reads the whole UI state; shared by PROBE_JS and CHAT_RACE_JS
+PROBE_FN = """
+function nexoraProbe(candidates, invalidText) {
+const matched = {};
+const found = {};
+for (const role of Object.keys(candidates)) {
+    for (const selector of candidates[role]) {
+        let el = null;
+        try { el = document.querySelector(selector); } catch (e) { el = null; }
+        if (el) { matched[role] = selector; found[role] = el; break; }
+    }
+}
+const visible = (el) => !!el && el.getClientRects().length > 0;
+const outgoingCount = matched['outgoing'] ? document.querySelectorAll(matched['outgoing']).length : 0;
+const input = found['input'];
+const dialog = found['dialog'];
+const dialogText = dialog ? (dialog.innerText || dialog.textContent || '') : '';
+return {
+    matched: matched,
+    send_visible: visible(found['send']),
+    input_found: !!input,
+    input_text: input ? (input.innerText || input.textContent || '') : '',
+    chat_loaded: !!found['chat'],
+    logged_in: !!found['side'],
+    logged_out: !!found['login'],
+    offline: visible(found['offline']),
+    dialog_text: dialogText,
+    outgoing_count: outgoingCount,
+    invalid_number: dialogText.indexOf(invalidText) !== -1
+};
+}
+"""
+
+PROBE_JS = PROBE_FN + """
+return nexoraProbe(arguments[0], arguments[1]);
+"""
+
+# Outcomes of opening a chat, in the order they are checked
+CHAT_OUTCOMES = ('invalid', 'ready', 'logged_out', 'offline', 'timeout')
+
+# Async script: resolves on whichever comes first - invalid-number dialog,
+# send button, QR login screen, or a connectivity banner that stays up for
+# `offlineGraceMs` (it flashes briefly while the app boots)
+CHAT_RACE_JS = PROBE_FN + """
+const candidates = arguments[0];
+const invalidText = arguments[1];
+const timeoutMs = arguments[2];
+const offlineGraceMs = arguments[3];
+const done = arguments[arguments.length - 1];
+const started = performance.now();
+let offlineSince = null;
+let finished = false;
+let observer = null;
+let poll = null;
+const outcome = (s) => {
+    if (s.invalid_number) { return 'invalid'; }
+    if (s.send_visible && s.chat_loaded) { return 'ready'; }
+    if (s.logged_out) { return 'logged_out'; }
+    if (s.offline) {
+        offlineSince = offlineSince === null ? performance.now() : offlineSince;
+        if (performance.now() - offlineSince >= offlineGraceMs) { return 'offline'; }
+    } else {
+        offlineSince = null;
+    }
+    return null;
+};
+const finish = (status, state) => {
+    if (finished) { return; }
+    finished = true;
+    if (observer) { observer.disconnect(); }
+    clearInterval(poll);
+    done({ status: status, elapsed_ms: performance.now() - started, state: state });
+};
+const check = () => {
+    const state = nexoraProbe(candidates, invalidText);
+    const status = outcome(state);
+    if (status) { finish(status, state); }
+    else if (performance.now() - started >= timeoutMs) { finish('timeout', state); }
+};
+check();
+if (!finished) {
+    observer = new MutationObserver(check);
+    observer.observe(document.documentElement, { childList: true, subtree: true });
+    // Timers keep the offline grace and timeout ticking when the DOM is quiet
+    poll = setInterval(check, 250);
+}
+"""
+
+# Status icons of an outgoing bubble: pending clock, single tick, double tick
+SENT_ICONS = ('msg-time', 'msg-check', 'msg-dblcheck')
+
+# Async script: resolves as soon as a new outgoing bubble (beyond `baseline`)
+# shows a pending/sent tick, watched with a MutationObserver instead of sleeping
+CONFIRM_JS = """
+const outgoingSelector = arguments[0];
+const baseline = arguments[1];
+const iconSelector = arguments[2];
+const timeoutMs = arguments[3];
+const done = arguments[arguments.length - 1];
+const started = performance.now();
+const check = () => {
+    const bubbles = document.querySelectorAll(outgoingSelector);
+    if (bubbles.length <= baseline) { return null; }
+    const icon = bubbles[bubbles.length - 1].querySelector(iconSelector);
+    return icon ? icon.getAttribute('data-icon') : null;
+};
+const finish = (status) => done({ status: status, elapsed_ms: performance.now() - started });
+const status = check();
+if (status) { finish(status); return; }
+const root = document.querySelector('#main') || document.body;
+let timer = null;
+const observer = new MutationObserver(() => {
+    const current = check();
+    if (current) {
+        observer.disconnect();
+        clearTimeout(timer);
+        finish(current);
+    }
+});
+observer.observe(root, { childList: true, subtree: true, attributes: true, attributeFilter: ['data-icon'] });
+timer = setTimeout(() => { observer.disconnect(); finish(null); }, timeoutMs);
+"""
+
+# Async script: open a chat inside the running app by clicking an injected
+# send link, which WhatsApp Web routes in-page. The old #main is tagged so a
+# freshly rendered chat can be told apart; if the app does not claim the
+# click, its default navigation is cancelled and false is returned.
+OPEN_CHAT_JS = """
+const href = arguments[0];
+const timeoutMs = arguments[1];
+const done = arguments[arguments.length - 1];
+const oldMain = document.querySelector('#main');
+if (oldMain) { oldMain.setAttribute('data-nexora-stale', '1'); }
+const link = document.createElement('a');
+link.href = href;
+link.style.display = 'none';
+let handled = true;
+const guard = (event) => {
+    if (event.target === link && !event.defaultPrevented) {
+        event.preventDefault();
+        handled = false;
+    }
+};
+window.addEventListener('click', guard);
+(document.querySelector('#app') || document.body).appendChild(link);
+link.click();
+link.remove();
+window.removeEventListener('click', guard);
+if (!handled) { done(false); return; }
+const opened = () => !!document.querySelector('#main:not([data-nexora-stale]) footer');
+if (opened()) { done(true); return; }
+let timer = null;
+const observer = new MutationObserver(() => {
+    if (opened()) {
+        observer.disconnect();
+        clearTimeout(timer);
+        done(true);
+    }
+});
+observer.observe(document.body, { childList: true, subtree: true });
+timer = setTimeout(() => { observer.disconnect(); done(false); }, timeoutMs);
+"""
+
+# IndexedDB store the attachments are staged in. It belongs to the
+# web.whatsapp.com origin, so it survives the page reloads of URL navigation.
+MEDIA_DB_JS = """
+const openMediaDb = () => new Promise((resolve) => {
+    const request = indexedDB.open('nexora-media', 1);
+    request.onupgradeneeded = () => request.result.createObjectStore('files');
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => resolve(null);
+});
+"""
+
+# Async script: store an attachment in the browser once per session
+STAGE_JS = MEDIA_DB_JS + """
+const digest = arguments[0];
+const payload = arguments[1];
+const name = arguments[2];
+const type = arguments[3];
+const done = arguments[arguments.length - 1];
+const bytes = Uint8Array.from(atob(payload), (c) => c.charCodeAt(0));
+const record = { blob: new Blob([bytes], { type: type }), name: name, type: type };
+window.__nexoraMedia = window.__nexoraMedia || {};
+window.__nexoraMedia[digest] = record;
+openMediaDb().then((db) => {
+    if (!db) { done(false); return; }
+    const tx = db.transaction('files', 'readwrite');
+    tx.objectStore('files').put(record, digest);
+    tx.oncomplete = () => done(true);
+    tx.onerror = () => done(false);
+});
+"""
+
+# Async script: paste a staged attachment into the open chat and wait for
+# the attachment preview's send button. The prefilled draft becomes the caption.
+ATTACH_JS = MEDIA_DB_JS + """
+const digest = arguments[0];
+const inputSelector = arguments[1];
+const sendSelectors = arguments[2];
+const timeoutMs = arguments[3];
+const done = arguments[arguments.length - 1];
+const started = performance.now();
+const load = () => {
+    const cached = (window.__nexoraMedia || {})[digest];
+    if (cached) { return Promise.resolve(cached); }
+    return openMediaDb().then((db) => new Promise((resolve) => {
+        if (!db) { resolve(null); return; }
+        const request = db.transaction('files', 'readonly').objectStore('files').get(digest);
+        request.onsuccess = () => resolve(request.result || null);
+        request.onerror = () => resolve(null);
+    }));
+};
+const findSend = () => {
+    for (const selector of sendSelectors) {
+        const el = document.querySelector(selector);
+        if (el && el.getClientRects().length > 0) { return selector; }
+    }
+    return null;
+};
+load().then((record) => {
+    if (!record) { done({ status: 'missing' }); return; }
+    window.__nexoraMedia = window.__nexoraMedia || {};
+    window.__nexoraMedia[digest] = record;
+    const input = document.querySelector(inputSelector);
+    if (!input) { done({ status: 'no_input' }); return; }
+    const transfer = new DataTransfer();
+    transfer.items.add(new File([record.blob], record.name, { type: record.type }));
+    input.focus();
+    input.dispatchEvent(new ClipboardEvent('paste', { clipboardData: transfer, bubbles: true, cancelable: true }));
+    let timer = null;
+    const finish = (status, selector) => {
+        observer.disconnect();
+        clearTimeout(timer);
+        done({ status: status, selector: selector, elapsed_ms: performance.now() - started });
+    };
+    const observer = new MutationObserver(() => {
+        const selector = findSend();
+        if (selector) { finish('ready', selector); }
+    });
+    observer.observe(document.body, { childList: true, subtree: true });
+    timer = setTimeout(() => finish('timeout', null), timeoutMs);
+    const selector = findSend();
+    if (selector) { finish('ready', selector); }
+});
+"""
+
+CLICK_JS = """
+const elem = document.querySelector(arguments[0]);
+if (!elem) { return false; }
+(elem.closest('button') || elem).click();
+return true;
+"""
+
+CLEAR_INPUT_JS = """
+const elem = document.querySelector(arguments[0]);
+if (!elem) { return false; }
+elem.textContent = '';
+elem.innerText = '';
+elem.dispatchEvent(new Event('input', { bubbles: true }));
+return true;
+"""
+
+
+@dataclass
+class DomState:
+    """Snapshot of the WhatsApp Web chat UI"""
+    send_visible: bool = False
+    input_found: bool = False
+    input_text: str = ""
+    chat_loaded: bool = False
+    logged_in: bool = False
+    logged_out: bool = False
+    offline: bool = False
+    invalid_number: bool = False
+    dialog_text: str = ""
+    outgoing_count: int = 0
+    matched: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def has_draft(self) -> bool:
+        return bool(self.input_text.strip())
+
+
+class SelectorCache:
+    """Remembers, per browser session, which selector last matched each element"""
+
+    def __init__(self):
+        self._cache = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def candidates(self, driver) -> Dict[str, List[str]]:
+        """Selector lists with the cached winner moved to the front"""
+        with self._lock:
+            learned = self._cache.get(driver, {})
+        ordered = {}
+        for role, selectors in SELECTORS.items():
+            winner = learned.get(role)
+            if winner in selectors:
+                ordered[role] = [winner] + [s for s in selectors if s != winner]
+            else:
+                ordered[role] = list(selectors)
+        return ordered
+
+    def learn(self, driver, matched: Dict[str, str]):
+        """Record the selectors that matched (re-discovered ones replace stale ones)"""
+        if not matched:
+            return
+        with self._lock:
+            learned = self._cache.setdefault(driver, {})
+            learned.update(matched)
+
+    def get(self, driver, role: str) -> Optional[str]:
+        with self._lock:
+            return self._cache.get(driver, {}).get(role)
+
+    def forget(self, driver):
+        with self._lock:
+            self._cache.pop(driver, None)
+
+
+selector_cache = SelectorCache()
+
+
+def _dom_state(driver, result: dict) -> DomState:
+    state = DomState(
+        send_visible=bool(result.get('send_visible')),
+        input_found=bool(result.get('input_found')),
+        input_text=result.get('input_text') or "",
+        chat_loaded=bool(result.get('chat_loaded')),
+        logged_in=bool(result.get('logged_in')),
+        logged_out=bool(result.get('logged_out')),
+        offline=bool(result.get('offline')),
+        invalid_number=bool(result.get('invalid_number')),
+        dialog_text=result.get('dialog_text') or "",
+        outgoing_count=int(result.get('outgoing_count') or 0),
+        matched=result.get('matched') or {},
+    )
+    selector_cache.learn(driver, state.matched)
+    return state
+
+
+def probe(driver) -> DomState:
+    """Read send button, input box, invalid-number dialog and chat state in one round trip"""
+    result = driver.execute_script(PROBE_JS, selector_cache.candidates(driver), INVALID_NUMBER_TEXT) or {}
+    return _dom_state(driver, result)
+
+
+def clear_input(driver, state: Optional[DomState] = None) -> bool:
+    """Empty the message input box using the selector the probe matched"""
+    selector = (state.matched.get('input') if state else None) or selector_cache.get(driver, 'input')
+    if not selector:
+        return False
+    return bool(driver.execute_script(CLEAR_INPUT_JS, selector))
+
+
+def click(driver, role: str, state: Optional[DomState] = None) -> bool:
+    """Click an element (e.g. 'send') by its cached selector in one round trip"""
+    selector = (state.matched.get(role) if state else None) or selector_cache.get(driver, role)
+    if not selector:
+        return False
+    return bool(driver.execute_script(CLICK_JS, selector))
+
+
+@dataclass
+class Confirmation:
+    """Outcome of waiting for an outgoing message bubble"""
+    status: Optional[str]       # one of SENT_ICONS, or None if it never showed up
+    latency_ms: float
+
+    @property
+    def confirmed(self) -> bool:
+        return self.status is not None
+
+
+def wait_for_send_confirmation(driver, baseline: int, timeout: float = 10.0) -> Confirmation:
+    """
+    Block until the message just sent shows its pending/sent tick (event driven,
+    no fixed sleep). `baseline` is the outgoing bubble count before clicking send.
+    """
+    selector = selector_cache.get(driver, 'outgoing') or SELECTORS['outgoing'][0]
+    icons = ', '.join(f"span[data-icon='{icon}']" for icon in SENT_ICONS)
+    result = driver.execute_async_script(
+        CONFIRM_JS, selector, baseline, icons, int(timeout * 1000)
+    ) or {}
+    return Confirmation(status=result.get('status'), latency_ms=round(float(result.get('elapsed_ms') or 0.0), 1))
+
+
+def open_chat_in_app(driver, url: str, timeout: float = 10.0) -> bool:
+    """Open a send?phone= link inside the loaded app (no page reload). False if it didn't take."""
+    return bool(driver.execute_async_script(OPEN_CHAT_JS, url, int(timeout * 1000)))
+
+
+@dataclass
+class ChatOutcome:
+    """What happened after opening a chat (see CHAT_OUTCOMES)"""
+    status: str
+    latency_ms: float
+    state: DomState
+
+    @property
+    def ready(self) -> bool:
+        return self.status == 'ready'
+
+
+def wait_for_chat(driver, timeout: float = 40.0, offline_grace: float = 5.0) -> ChatOutcome:
+    """
+    Wait for an opened chat to settle, returning as soon as the send button
+    is ready or WhatsApp shows the invalid-number dialog, the login screen
+    or a lasting connectivity banner. Gives up with 'timeout'.
+    """
+    result = driver.execute_async_script(
+        CHAT_RACE_JS, selector_cache.candidates(driver), INVALID_NUMBER_TEXT,
+        int(timeout * 1000), int(offline_grace * 1000)
+    ) or {}
+    return ChatOutcome(
+        status=result.get('status') or 'timeout',
+        latency_ms=round(float(result.get('elapsed_ms') or 0.0), 1),
+        state=_dom_state(driver, result.get('state') or {}),
+    )
+
+
+# Attachments already staged in each browser session: driver -> {sha256}
+_staged_media = weakref.WeakKeyDictionary()
+_staged_lock = threading.Lock()
+
+
+def stage_media(driver, media) -> int:
+    """Copy an attachment into the browser unless this session already has it. Returns bytes sent."""
+    with _staged_lock:
+        if media.sha256 in _staged_media.get(driver, ()):
+            return 0
+    payload = base64.b64encode(media.read_bytes()).decode('ascii')
+    if not driver.execute_async_script(STAGE_JS, media.sha256, payload, media.name, media.mime):
+        raise RuntimeError(f"Could not stage attachment {media.name} in the browser")
+    with _staged_lock:
+        _staged_media.setdefault(driver, set()).add(media.sha256)
+    return media.size
+
+
+@dataclass
+class Attachment:
+    """Outcome of pasting a staged attachment into a chat"""
+    status: str                     # 'ready', 'timeout', 'no_input' or 'missing'
+    latency_ms: float = 0.0
+    selector: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == 'ready'
+
+
+def attach_media(driver, media, timeout: float = 20.0) -> Attachment:
+    """
+    Paste the session's staged copy of an attachment into the open chat and
+    wait for its preview. Nothing is re-sent from Python unless the
+    browser's copy has gone missing.
+    """
+    stage_media(driver, media)
+    input_selector = selector_cache.get(driver, 'input') or SELECTORS['input'][0]
+    candidates = selector_cache.candidates(driver)['media_send']
+    for _ in range(2):
+        result = driver.execute_async_script(
+            ATTACH_JS, media.sha256, input_selector, candidates, int(timeout * 1000)
+        ) or {}
+        if result.get('status') != 'missing':
+            break
+        # The browser lost its copy (storage cleared): stage it again once
+        with _staged_lock:
+            _staged_media.get(driver, set()).discard(media.sha256)
+        stage_media(driver, media)
+    attachment = Attachment(
+        status=result.get('status') or 'timeout',
+        latency_ms=round(float(result.get('elapsed_ms') or 0.0), 1),
+        selector=result.get('selector'),
+    )
+    if attachment.selector:
+        selector_cache.learn(driver, {'media_send': attachment.selector})
+    return attachment